@@ -0,0 +1,90 @@
+"""
+Compares the SQLite bulk loader with the previous DataFrame.to_sql() load.
+
+Usage:
+    python benchmarks/bench_load.py --rows 1000000
+
+A synthetic catalogue is built by sampling rows of the normalized CSVs in
+data/3_normalized_data with a unique UPC per row. Both loaders write a new
+database in a temporary directory:
+
+    to_sql       DataFrame.to_sql(if_exists='replace') per table (the previous load())
+    to_sql+keys  the same, plus the UPC keys and genre index of bulk_load()
+                 created afterwards, so the resulting databases are comparable
+    bulk         bulk_load(): typed tables, WAL, batched executemany() in one
+                 transaction, keys and indexes after the insert, atomic swap
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+NORMALIZED_DIR = os.path.join(PROJECT_ROOT, 'data/3_normalized_data')
+
+
+def synthetic_tables(rows, seed=0):
+    """Samples `rows` books (and their stock rows) with unique UPCs; genres are kept as they are."""
+    books_df = pd.read_csv(os.path.join(NORMALIZED_DIR, 'books.csv'))
+    in_stock_df = pd.read_csv(os.path.join(NORMALIZED_DIR, 'in_stock.csv'))
+    genre_df = pd.read_csv(os.path.join(NORMALIZED_DIR, 'genres.csv'))
+    sample = np.random.default_rng(seed).integers(0, len(books_df), rows)
+    upcs = np.char.mod('%016x', np.arange(rows))
+    books_df = books_df.iloc[sample].reset_index(drop=True).assign(upc=upcs)
+    in_stock_df = in_stock_df.iloc[sample].reset_index(drop=True).assign(upc=upcs)
+    return books_df, genre_df, in_stock_df
+
+
+def to_sql_load(books_df, genre_df, in_stock_df, db_path):
+    """The load body before the bulk loader, kept as the baseline."""
+    conn = sqlite3.connect(db_path)
+    books_df.to_sql('books', conn, if_exists='replace', index=False)
+    genre_df.to_sql('genres', conn, if_exists='replace', index=False)
+    in_stock_df.to_sql('in_stock', conn, if_exists='replace', index=False)
+    conn.close()
+
+
+def to_sql_keys_load(books_df, genre_df, in_stock_df, db_path):
+    """to_sql_load() followed by the keys and indexes bulk_load() builds."""
+    from etl.load import INDEXES
+
+    to_sql_load(books_df, genre_df, in_stock_df, db_path)
+    conn = sqlite3.connect(db_path)
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    from etl.load import bulk_load
+
+    tables = synthetic_tables(args.rows)
+    print(f'{args.rows} rows')
+    print(f'{"loader":<12} {"seconds":>8} {"rows/s":>10} {"size":>10}  check')
+    with tempfile.TemporaryDirectory() as workdir:
+        for loader, run in (('to_sql', to_sql_load), ('to_sql+keys', to_sql_keys_load), ('bulk', bulk_load)):
+            db_path = os.path.join(workdir, f'{loader}.db')
+            start = time.perf_counter()
+            run(*tables, db_path)
+            elapsed = time.perf_counter() - start
+            conn = sqlite3.connect(db_path)
+            count, total = conn.execute('SELECT COUNT(*), ROUND(SUM(price_incl_tax_gbp), 2) FROM books').fetchone()
+            conn.close()
+            size = os.path.getsize(db_path) / 2**20
+            print(f'{loader:<12} {elapsed:>8.2f} {args.rows / elapsed:>10.0f} {size:>6.0f} MiB  {count} rows, {total} GBP')
+
+
+if __name__ == '__main__':
+    main()
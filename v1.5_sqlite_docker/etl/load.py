@@ -1,18 +1,133 @@
 import os
-import pandas as pd 
+import pandas as pd
 import sqlite3
 from etl.logger import get_logger
 
 logger = get_logger(__name__)
 
+DATABASE_PATH = 'data/4_database/books.db'
+BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE', '50000'))
+CACHE_SIZE_KB = int(os.getenv('LOAD_CACHE_SIZE_KB', '200000'))
+PAGE_SIZE = 16384
+
+SCHEMA = [
+    '''CREATE TABLE genres (
+        id INTEGER PRIMARY KEY,
+        genre TEXT NOT NULL
+    )''',
+    '''CREATE TABLE in_stock (
+        upc TEXT NOT NULL,
+        in_stock INTEGER
+    )''',
+    '''CREATE TABLE books (
+        upc TEXT NOT NULL REFERENCES in_stock(upc),
+        titles TEXT,
+        genre_id INTEGER REFERENCES genres(id),
+        ratings INTEGER,
+        product_type TEXT,
+        price_excl_tax_gbp REAL,
+        price_incl_tax_gbp REAL,
+        tax REAL,
+        num_reviews INTEGER
+    )''']
+# The UPC keys and the genre index are built once the rows are in,
+# instead of being updated row by row.
+INDEXES = [
+    'CREATE UNIQUE INDEX in_stock_upc ON in_stock (upc)',
+    'CREATE UNIQUE INDEX books_upc ON books (upc)',
+    'CREATE INDEX books_genre_id ON books (genre_id)']
+
+
+def insert_rows(conn, table, df, batch_size=BATCH_SIZE):
+    """
+    Inserts a DataFrame into a table with executemany(), `batch_size` rows at a time.
+
+    Rows are built from whole columns (Series.tolist()), not row by row;
+    missing values arrive as None or NaN, both of which SQLite stores as NULL.
+
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction.
+        table (str): Table name; the DataFrame columns are inserted by name.
+        df (pd.DataFrame): Rows to insert.
+        batch_size (int): Rows per executemany() call.
+    """
+    columns = ', '.join(df.columns)
+    placeholders = ', '.join('?' * len(df.columns))
+    insert = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        conn.executemany(insert, zip(*(batch[column].tolist() for column in batch.columns)))
+
+
+def bulk_load(books_df, genre_df, in_stock_df, db_path=DATABASE_PATH, batch_size=BATCH_SIZE):
+    """
+    Builds the SQLite database in a temporary file and swaps it in atomically.
+
+    This function:
+    - Creates '<db_path>.tmp' with typed tables (see SCHEMA)
+    - Uses 16 KiB pages, WAL, synchronous=NORMAL and a CACHE_SIZE_KB page
+      cache while building
+    - Inserts all rows in one transaction with executemany() in batches
+      of `batch_size` rows
+    - Builds the UPC keys and the genre index after the insert (see
+      INDEXES) in the same transaction, then runs ANALYZE
+    - Switches the finished file back to a rollback journal, so it is a
+      single self-contained file, and renames it over `db_path`
+
+    Readers of `db_path` keep seeing the previous database until the
+    rename, never a half-loaded one; a failed load leaves it untouched.
+
+    Args:
+        books_df (pd.DataFrame): DataFrame containing book details.
+        genre_df (pd.DataFrame): DataFrame containing genre lookup values.
+        in_stock_df (pd.DataFrame): DataFrame containing book stock counts.
+        db_path (str): Database file to replace.
+        batch_size (int): Rows per executemany() call.
+    """
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    tmp_path = db_path + '.tmp'
+    for path in (tmp_path, tmp_path + '-wal', tmp_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute(f'PRAGMA page_size = {PAGE_SIZE}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+
+        conn.execute('BEGIN')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        insert_rows(conn, 'genres', genre_df, batch_size)
+        insert_rows(conn, 'in_stock', in_stock_df, batch_size)
+        insert_rows(conn, 'books', books_df, batch_size)
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('PRAGMA journal_mode = DELETE')
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+
+
 def load(books_df, genre_df, in_stock_df):
     """
     Loads the given DataFrames into a SQLite database named 'books.db'.
 
     This function:
-    - Connects to the SQLite database
-    - Saves three tables: books, genres, and in_stock
-    - Replaces the tables if they already exist
+    - Builds a new database file with the books, genres and in_stock tables
+      with bulk_load() (typed tables, batched inserts in one transaction,
+      keys and indexes built afterwards)
+    - Replaces the previous database file atomically
 
     Args:
         books_df (pd.DataFrame): DataFrame containing book details.
@@ -20,12 +135,6 @@ def load(books_df, genre_df, in_stock_df):
         in_stock_df (pd.DataFrame): DataFrame containing book stock counts.
     """
     try:
-        os.makedirs('data/4_database', exist_ok=True)
-        conn = sqlite3.connect('data/4_database/books.db')
-        books_df.to_sql('books', conn, if_exists='replace', index=False)
-        genre_df.to_sql('genres', conn, if_exists='replace', index=False)
-        in_stock_df.to_sql('in_stock', conn, if_exists='replace', index=False)
+        bulk_load(books_df, genre_df, in_stock_df)
     except Exception as e:
         logger.error(f"Error loading data: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
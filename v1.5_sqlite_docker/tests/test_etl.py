@@ -51,3 +51,29 @@ def test_load():
     assert count > 0, "Table 'books' is empty"
 
     conn.close()
+
+
+def test_bulk_load_swaps_database(tmp_path):
+    from etl.load import bulk_load
+
+    books_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/3_normalized_data/books.csv"))
+    genres_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/3_normalized_data/genres.csv"))
+    in_stock_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/3_normalized_data/in_stock.csv"))
+    db_path = str(tmp_path / "books.db")
+
+    bulk_load(books_df, genres_df, in_stock_df, db_path, batch_size=300)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == len(books_df)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    indexes = {row[1] for row in conn.execute("SELECT * FROM sqlite_master WHERE type = 'index'")}
+    assert {"books_upc", "in_stock_upc", "books_genre_id"} <= indexes
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO books (upc) VALUES (?)", (books_df["upc"][0],))
+    conn.close()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        bulk_load(pd.concat([books_df, books_df.head(1)]), genres_df, in_stock_df, db_path)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == len(books_df), "Failed load replaced the database"
+    conn.close()
+    assert not os.path.exists(db_path + ".tmp")
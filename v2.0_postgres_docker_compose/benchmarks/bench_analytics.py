@@ -0,0 +1,129 @@
+"""
+Times the dashboard queries and the upkeep of the genre_stats aggregates.
+
+Usage:
+    python benchmarks/bench_analytics.py --rows 1000000 --changes 1000
+
+A synthetic books table (see bench_load.py) is loaded with a replace
+load(), which builds the indexes and genre_stats after the COPY; the
+time of that step is shown separately. Then each dashboard query is
+timed against the raw tables and against its index or aggregate:
+
+    price by genre       GROUP BY over books vs the genre_summary view
+    rating distribution  GROUP BY over books vs the rating_distribution view
+    low stock            the 50 books with the fewest copies, sorted on
+                         `in_stock + 0` (no index) vs in_stock_in_stock_idx
+
+Finally a merge load() with --changes repriced books runs, the same
+books are updated again with the genre_stats trigger off and on (rolled
+back), and rebuild_genre_stats(), the full recompute, is timed.
+This replaces the contents of the books_website tables; run `python
+main.py` or load() afterwards to restore them. Needs a running
+PostgreSQL, see connection_params() in etl/db.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from decimal import Decimal
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_transform import synthetic_frame
+
+QUERIES = {
+    'price by genre': (
+        'SELECT genre_id, COUNT(*), AVG(price_incl_tax_gbp), MIN(price_incl_tax_gbp), MAX(price_incl_tax_gbp) '
+        'FROM books GROUP BY genre_id',
+        'SELECT genre_id, books, avg_price, min_price, max_price FROM genre_summary'),
+    'rating distribution': (
+        'SELECT ratings, COUNT(*) FROM books GROUP BY ratings',
+        'SELECT rating, books FROM rating_distribution'),
+    'low stock': (
+        'SELECT books.upc, titles, in_stock.in_stock FROM in_stock JOIN books USING (upc) '
+        'ORDER BY in_stock.in_stock + 0 LIMIT 50',
+        'SELECT books.upc, titles, in_stock.in_stock FROM in_stock JOIN books USING (upc) '
+        'ORDER BY in_stock.in_stock LIMIT 50'),
+}
+
+
+def timed(cur, query, repeat=5):
+    """Returns the best time of `repeat` runs of a query, in milliseconds, and its row count."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = cur.execute(query).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--changes', type=int, default=1000)
+    args = parser.parse_args()
+
+    from etl.analytics import rebuild_genre_stats, resume_analytics, suspend_analytics
+    from etl.db import connection
+    from etl.dictionary import Dictionary
+    from etl.load import load, prepare_database
+    from etl.normalize import split_tables
+    from etl.transform import transform_books
+
+    books_clean_df, _ = transform_books(synthetic_frame(args.rows))
+    genres = Dictionary('genre', directory=tempfile.mkdtemp())
+    books_df, in_stock_df = split_tables(books_clean_df, genres)
+    genre_df = genres.frame('genre')
+    del books_clean_df
+
+    prepare_database()
+    print(f'{args.rows} rows')
+    start = time.perf_counter()
+    load(books_df, genre_df, in_stock_df, mode='replace', workers=1)
+    print(f'replace load  {time.perf_counter() - start:>8.2f} s')
+    with connection() as conn:
+        with conn.cursor() as cur:
+            start = time.perf_counter()
+            suspend_analytics(cur)
+            resume_analytics(cur)
+            print(f'  of which rebuilding indexes and genre_stats  {time.perf_counter() - start:>8.2f} s')
+
+    with connection() as conn:
+        conn.execute('ANALYZE books, in_stock, genre_stats')
+        conn.commit()
+        with conn.cursor() as cur:
+            print(f'{"query":<20} {"raw ms":>9} {"indexed ms":>11} {"rows":>7}')
+            for name, (raw, indexed) in QUERIES.items():
+                raw_ms, indexed_ms, rows = timed(cur, raw)[0], *timed(cur, indexed)
+                print(f'{name:<20} {raw_ms:>9.1f} {indexed_ms:>11.1f} {rows:>7}')
+            plan = cur.execute(f'EXPLAIN {QUERIES["low stock"][1]}').fetchall()
+            print('low stock plan uses in_stock_in_stock_idx:', any('in_stock_in_stock_idx' in row[0] for row in plan))
+
+    changed_df = books_df.copy()
+    positions = range(0, len(changed_df), max(1, len(changed_df) // args.changes))[:args.changes]
+    column = changed_df.columns.get_loc('price_incl_tax_gbp')
+    changed_df.iloc[list(positions), column] = Decimal('1.00')
+    start = time.perf_counter()
+    load(changed_df, genre_df, in_stock_df, mode='merge')
+    print(f'merge load of {len(positions)} changes (incremental refresh)  {time.perf_counter() - start:>8.2f} s')
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # The same UPDATE with and without the trigger, rolled back: what the upkeep adds.
+            for enabled in (False, True):
+                cur.execute(f'ALTER TABLE books {"ENABLE" if enabled else "DISABLE"} TRIGGER books_genre_stats_update')
+                start = time.perf_counter()
+                cur.execute('UPDATE books SET price_incl_tax_gbp = 2 WHERE upc = ANY(%s::bpchar[])',
+                            (list(changed_df['upc'].iloc[list(positions)]),))
+                print(f'UPDATE of {cur.rowcount} books, trigger {"on " if enabled else "off"}  '
+                      f'{time.perf_counter() - start:>8.2f} s')
+                conn.rollback()
+            start = time.perf_counter()
+            rebuild_genre_stats(cur)
+            print(f'rebuild_genre_stats() (full refresh)  {time.perf_counter() - start:>8.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Compares the stage artifact formats on a synthetic cleaned frame.
+
+Usage:
+    python benchmarks/bench_artifacts.py --rows 1000000
+
+The raw frame is built like in bench_transform.py and cleaned with
+transform_books(); the cleaned frame is then written and read back once
+per format in a temporary directory. Reading it back is the hand-off to
+the next stage. CSV comes back untyped (strings, floats and NaN instead of
+categories, decimals and nullable integers); Parquet and Arrow come back
+with the dtypes they were written with.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_transform import synthetic_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    from etl.artifacts import FORMATS, artifact_path, read_artifact, write_artifact
+    from etl.transform import transform_books
+
+    books_clean_df, _ = transform_books(synthetic_frame(args.rows))
+    print(f'{args.rows} rows')
+    print(f'{"format":<8} {"size":>10} {"write":>8} {"read":>8}  dtypes kept')
+    with tempfile.TemporaryDirectory() as workdir:
+        artifact = os.path.join(workdir, 'books_cleaned_data')
+        for fmt in FORMATS:
+            start = time.perf_counter()
+            write_artifact(books_clean_df, artifact, fmt, index=True)
+            written = time.perf_counter()
+            read_df = read_artifact(artifact, fmt, csv_options={'index_col': 0})
+            read = time.perf_counter()
+            size = os.path.getsize(artifact_path(artifact, fmt)) / 2**20
+            kept = (read_df.dtypes == books_clean_df.dtypes).all()
+            print(f'{fmt:<8} {size:>6.1f} MiB {written - start:>6.2f} s {read - written:>6.2f} s  {"yes" if kept else "no"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmarks the async crawler against the serial crawler on a local stand-in site.
+
+Usage:
+    python benchmarks/bench_extract.py --books 200 --latency 0.02 --concurrency 4 16 32
+
+Both crawlers run in a temporary working directory, so the CSV artifacts in
+data/ are left untouched. Pages/sec counts catalogue and detail pages.
+The last rows re-run the async crawler with the response cache: a cold run,
+a warm run inside the TTL and a run that revalidates every page (TTL 0).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.stand_in_site import StandInSite, load_books
+
+
+def run(label, func, site, pages):
+    served_before = site.requests_served
+    bytes_before = site.bytes_served
+    start = time.perf_counter()
+    books_raw_df = func()
+    elapsed = time.perf_counter() - start
+    requests_made = site.requests_served - served_before
+    kib_served = (site.bytes_served - bytes_before) / 1024
+    print(f'{label:<28} {len(books_raw_df):>6} books {requests_made:>6} requests {kib_served:>8.0f} KiB '
+          f'{elapsed:>8.2f} s {pages / elapsed:>9.1f} pages/s')
+    return books_raw_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=200, help='number of books served by the stand-in site')
+    parser.add_argument('--latency', type=float, default=0.02, help='per-response latency in seconds')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16, 32])
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--rate', type=float, default=1000, help='initial and maximum requests/sec of the rate limiter')
+    parser.add_argument('--parse-workers', type=int, nargs='+', default=[0],
+                        help='parser processes for the async crawler, 0 parses on the event loop')
+    parser.add_argument('--skip-serial', action='store_true')
+    args = parser.parse_args()
+
+    books = load_books(args.books)
+    pages = len(books) + -(-len(books) // 20)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from etl.cache import ResponseCache
+        from etl.extract import extract, extract_serial
+        from etl.fetch import AdaptiveRateLimiter
+
+        def limiter():
+            return AdaptiveRateLimiter(rate=args.rate, max_rate=args.rate, burst=32)
+
+        with StandInSite(books, latency=args.latency, error_rate=args.error_rate) as site:
+            print(f'{len(books)} books, {pages} pages, {args.latency * 1000:.0f} ms latency')
+            baseline = None
+            if not args.skip_serial:
+                baseline = run('serial', lambda: extract_serial(site.base_url, limiter(), cache=False), site, pages)
+            for concurrency in args.concurrency:
+                for workers in args.parse_workers:
+                    result = run(f'async c={concurrency} parsers={workers}',
+                                 lambda: extract(site.base_url, concurrency=concurrency, limiter=limiter(), cache=False,
+                                                 parse_workers=workers), site, pages)
+                    if baseline is not None and not result.equals(baseline):
+                        print('  WARNING: output differs from the serial crawler')
+
+            concurrency = max(args.concurrency)
+            for label, ttl in (('cache cold', 3600), ('cache warm', 3600), ('cache revalidate', 0)):
+                cache = ResponseCache('http_cache', ttl=ttl)
+                run(f'async {label}', lambda: extract(site.base_url, concurrency, limiter=limiter(), cache=cache),
+                    site, pages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures how crawl throughput scales with the number of frontier workers.
+
+Usage:
+    python benchmarks/bench_frontier.py --books 2000 --latency 0.05 --workers 1 2 4
+
+For every worker count a crawl of a SyntheticCatalogue is started in the
+PostgreSQL frontier (etl/frontier.py) and that many worker processes,
+each with --concurrency requests in flight, crawl it like separate
+containers would. The workers are started first and the timer runs from
+starting the crawl, once they are waiting for it, to collecting the
+merged records. The stand-in site counts the requests it served, which
+must equal the number of pages: no URL fetched twice. Needs a running
+PostgreSQL, see connection_params() in etl/db.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.stand_in_site import StandInSite, SyntheticCatalogue
+
+WORKER = '''
+import sys
+from etl.fetch import AdaptiveRateLimiter
+from etl.frontier import run_worker
+rate = float(sys.argv[3])
+run_worker(sys.argv[1], concurrency=int(sys.argv[2]), limiter=AdaptiveRateLimiter(rate=rate, max_rate=rate),
+           cache=False, wait_seconds=60)
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.05, help='per-response latency in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight per worker')
+    parser.add_argument('--rate', type=float, default=1000, help='requests/sec of each worker')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds the workers get to start up')
+    args = parser.parse_args()
+
+    from etl.frontier import collect, start_crawl
+
+    pages = args.books + -(-args.books // 20)
+    print(f'{args.books} books, {pages} pages, {args.latency * 1000:.0f} ms latency, '
+          f'{args.concurrency} requests in flight per worker')
+    print(f'{"workers":<8} {"seconds":>8} {"pages/s":>9} {"vs first":>8}  requests')
+    baseline = None
+    with StandInSite(SyntheticCatalogue(args.books), latency=args.latency) as site:
+        for workers in args.workers:
+            crawl_id = f'bench-{workers}'
+            with tempfile.TemporaryDirectory() as workdir:
+                processes = [subprocess.Popen([sys.executable, '-c', WORKER, crawl_id, str(args.concurrency),
+                                               str(args.rate)], cwd=workdir, stderr=subprocess.DEVNULL,
+                                              env={**os.environ, 'PYTHONPATH': PROJECT_ROOT,
+                                                   'FRONTIER_POLL_SECONDS': '0.1'})
+                             for _ in range(workers)]
+                time.sleep(args.warmup)
+                served = site.requests_served
+                start = time.perf_counter()
+                start_crawl(crawl_id, site.base_url)
+                for process in processes:
+                    process.wait()
+            records = collect(crawl_id)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            requests = site.requests_served - served
+            check = 'ok' if requests == pages and len(records) == args.books else 'MISMATCH'
+            print(f'{workers:<8} {elapsed:>8.2f} {pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x  '
+                  f'{requests} ({check})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Simulates months of daily history snapshots and times the history queries.
+
+Usage:
+    python benchmarks/bench_history.py --books 100000 --days 180 --change-rate 0.01
+
+A synthetic catalogue (see bench_load.py) is recorded with
+record_history() once a day for --days days, with --change-rate of the
+books getting a new stock count (and a tenth of those a new price) each
+day. It reports the time per snapshot, the rows and size of
+price_history against a table that appended the full catalogue every
+day, and the best of five runs of:
+
+    point in time   totals of the whole catalogue on one day (prices_at())
+    trend           the versions of the book that changed most
+    month           every version opened in the last month (partition pruning + BRIN)
+
+It drops and recreates the price_history table of the books_website
+database. Needs a running PostgreSQL, see connection_params() in etl/db.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_analytics import timed
+from benchmarks.bench_transform import synthetic_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--change-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    from etl.db import connection
+    from etl.dictionary import Dictionary
+    from etl.history import record_history
+    from etl.load import prepare_database
+    from etl.normalize import split_tables
+    from etl.transform import transform_books
+
+    books_clean_df, _ = transform_books(synthetic_frame(args.books))
+    books_df, in_stock_df = split_tables(books_clean_df, Dictionary('genre', directory=tempfile.mkdtemp()))
+    books_df, in_stock_df = books_df.reset_index(drop=True), in_stock_df.reset_index(drop=True)
+    del books_clean_df
+
+    prepare_database(truncate=False)
+    rng = np.random.default_rng(1)
+    start_day = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    seconds = []
+    with connection() as conn:
+        conn.execute('DROP TABLE IF EXISTS price_history CASCADE')
+        conn.commit()
+        stock = in_stock_df.columns.get_loc('in_stock')
+        price = books_df.columns.get_loc('price_incl_tax_gbp')
+        for day in range(args.days):
+            changed = rng.choice(len(books_df), size=int(len(books_df) * args.change_rate), replace=False)
+            in_stock_df.iloc[changed, stock] = rng.integers(0, 30, size=len(changed))
+            books_df.iloc[changed[:len(changed) // 10], price] = Decimal(f'{10 + day % 40}.99')
+            started = time.perf_counter()
+            record_history(conn, books_df, in_stock_df, start_day + timedelta(days=day))
+            conn.commit()
+            seconds.append(time.perf_counter() - started)
+
+        with conn.cursor() as cur:
+            cur.execute('ANALYZE price_history')
+            rows, size = cur.execute("""
+                SELECT COUNT(*), (SELECT SUM(pg_total_relation_size(inhrelid)) FROM pg_inherits
+                                  WHERE inhparent = 'price_history'::regclass)
+                FROM price_history
+            """).fetchone()
+            full = args.books * args.days
+            print(f'{args.books} books, {args.days} daily snapshots, {args.change_rate:.1%} changed per day')
+            print(f'snapshot seconds: median {np.median(seconds):.2f}, last {seconds[-1]:.2f}')
+            print(f'price_history: {rows} rows, {size / 2**20:.1f} MiB '
+                  f'(full daily snapshots: {full} rows, {full / rows:.0f}x more)')
+
+            middle = start_day + timedelta(days=args.days // 2, hours=1)
+            last_month = start_day + timedelta(days=args.days - 30)
+            upc = cur.execute('SELECT upc FROM price_history GROUP BY upc ORDER BY COUNT(*) DESC LIMIT 1').fetchone()[0]
+            queries = {
+                'point in time': f"SELECT COUNT(*), SUM(price_incl_tax_gbp), SUM(in_stock) "
+                                 f"FROM prices_at('{middle.isoformat()}')",
+                'trend': f"SELECT valid_from, price_incl_tax_gbp, in_stock FROM price_history "
+                         f"WHERE upc = '{upc}' ORDER BY valid_from",
+                'month': f"SELECT COUNT(*) FROM price_history WHERE valid_from >= '{last_month.isoformat()}'",
+            }
+            print(f'{"query":<15} {"ms":>8} {"rows":>8}')
+            for name, query in queries.items():
+                ms, count = timed(cur, query)
+                print(f'{name:<15} {ms:>8.1f} {count:>8}')
+        conn.execute('DROP TABLE price_history CASCADE')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the ways load() can COPY the books table into PostgreSQL.
+
+Usage:
+    python benchmarks/bench_load.py --rows 1000000 --workers 1 4
+
+A synthetic books table is built like in bench_artifacts.py (transform
+and normalize of a sampled raw frame) and copied into a temporary table
+of the same shape, once per method:
+
+    csv-file     the CSV artifact streamed line by line (the previous load())
+    csv-memory   the DataFrame rendered with to_csv() and sent as text
+    binary       the DataFrame encoded as binary COPY blocks (etl/pgcopy.py)
+
+The CSV file is written before its timer starts. Every method must end up
+with the same row count and price total.
+
+Then a full replace load() runs once per --workers value, so the
+single-connection load can be compared with parallel_load(), which
+includes rebuilding keys and foreign keys and ANALYZE. This replaces the
+contents of the books_website tables; run `python main.py` or load()
+afterwards to restore them. Needs a running PostgreSQL, see
+connection_params() in etl/db.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_transform import synthetic_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    import psycopg
+
+    from etl.db import connection_params
+    from etl.load import TABLE_COLUMNS, copy_csv_file, copy_frame, load, prepare_database
+    from etl.dictionary import Dictionary
+    from etl.normalize import split_tables
+    from etl.transform import transform_books
+
+    books_clean_df, _ = transform_books(synthetic_frame(args.rows))
+    genres = Dictionary('genre', directory=tempfile.mkdtemp())
+    books_df, in_stock_df = split_tables(books_clean_df, genres)
+    genre_df = genres.frame('genre')
+    columns = ', '.join(TABLE_COLUMNS['books'])
+
+    def csv_memory(cur):
+        with cur.copy(f'COPY books ({columns}) FROM STDIN CSV') as copy:
+            copy.write(books_df.to_csv(index=False, header=False))
+
+    prepare_database()
+    with tempfile.TemporaryDirectory() as workdir, \
+            psycopg.connect(dbname='books_website', **connection_params()) as conn:
+        csv_path = os.path.join(workdir, 'books.csv')
+        books_df.to_csv(csv_path, index=False)
+        methods = {
+            'csv-file': lambda cur: copy_csv_file(cur, 'books', csv_path),
+            'csv-memory': csv_memory,
+            'binary': lambda cur: copy_frame(cur, 'books', books_df)}
+
+        print(f'{args.rows} rows')
+        print(f'{"method":<12} {"seconds":>8} {"rows/s":>10}  check')
+        with conn.cursor() as cur:
+            # Shadows the real table for this connection only, without its foreign keys.
+            cur.execute('CREATE TEMP TABLE books (LIKE public.books)')
+            for method, copy in methods.items():
+                cur.execute('TRUNCATE books')
+                conn.commit()
+                start = time.perf_counter()
+                copy(cur)
+                conn.commit()
+                elapsed = time.perf_counter() - start
+                count, total = cur.execute('SELECT COUNT(*), SUM(price_incl_tax_gbp) FROM books').fetchone()
+                print(f'{method:<12} {elapsed:>8.2f} {count / elapsed:>10.0f}  {count} rows, {total} GBP')
+
+    print(f'{"workers":<12} {"seconds":>8} {"rows/s":>10}  (full load())')
+    for workers in args.workers:
+        start = time.perf_counter()
+        load(books_df, genre_df, in_stock_df, mode='replace', workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f'{workers:<12} {elapsed:>8.2f} {len(books_df) / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
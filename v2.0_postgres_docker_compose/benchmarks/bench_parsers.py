@@ -0,0 +1,56 @@
+"""
+Micro-benchmark of the HTML parser backends on the saved fixture pages.
+
+Usage:
+    python benchmarks/bench_parsers.py --repeat 500
+
+Each backend parses tests/fixtures/book_page.html and
+tests/fixtures/catalogue_page.html `repeat` times. The records produced by
+every backend are compared with the BeautifulSoup reference.
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from etl.fetch import decode_html
+from etl.parsers import BACKENDS, get_parser
+
+FIXTURES = os.path.join(PROJECT_ROOT, 'tests/fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return decode_html(f.read())
+
+
+def time_calls(func, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(html)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    book_html = read_fixture('book_page.html')
+    catalogue_html = read_fixture('catalogue_page.html')
+    reference = get_parser('bs4').book_page(book_html)
+
+    print(f'{"backend":<8} {"book pages/s":>14} {"catalogue pages/s":>18}  matches bs4')
+    for name in BACKENDS:
+        backend = get_parser(name)
+        book_time = time_calls(backend.book_page, book_html, args.repeat)
+        catalogue_time = time_calls(lambda html: backend.catalogue_links(html, ''), catalogue_html, args.repeat)
+        matches = backend.book_page(book_html) == reference
+        print(f'{name:<8} {args.repeat / book_time:>14.0f} {args.repeat / catalogue_time:>18.0f}  {matches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Times every stage of the batch pipeline end to end against a synthetic stand-in site, and keeps the results.
+
+Usage:
+    python benchmarks/bench_pipeline.py --books 1000 10000 --latency 0.005
+    python benchmarks/bench_pipeline.py --books 1000 --no-load --baseline v2.1
+
+For every catalogue size a SyntheticCatalogue of that many books is served
+on localhost (see stand_in_site.py, with --latency and --error-rate
+injection), and extract, transform, normalize and load run in a fresh
+Python process in a temporary working directory. Each stage is timed with
+etl/metrics.py: wall and CPU time, rows/s and peak RSS, plus the requests
+and bytes of the crawl and the end-to-end time. The load replaces the
+contents of the 'books_website' tables (POSTGRES_* env vars); --no-load
+stops after normalize.
+
+Every run is appended to benchmarks/results/pipeline.jsonl with the git
+revision, machine and parameters, and compared with the latest earlier
+run of another revision with the same parameters (or the one given with
+--baseline). A stage more than --threshold slower (wall time, and by more
+than MIN_SLOWDOWN seconds) is reported as a regression and the exit
+status is 1.
+
+Crawling is bound by the requests: 1M books are 1.05M pages, which take
+about an hour at the default rate limit even with no latency.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.stand_in_site import StandInSite, SyntheticCatalogue
+
+RESULTS = os.path.join(PROJECT_ROOT, 'benchmarks/results/pipeline.jsonl')
+STAGES = ['extract', 'transform', 'normalize', 'load', 'total']
+# Slowdowns below this many seconds are timer noise, whatever the ratio.
+MIN_SLOWDOWN = 0.05
+
+
+def run_worker(base_url, concurrency, rate, load):
+    """Runs the pipeline in this process and returns the stage metrics."""
+    from etl.extract import extract
+    from etl.fetch import AdaptiveRateLimiter
+    from etl.load import load as load_tables
+    from etl.metrics import METRICS
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    limiter = AdaptiveRateLimiter(rate=rate, max_rate=rate, burst=64)
+    start, cpu = time.perf_counter(), time.process_time()
+    with METRICS.stage('extract') as stats:
+        books_raw_df = extract(base_url, concurrency=concurrency, limiter=limiter, cache=False, incremental=False)
+        stats['rows'] = len(books_raw_df)
+    with METRICS.stage('transform') as stats:
+        books_clean_df = transform(books_raw_df)
+        stats['rows'] = len(books_clean_df)
+    with METRICS.stage('normalize') as stats:
+        books_df, genre_df, in_stock_df = normalize(books_clean_df)
+        stats['rows'] = len(books_df)
+    if load:
+        with METRICS.stage('load') as stats:
+            load_tables(books_df, genre_df, in_stock_df, mode='replace')
+            stats['rows'] = len(books_df) + len(genre_df) + len(in_stock_df)
+    total, cpu = time.perf_counter() - start, time.process_time() - cpu
+
+    snapshot = METRICS.snapshot()
+    counters = {counter['name']: counter['value'] for counter in snapshot['counters'] if not counter['labels']}
+    stages = snapshot['stages']
+    stages['total'] = {'wall_seconds': total, 'cpu_seconds': cpu, 'rows': len(books_df),
+                       'rows_per_second': len(books_df) / total, 'peak_rss_bytes': snapshot['peak_rss_bytes']}
+    return {'stages': stages, 'http_requests': counters.get('http_requests_total', 0),
+            'http_bytes': counters.get('http_bytes_downloaded_total', 0)}
+
+
+def revision():
+    """The git revision of the working tree, '-dirty' when it has uncommitted changes."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def find_baseline(results_path, run, label=None):
+    """Returns the latest stored run with the same parameters, from `label` or else another revision."""
+    if not os.path.isfile(results_path):
+        return None
+    with open(results_path, 'r', encoding='utf-8') as f:
+        stored = [json.loads(line) for line in f if line.strip()]
+    for previous in reversed(stored):
+        if previous['params'] != run['params']:
+            continue
+        if (previous['revision'] == label) if label else (previous['revision'] != run['revision']):
+            return previous
+    return None
+
+
+def compare(run, baseline, threshold):
+    """Prints each stage against the baseline and returns the stages that slowed down by more than `threshold`."""
+    regressions = []
+    for stage in STAGES:
+        now, before = run['stages'].get(stage), baseline['stages'].get(stage)
+        if now is None or before is None or not before['wall_seconds']:
+            continue
+        ratio = now['wall_seconds'] / before['wall_seconds']
+        slowdown = now['wall_seconds'] - before['wall_seconds']
+        flag = 'REGRESSION' if ratio > 1 + threshold and slowdown > MIN_SLOWDOWN else ''
+        if flag:
+            regressions.append(stage)
+        print(f'  {stage:<10} {before["wall_seconds"]:>8.2f} s -> {now["wall_seconds"]:>8.2f} s  {ratio:>5.2f}x  {flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[1000, 10000], help='catalogue sizes')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic catalogue')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=5000, help='requests/sec of the rate limiter')
+    parser.add_argument('--no-load', action='store_true', help='stop after normalize')
+    parser.add_argument('--results', default=RESULTS, help='JSON lines file the runs are appended to')
+    parser.add_argument('--baseline', help='revision to compare with, default the latest other one')
+    parser.add_argument('--threshold', type=float, default=0.25, help='slowdown reported as a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.concurrency, args.rate, not args.no_load)))
+        return
+
+    regressions = []
+    for books in args.books:
+        params = {'books': books, 'seed': args.seed, 'latency': args.latency, 'error_rate': args.error_rate,
+                  'concurrency': args.concurrency, 'rate': args.rate, 'load': not args.no_load}
+        with StandInSite(SyntheticCatalogue(books, args.seed), args.latency, args.error_rate) as site, \
+                tempfile.TemporaryDirectory() as workdir:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', site.base_url,
+                       '--concurrency', str(args.concurrency), '--rate', str(args.rate)]
+            result = subprocess.run(command + (['--no-load'] if args.no_load else []), cwd=workdir,
+                                    capture_output=True, text=True,
+                                    env={**os.environ, 'PYTHONPATH': PROJECT_ROOT, 'ETL_PROFILE_STAGE': ''})
+        if result.returncode != 0:
+            print(f'{books} books: failed (exit code {result.returncode})\n{result.stderr[-2000:]}')
+            regressions.append(f'{books} books')
+            continue
+
+        run = {'revision': revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(), 'machine': f'{platform.machine()} {os.cpu_count()} CPUs',
+               'params': params, **json.loads(result.stdout.splitlines()[-1])}
+        print(f'{books} books, {run["http_requests"]} requests, {run["http_bytes"] / 2**20:.1f} MiB')
+        print(f'  {"stage":<10} {"wall s":>8} {"cpu s":>8} {"rows/s":>10} {"peak RSS":>10}')
+        for stage in STAGES:
+            record = run['stages'].get(stage)
+            if record:
+                print(f'  {stage:<10} {record["wall_seconds"]:>8.2f} {record.get("cpu_seconds", 0):>8.2f} '
+                      f'{record["rows_per_second"]:>10.0f} {(record["peak_rss_bytes"] or 0) / 2**20:>6.0f} MiB')
+
+        baseline = find_baseline(args.results, run, args.baseline)
+        if baseline is not None:
+            print(f'  compared with {baseline["revision"]} ({baseline["timestamp"]}):')
+            regressions += [f'{books} books {stage}' for stage in compare(run, baseline, args.threshold)]
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run) + '\n')
+
+    if regressions:
+        print(f'Regressions: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
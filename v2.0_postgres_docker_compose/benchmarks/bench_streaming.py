@@ -0,0 +1,88 @@
+"""
+Compares the time and peak memory of the batch pipeline and the streaming pipeline.
+
+Usage:
+    python benchmarks/bench_streaming.py --books 250 1000 2000
+    python benchmarks/bench_streaming.py --books 2000 --latency 0.01 --load
+
+For every catalogue size, each mode runs in a fresh Python process in a
+temporary working directory against the local stand-in site, and reports
+its wall time and peak resident set size (ru_maxrss). The batch
+pipeline's peak grows with the number of books; the streaming pipeline's
+should stay flat. 'sequential' is the streaming pipeline with its stages
+run one after another in one thread (queue size 0), so its time against
+'streaming' shows what overlapping the stages saves. All modes stop after
+the normalize step unless --load is given, in which case they load into
+the 'books_website' database (POSTGRES_* env vars).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.stand_in_site import StandInSite, load_books
+
+MODES = ('batch', 'sequential', 'streaming')
+
+
+def run_pipeline(mode, base_url, load):
+    """Runs one pipeline in this process and returns (books, seconds, peak RSS in MiB)."""
+    from etl.extract import extract, extract_batches
+    from etl.fetch import AdaptiveRateLimiter
+
+    limiter = AdaptiveRateLimiter(rate=1000, max_rate=1000, burst=32)
+    start = time.perf_counter()
+    if mode in ('sequential', 'streaming'):
+        from etl.stages import PIPELINE_QUEUE
+        from etl.streaming import run_streaming
+        books = run_streaming(extract_batches(base_url, limiter=limiter, cache=False), load=load,
+                              queue_size=PIPELINE_QUEUE if mode == 'streaming' else 0)
+    else:
+        from etl.load import load as load_tables
+        from etl.normalize import normalize
+        from etl.transform import transform
+        books_df, _, _ = normalize(transform(extract(base_url, limiter=limiter, cache=False)))
+        if load:
+            load_tables()
+        books = len(books_df)
+    elapsed = time.perf_counter() - start
+    return books, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, nargs='+', default=[250, 1000, 2000],
+                        help='catalogue sizes served by the stand-in site')
+    parser.add_argument('--load', action='store_true', help='also load into PostgreSQL')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-response latency in seconds')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_pipeline(args.worker, args.base_url, args.load)))
+        return
+
+    print(f'{"mode":<10} {"books":>7} {"seconds":>8} {"peak RSS":>10}')
+    for size in args.books:
+        with StandInSite(load_books(size), latency=args.latency) as site:
+            for mode in MODES:
+                with tempfile.TemporaryDirectory() as workdir:
+                    command = [sys.executable, os.path.abspath(__file__), '--worker', mode, '--base-url', site.base_url]
+                    if args.load:
+                        command.append('--load')
+                    output = subprocess.run(command, cwd=workdir, check=True, capture_output=True, text=True,
+                                            env={**os.environ, 'PYTHONPATH': PROJECT_ROOT}).stdout
+                books, elapsed, peak_mib = json.loads(output.splitlines()[-1])
+                print(f'{mode:<10} {books:>7} {elapsed:>8.2f} {peak_mib:>7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
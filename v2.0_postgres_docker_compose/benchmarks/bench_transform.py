@@ -0,0 +1,135 @@
+"""
+Benchmarks the vectorized transform against the previous column-by-column one.
+
+Usage:
+    python benchmarks/bench_transform.py --rows 1000000 10000000
+
+Synthetic raw frames are built by sampling rows of
+data/1_extract_raw_data/books_raw_data.csv with a unique UPC per row, so
+duplicate removal keeps every row. Each (implementation, size) pair runs
+in a fresh Python process and reports the transform time, the peak RSS
+on top of the raw frame (sampled with psutil) and the in-memory size of
+the parsed columns of the cleaned frame (everything but titles and UPC).
+A run that fails (e.g. out of memory) is reported as such.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+RAW_CSV = os.path.join(PROJECT_ROOT, 'data/1_extract_raw_data/books_raw_data.csv')
+
+
+def legacy_transform(books_raw_df):
+    """The transform body before the vectorized rewrite, kept as the baseline."""
+    check_duplicates=books_raw_df.duplicated().sum()
+    if check_duplicates !=0:
+        books_raw_df=books_raw_df.drop_duplicates()
+
+    check_null=books_raw_df.isnull().sum().sum()
+    if check_null!=0:
+        books_raw_df=books_raw_df.dropna()
+
+    books_raw_df['titles']=books_raw_df['titles'].astype(str)
+    books_raw_df['genre']=books_raw_df['genre'].astype(str)
+    books_raw_df['genre']= books_raw_df['genre'].replace(['Default', 'Add a comment'], 'Uncategorized')
+    books_raw_df['ratings']=books_raw_df['ratings'].astype(str)
+    rating_map = {'One': 1,'Two': 2,'Three': 3,'Four': 4,'Five': 5}
+    books_raw_df['ratings']=books_raw_df['ratings'].map(rating_map)
+    books_raw_df['upc']=books_raw_df['upc'].astype(str)
+    books_raw_df['product_type']=books_raw_df['product_type'].astype(str)
+    books_raw_df['price_excl_tax_gbp'] = books_raw_df['price_excl_tax_gbp'].astype(str).str[2:].astype(float)
+    books_raw_df['price_incl_tax_gbp'] = books_raw_df['price_incl_tax_gbp'].astype(str).str[2:].astype(float)
+    books_raw_df['tax'] = books_raw_df['tax'].str[2:].astype(float)
+    books_raw_df['in_stock']=books_raw_df['in_stock'].str.extract(r'(\d+)').astype(int)
+    books_raw_df['num_reviews']=books_raw_df['num_reviews'].astype(int)
+    return books_raw_df
+
+
+def synthetic_frame(rows, seed=0):
+    """Samples `rows` raw records (as strings, like extract() returns them) with unique UPCs."""
+    books_df = pd.read_csv(RAW_CSV, dtype=str, keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    books_raw_df = books_df.iloc[rng.integers(0, len(books_df), rows)].reset_index(drop=True)
+    books_raw_df['upc'] = np.char.mod('%016x', np.arange(rows))
+    return books_raw_df
+
+
+class PeakMemory:
+    """Samples the process RSS every few milliseconds and keeps the maximum (needs psutil)."""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self.stopped.wait(0.005):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.start = self.process.memory_info().rss
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def extra_mib(self):
+        return (self.peak - self.start) / 2**20
+
+
+def run_worker(implementation, rows):
+    """Transforms one synthetic frame in this process and returns the measurements."""
+    from etl.transform import transform_books
+
+    books_raw_df = synthetic_frame(rows)
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        if implementation == 'legacy':
+            books_clean_df = legacy_transform(books_raw_df)
+        else:
+            books_clean_df, _ = transform_books(books_raw_df)
+        elapsed = time.perf_counter() - start
+    parsed = books_clean_df.drop(columns=['titles', 'upc']).memory_usage(deep=True, index=False).sum()
+    return elapsed, memory.extra_mib(), parsed / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--implementations', nargs='+', default=['legacy', 'vectorized'],
+                        choices=['legacy', 'vectorized'])
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.rows[0])))
+        return
+
+    print(f'{"implementation":<12} {"rows":>10} {"seconds":>8} {"peak extra":>12} {"parsed cols":>12}')
+    for rows in args.rows:
+        for implementation in args.implementations:
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', implementation,
+                                     '--rows', str(rows)], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f'{implementation:<12} {rows:>10} failed (exit code {result.returncode})')
+                continue
+            elapsed, extra, size = json.loads(result.stdout.splitlines()[-1])
+            print(f'{implementation:<12} {rows:>10} {elapsed:>8.2f} {extra:>8.0f} MiB {size:>8.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
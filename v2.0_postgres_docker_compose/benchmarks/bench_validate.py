@@ -0,0 +1,74 @@
+"""
+Times the validation stage on large normalized batches.
+
+Usage:
+    python benchmarks/bench_validate.py --rows 1000000 10000000 --bad-rate 0.001
+
+Synthetic raw frames (see bench_transform.synthetic_frame()) are
+transformed and normalized, then --bad-rate of the books get an unknown
+genre_id and as many a duplicate UPC, and validate_books() is timed on
+them. Each size runs in a fresh Python process and reports the
+validation time, rows/s and the quarantined rows.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.bench_transform import synthetic_frame
+
+
+def run_worker(rows, bad_rate):
+    """Validates one synthetic batch in this process and returns (seconds, quarantined rows)."""
+    from etl.dictionary import Dictionary
+    from etl.normalize import split_tables
+    from etl.transform import transform_books
+    from etl.validate import validate_books
+
+    books_clean_df, _ = transform_books(synthetic_frame(rows))
+    genres = Dictionary('genre', directory=tempfile.mkdtemp())
+    books_df, in_stock_df = split_tables(books_clean_df, genres)
+    del books_clean_df
+    bad = np.random.default_rng(1).choice(rows, size=2 * int(rows * bad_rate), replace=False)
+    half = len(bad) // 2
+    books_df.iloc[bad[:half], books_df.columns.get_loc('genre_id')] = 999
+    books_df.iloc[bad[half:], books_df.columns.get_loc('upc')] = books_df['upc'].iloc[0]
+
+    start = time.perf_counter()
+    _, _, quarantine_df = validate_books(books_df, in_stock_df, genres.ids.values())
+    return time.perf_counter() - start, len(quarantine_df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--bad-rate', type=float, default=0.001, help='share of rows broken per rule')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.bad_rate)))
+        return
+
+    print(f'{"rows":>10} {"seconds":>8} {"rows/s":>12} {"quarantined":>12}')
+    for rows in args.rows:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(rows),
+                                 '--bad-rate', str(args.bad_rate)], capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONPATH': PROJECT_ROOT})
+        if result.returncode != 0:
+            print(f'{rows:>10} failed (exit code {result.returncode})')
+            continue
+        seconds, quarantined = json.loads(result.stdout.splitlines()[-1])
+        print(f'{rows:>10} {seconds:>8.2f} {rows / seconds:>12.0f} {quarantined:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+"""
+Local stand-in for https://books.toscrape.com/ used by the benchmarks.
+
+Serves catalogue pages (20 books per page, 'Page X of N' pager, 404 past the
+last page) and book detail pages in the site's HTML layout, built from the
+records in data/1_extract_raw_data/books_raw_data.csv or generated by
+SyntheticCatalogue for catalogues of any size. Pages are rendered when they
+are requested, so a million-book site needs no more memory than a small one.
+Like the real site, responses carry no charset, so the crawlers decode them
+as ISO-8859-1, and they carry ETag/Last-Modified validators honoured by
+conditional GETs.
+
+Usage (serve until Ctrl-C, then run main.py with BOOKS_BASE_URL set to the printed URL):
+    python benchmarks/stand_in_site.py --books 100000 --latency 0.02 --error-rate 0.01 --port 8000
+"""
+import argparse
+import hashlib
+import html
+import os
+import random
+import re
+import threading
+import time
+
+from collections.abc import Sequence
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_CSV = os.path.join(PROJECT_ROOT, 'data/1_extract_raw_data/books_raw_data.csv')
+BOOKS_PER_PAGE = 20
+LAST_MODIFIED = 'Thu, 26 Jun 2025 09:00:00 GMT'
+
+RATINGS = ['One', 'Two', 'Three', 'Four', 'Five']
+TITLE_WORDS = ['the', 'of', 'night', 'garden', 'secret', 'river', 'house', 'last', 'city', 'light', 'war',
+               'love', 'stars', 'history', 'guide', 'song', 'shadow', 'king', 'winter', 'island', 'café',
+               'naïve', 'über', 'señor', 'journey', 'mind', 'code', 'kitchen', 'little', 'empire']
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def unmangle(text):
+    """Reverses the ISO-8859-1 mis-decoding stored in the raw CSV ('Â£' -> '£')."""
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def load_books(limit=None):
+    """
+    Returns the raw records to serve, unmangled.
+
+    When `limit` exceeds the number of books in the raw CSV, the books are
+    repeated with a copy number appended to the title and worked into the
+    UPC, so that larger catalogues still consist of distinct books.
+    """
+    books_df = pd.read_csv(RAW_CSV, dtype=str, keep_default_na=False)
+    books = [{key: unmangle(value) for key, value in book.items()} for book in books_df.to_dict('records')]
+    if limit is None:
+        return books
+    scaled = books[:limit]
+    while len(scaled) < limit:
+        copy = len(scaled) // len(books)
+        for book in books[:limit - len(scaled)]:
+            scaled.append({**book, 'titles': f"{book['titles']} ({copy + 1})",
+                           'upc': f"{book['upc'][:12]}{copy:04x}"})
+    return scaled
+
+
+class SyntheticCatalogue(Sequence):
+    """
+    A generated catalogue of `count` books, each built from its index when it is accessed.
+
+    Book i is the same for a given `seed` on every run and machine: a random
+    title (some with accented words, like the real site), a genre of the raw
+    CSV, a rating, a price between £10 and £60, a stock count and a unique
+    UPC. Nothing is kept in memory, so catalogues of a million books are as
+    cheap to serve as small ones.
+
+    Args:
+        count (int): Number of books.
+        seed (int): Seed of the generator.
+    """
+
+    def __init__(self, count, seed=0):
+        self.count = count
+        self.seed = seed
+        self.genres = sorted({book['genre'] for book in load_books()})
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        rng = random.Random(f'{self.seed}:{index}')
+        words = rng.choices(TITLE_WORDS, k=rng.randint(2, 6))
+        price = f'£{rng.uniform(10, 60):.2f}'
+        return {'titles': ' '.join(words).capitalize(),
+                'genre': rng.choice(self.genres),
+                'ratings': rng.choice(RATINGS),
+                'upc': hashlib.blake2b(f'{self.seed}:{index}'.encode(), digest_size=8).hexdigest(),
+                'product_type': 'Books',
+                'price_excl_tax_gbp': price,
+                'price_incl_tax_gbp': price,
+                'tax': '£0.00',
+                'in_stock': f'In stock ({rng.randint(1, 22)} available)',
+                'num_reviews': '0'}
+
+
+def render_catalogue_page(books, page_num, page_count):
+    items = []
+    for book in books:
+        title = html.escape(book['titles'])
+        short_title = html.escape(book['titles'] if len(book['titles']) < 40 else book['titles'][:37] + '...')
+        items.append(f'''
+            <li class="col-xs-6 col-sm-4 col-md-3 col-lg-3">
+                <article class="product_pod">
+                    <div class="image_container">
+                        <a href="{book['href']}"><img src="../media/cache/{book['upc']}.jpg" alt="{title}" class="thumbnail"></a>
+                    </div>
+                    <p class="star-rating {book['ratings']}">
+                        <i class="icon-star"></i><i class="icon-star"></i><i class="icon-star"></i>
+                        <i class="icon-star"></i><i class="icon-star"></i>
+                    </p>
+                    <h3><a href="{book['href']}" title="{title}">{short_title}</a></h3>
+                    <div class="product_price">
+                        <p class="price_color">{book['price_incl_tax_gbp']}</p>
+                        <p class="instock availability"><i class="icon-ok"></i> In stock</p>
+                        <form><button type="submit" class="btn btn-primary btn-block" data-loading-text="Adding...">Add to basket</button></form>
+                    </div>
+                </article>
+            </li>''')
+
+    next_link = f'<li class="next"><a href="page-{page_num + 1}.html">next</a></li>' if page_num < page_count else ''
+    previous_link = f'<li class="previous"><a href="page-{page_num - 1}.html">previous</a></li>' if page_num > 1 else ''
+    return f'''<!DOCTYPE html>
+<html lang="en-us" class="no-js">
+<head><title>All products | Books to Scrape - Sandbox</title><meta charset="utf-8"></head>
+<body id="default" class="default">
+<div class="container-fluid page"><div class="page_inner">
+<ul class="breadcrumb"><li><a href="../index.html">Home</a></li><li class="active">All products</li></ul>
+<div class="row"><section>
+<div><strong>{len(books)}</strong> results.</div>
+<ol class="row">{''.join(items)}
+</ol>
+<div><ul class="pager">{previous_link}<li class="current">Page {page_num} of {page_count}</li>{next_link}</ul></div>
+</section></div>
+</div></div>
+</body>
+</html>'''
+
+
+def render_book_page(book):
+    title = html.escape(book['titles'])
+    genre = html.escape(book['genre'])
+    info_rows = [
+        ('UPC', book['upc']),
+        ('Product Type', book['product_type']),
+        ('Price (excl. tax)', book['price_excl_tax_gbp']),
+        ('Price (incl. tax)', book['price_incl_tax_gbp']),
+        ('Tax', book['tax']),
+        ('Availability', book['in_stock']),
+        ('Number of reviews', book['num_reviews'])]
+    table = '\n'.join(f'<tr><th>{key}</th><td>{html.escape(value)}</td></tr>' for key, value in info_rows)
+    return f'''<!DOCTYPE html>
+<html lang="en-us" class="no-js">
+<head><title>{title} | Books to Scrape - Sandbox</title><meta charset="utf-8"></head>
+<body id="default" class="default">
+<div class="container-fluid page"><div class="page_inner">
+<ul class="breadcrumb">
+    <li><a href="../../index.html">Home</a></li>
+    <li><a href="../category/books_1/index.html">Books</a></li>
+    <li><a href="../category/books/{slugify(book['genre'])}/index.html">{genre}</a></li>
+    <li class="active">{title}</li>
+</ul>
+<article class="product_page">
+<div class="row">
+    <div class="col-sm-6"><div id="product_gallery" class="carousel"><div class="thumbnail"><div class="carousel-inner"><div class="item active">
+        <img src="../../media/cache/{book['upc']}.jpg" alt="{title}" />
+    </div></div></div></div></div>
+    <div class="col-sm-6 product_main">
+        <h1>{title}</h1>
+        <p class="price_color">{book['price_incl_tax_gbp']}</p>
+        <p class="instock availability"><i class="icon-ok"></i> {html.escape(book['in_stock'])}</p>
+        <p class="star-rating {book['ratings']}">
+            <i class="icon-star"></i><i class="icon-star"></i><i class="icon-star"></i>
+            <i class="icon-star"></i><i class="icon-star"></i>
+        </p>
+        <hr/>
+    </div>
+</div>
+<div id="product_description" class="sub-header"><h2>Product Description</h2></div>
+<p>{title} is a book in the {genre} category. {'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8}</p>
+<div class="sub-header"><h2>Product Information</h2></div>
+<table class="table table-striped">
+{table}
+</table>
+</article>
+</div></div>
+</body>
+</html>'''
+
+
+class SitePages:
+    """
+    Renders the site's pages on request.
+
+    Book i is served at '<title slug>_<len(books) - i>/index.html' and
+    catalogue page n at 'page-<n>.html', like on the real site.
+
+    Args:
+        books (Sequence): Raw book records (dicts keyed by the raw CSV columns).
+    """
+
+    def __init__(self, books):
+        self.books = books
+        self.page_count = max(1, -(-len(books) // BOOKS_PER_PAGE))
+
+    def book(self, index):
+        book = self.books[index]
+        return {**book, 'href': f"{slugify(book['titles'])[:60]}_{len(self.books) - index}/index.html"}
+
+    def get(self, path):
+        """
+        Returns a page.
+
+        Args:
+            path (str): URL path below /catalogue/.
+
+        Returns:
+            bytes or None: The UTF-8 encoded page, None if there is no such page.
+        """
+        match = re.fullmatch(r'page-(\d+)\.html', path)
+        if match:
+            page_num = int(match.group(1))
+            if not 1 <= page_num <= self.page_count:
+                return None
+            start = (page_num - 1) * BOOKS_PER_PAGE
+            books = [self.book(index) for index in range(start, min(start + BOOKS_PER_PAGE, len(self.books)))]
+            return render_catalogue_page(books, page_num, self.page_count).encode('utf-8')
+        match = re.fullmatch(r'[^/]*_(\d+)/index\.html', path)
+        if match and 1 <= int(match.group(1)) <= len(self.books):
+            book = self.book(len(self.books) - int(match.group(1)))
+            if book['href'] == path:
+                return render_book_page(book).encode('utf-8')
+        return None
+
+
+class StandInSite:
+    """
+    Serves a rendered site on localhost from a background thread.
+
+    Args:
+        books (Sequence): Raw book records to serve, e.g. load_books() or a SyntheticCatalogue.
+        latency (float): Seconds each response is delayed by, to mimic network round trips.
+        error_rate (float): Share of requests answered with `error_status` (Retry-After: 0) instead of the page.
+        port (int): Port to bind, 0 picks a free one.
+        error_status (int): Status of the injected errors, e.g. 503, 429 or 500.
+    """
+
+    def __init__(self, books, latency=0.0, error_rate=0.0, port=0, error_status=503):
+        pages = SitePages(books)
+        self.requests_served = 0
+        self.errors_served = 0
+        self.not_modified_served = 0
+        self.bytes_served = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                site.requests_served += 1
+                if latency:
+                    time.sleep(latency)
+                body = pages.get(self.path.split('/catalogue/', 1)[-1])
+                if error_rate and random.random() < error_rate:
+                    site.errors_served += 1
+                    self.send_response(error_status)
+                    self.send_header('Retry-After', '0')
+                    body = f'<html><body><h1>{error_status} Error</h1></body></html>'.encode()
+                elif body is None:
+                    self.send_response(404)
+                    body = b'<html><body><h1>404 Not Found</h1></body></html>'
+                else:
+                    etag = '"%s"' % hashlib.md5(body).hexdigest()
+                    if self.headers.get('If-None-Match') == etag:
+                        site.not_modified_served += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', LAST_MODIFIED)
+                    site.bytes_served += len(body)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/catalogue/'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000, help='number of synthetic books')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic catalogue')
+    parser.add_argument('--real', action='store_true', help='serve the books of the raw CSV instead')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    books = load_books(args.books) if args.real else SyntheticCatalogue(args.books, args.seed)
+    with StandInSite(books, args.latency, args.error_rate, args.port, args.error_status) as site:
+        print(f'Serving {len(books)} books at {site.base_url} (Ctrl-C to stop)')
+        try:
+            site.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Makes the project root importable (etl, benchmarks) when pytest is run as `pytest tests/test_etl.py`.
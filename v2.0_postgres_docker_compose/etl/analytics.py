@@ -0,0 +1,221 @@
+from etl.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Indexes for the dashboard queries: books by genre, rating and price, and the low-stock list.
+# (genre_id, price) also makes a genre's cheapest and dearest book one index probe each.
+INDEXES = {
+    'books_genre_id_price_idx': 'books (genre_id, price_incl_tax_gbp)',
+    'books_ratings_idx': 'books (ratings)',
+    'books_price_incl_tax_gbp_idx': 'books (price_incl_tax_gbp)',
+    'in_stock_in_stock_idx': 'in_stock (in_stock)',
+}
+
+# Per-genre aggregates of the books table, kept up to date by the triggers below.
+# Sums and counts are stored (not averages) so they can be adjusted by deltas.
+GENRE_STATS_COLUMNS = '''
+    genre_id INTEGER PRIMARY KEY,
+    books BIGINT NOT NULL,
+    price_sum NUMERIC NOT NULL,
+    min_price NUMERIC(5,2),
+    max_price NUMERIC(5,2),
+    reviews BIGINT NOT NULL,
+    rating_1 BIGINT NOT NULL,
+    rating_2 BIGINT NOT NULL,
+    rating_3 BIGINT NOT NULL,
+    rating_4 BIGINT NOT NULL,
+    rating_5 BIGINT NOT NULL
+'''
+
+# Aggregates of a set of signed book rows (sign 1 for rows added, -1 for rows removed), by genre.
+GENRE_DELTAS = '''
+    SELECT genre_id,
+           SUM(sign) AS books,
+           COALESCE(SUM(sign * price_incl_tax_gbp), 0) AS price_sum,
+           MIN(price_incl_tax_gbp) FILTER (WHERE sign > 0) AS min_price,
+           MAX(price_incl_tax_gbp) FILTER (WHERE sign > 0) AS max_price,
+           COALESCE(SUM(sign * num_reviews), 0) AS reviews,
+           SUM(sign) FILTER (WHERE ratings = 1) AS rating_1,
+           SUM(sign) FILTER (WHERE ratings = 2) AS rating_2,
+           SUM(sign) FILTER (WHERE ratings = 3) AS rating_3,
+           SUM(sign) FILTER (WHERE ratings = 4) AS rating_4,
+           SUM(sign) FILTER (WHERE ratings = 5) AS rating_5
+    FROM ({rows}) AS changes
+    WHERE genre_id IS NOT NULL
+    GROUP BY genre_id
+'''
+
+SIGNED_ROWS = {
+    'INSERT': 'SELECT *, 1 AS sign FROM new_rows',
+    'UPDATE': 'SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 FROM old_rows',
+    'DELETE': 'SELECT *, -1 AS sign FROM old_rows',
+}
+
+# Adds the deltas of one statement's rows to genre_stats, in genre_id order so loads running
+# at the same time (e.g. from two containers) lock the rows in the same order; parallel_load()
+# disables the trigger and rebuilds the table afterwards instead. MIN/MAX only widen by deltas;
+# genres that lost their cheapest or dearest book get them looked up again in
+# books_genre_id_price_idx (see LOST_BOUNDS).
+APPLY_DELTAS = '''
+    INSERT INTO genre_stats AS stats
+    SELECT genre_id, books, price_sum, min_price, max_price, reviews,
+           COALESCE(rating_1, 0), COALESCE(rating_2, 0), COALESCE(rating_3, 0),
+           COALESCE(rating_4, 0), COALESCE(rating_5, 0)
+    FROM deltas ORDER BY genre_id
+    ON CONFLICT (genre_id) DO UPDATE SET
+        books = stats.books + EXCLUDED.books,
+        price_sum = stats.price_sum + EXCLUDED.price_sum,
+        min_price = LEAST(stats.min_price, EXCLUDED.min_price),
+        max_price = GREATEST(stats.max_price, EXCLUDED.max_price),
+        reviews = stats.reviews + EXCLUDED.reviews,
+        rating_1 = stats.rating_1 + EXCLUDED.rating_1,
+        rating_2 = stats.rating_2 + EXCLUDED.rating_2,
+        rating_3 = stats.rating_3 + EXCLUDED.rating_3,
+        rating_4 = stats.rating_4 + EXCLUDED.rating_4,
+        rating_5 = stats.rating_5 + EXCLUDED.rating_5
+'''
+
+# Genres whose lowest or highest price is among the rows removed, before the deltas are applied:
+# only these need their range recomputed (a genre that lost every book is among them).
+LOST_BOUNDS = '''
+    SELECT array_agg(DISTINCT removed.genre_id) INTO touched
+    FROM old_rows AS removed JOIN genre_stats AS stats USING (genre_id)
+    WHERE removed.price_incl_tax_gbp <= stats.min_price OR removed.price_incl_tax_gbp >= stats.max_price
+       OR stats.min_price IS NULL;
+'''
+
+TRIGGER_FUNCTION = f'''
+    CREATE OR REPLACE FUNCTION genre_stats_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        touched INTEGER[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            WITH deltas AS ({GENRE_DELTAS.format(rows=SIGNED_ROWS['INSERT'])}) {APPLY_DELTAS};
+            RETURN NULL;
+        END IF;
+        {LOST_BOUNDS}
+        IF TG_OP = 'UPDATE' THEN
+            WITH deltas AS ({GENRE_DELTAS.format(rows=SIGNED_ROWS['UPDATE'])}) {APPLY_DELTAS};
+        ELSE
+            WITH deltas AS ({GENRE_DELTAS.format(rows=SIGNED_ROWS['DELETE'])}) {APPLY_DELTAS};
+        END IF;
+        DELETE FROM genre_stats WHERE genre_id = ANY(touched) AND books <= 0;
+        UPDATE genre_stats AS stats SET
+            min_price = (SELECT MIN(price_incl_tax_gbp) FROM books WHERE books.genre_id = stats.genre_id),
+            max_price = (SELECT MAX(price_incl_tax_gbp) FROM books WHERE books.genre_id = stats.genre_id)
+        WHERE stats.genre_id = ANY(touched);
+        RETURN NULL;
+    END
+    $$
+'''
+
+TRUNCATE_FUNCTION = '''
+    CREATE OR REPLACE FUNCTION genre_stats_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        TRUNCATE genre_stats;
+        RETURN NULL;
+    END
+    $$
+'''
+
+# A trigger with transition tables fires for one event only, hence one per event.
+TRIGGERS = {
+    'books_genre_stats_insert': 'AFTER INSERT ON books REFERENCING NEW TABLE AS new_rows',
+    'books_genre_stats_update': 'AFTER UPDATE ON books REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+    'books_genre_stats_delete': 'AFTER DELETE ON books REFERENCING OLD TABLE AS old_rows',
+}
+
+VIEWS = {
+    'genre_summary': '''
+        SELECT stats.genre_id, genres.genre, stats.books,
+               ROUND(stats.price_sum / NULLIF(stats.books, 0), 2) AS avg_price,
+               stats.min_price, stats.max_price, stats.reviews,
+               stats.rating_1, stats.rating_2, stats.rating_3, stats.rating_4, stats.rating_5
+        FROM genre_stats AS stats LEFT JOIN genres USING (genre_id)
+    ''',
+    'rating_distribution': '''
+        SELECT counts.rating, SUM(counts.books)::BIGINT AS books
+        FROM genre_stats,
+             LATERAL (VALUES (1, rating_1), (2, rating_2), (3, rating_3), (4, rating_4), (5, rating_5))
+                 AS counts (rating, books)
+        GROUP BY counts.rating
+    ''',
+}
+
+
+def create_indexes(cur):
+    """Creates the dashboard indexes that don't exist, each in one sorted pass over its table."""
+    for name, definition in INDEXES.items():
+        cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+
+
+def suspend_analytics(cur):
+    """
+    Stops index and genre_stats upkeep for a bulk load into emptied tables.
+
+    Maintaining the indexes row by row and passing every row through the
+    insert trigger nearly doubles the time of a large COPY; building them
+    afterwards (resume_analytics()) takes one pass each. The changes are
+    transactional, so a load that fails and rolls back leaves them as they were.
+
+    Args:
+        cur (psycopg.Cursor): Cursor or connection of the loading transaction.
+    """
+    for name in INDEXES:
+        cur.execute(f'DROP INDEX IF EXISTS {name}')
+    cur.execute('ALTER TABLE books DISABLE TRIGGER books_genre_stats_insert')
+
+
+def resume_analytics(cur):
+    """Rebuilds the indexes and genre_stats after suspend_analytics() and re-enables the trigger."""
+    create_indexes(cur)
+    rebuild_genre_stats(cur)
+    cur.execute('ALTER TABLE books ENABLE TRIGGER books_genre_stats_insert')
+
+
+def rebuild_genre_stats(cur):
+    """Recomputes genre_stats from the whole books table (one scan)."""
+    cur.execute('TRUNCATE genre_stats')
+    cur.execute(f'''
+        WITH deltas AS ({GENRE_DELTAS.format(rows='SELECT *, 1 AS sign FROM books')})
+        {APPLY_DELTAS}
+    ''')
+
+
+def create_analytics(cur):
+    """
+    Creates the indexes, aggregate table and views that dashboards query, if they don't exist.
+
+    This function:
+    - Indexes books on (genre_id, price_incl_tax_gbp), ratings and price_incl_tax_gbp, and
+      in_stock on in_stock (the low-stock list)
+    - Creates 'genre_stats' (book count, price sum and range, reviews and
+      the rating counts of every genre) and fills it from books if new
+    - Installs statement-level triggers on books that apply each
+      statement's inserted, updated and deleted rows to genre_stats as
+      deltas, so a load only touches the aggregates of the genres it
+      changed, in the load's own transaction; a TRUNCATE of books empties it.
+      Bulk loads into emptied tables suspend this and rebuild instead
+      (suspend_analytics(), resume_analytics())
+    - Creates the 'genre_summary' (with average prices and genre names)
+      and 'rating_distribution' views over genre_stats
+
+    Args:
+        cur (psycopg.Cursor): Cursor on 'books_website', after the tables were created.
+    """
+    create_indexes(cur)
+
+    created = cur.execute("SELECT to_regclass('genre_stats') IS NULL").fetchone()[0]
+    cur.execute(f'CREATE TABLE IF NOT EXISTS genre_stats ({GENRE_STATS_COLUMNS})')
+    cur.execute(TRIGGER_FUNCTION)
+    cur.execute(TRUNCATE_FUNCTION)
+    for name, definition in TRIGGERS.items():
+        cur.execute(f'CREATE OR REPLACE TRIGGER {name} {definition} '
+                    'FOR EACH STATEMENT EXECUTE FUNCTION genre_stats_apply()')
+    cur.execute('CREATE OR REPLACE TRIGGER books_genre_stats_truncate AFTER TRUNCATE ON books '
+                'FOR EACH STATEMENT EXECUTE FUNCTION genre_stats_truncate()')
+    for name, query in VIEWS.items():
+        cur.execute(f'CREATE OR REPLACE VIEW {name} AS {query}')
+    if created:
+        rebuild_genre_stats(cur)
+        logger.info('Created genre_stats from the books table')
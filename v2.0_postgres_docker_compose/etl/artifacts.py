@@ -0,0 +1,186 @@
+import os
+
+import pandas as pd
+
+from etl.logger import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pa_ipc = pq = None
+
+logger = get_logger(__name__)
+
+ARTIFACT_FORMAT = os.getenv('ETL_ARTIFACT_FORMAT', 'csv')
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrows'}
+SCHEMA_VERSION = '1'
+SCHEMA_VERSION_KEY = b'books_etl.schema_version'
+
+RAW_DATA = 'data/1_extract_raw_data/books_raw_data'
+CLEANED_DATA = 'data/2_transform_data/books_cleaned_data'
+TRANSFORM_ISSUES = 'data/2_transform_data/transform_issues'
+BOOKS = 'data/3_normalized_data/books'
+GENRES = 'data/3_normalized_data/genres'
+IN_STOCK = 'data/3_normalized_data/in_stock'
+QUARANTINE = 'data/3_normalized_data/quarantine'
+
+
+def artifact_format(fmt=None):
+    """
+    Resolves the artifact format.
+
+    Args:
+        fmt (str): 'csv', 'parquet' or 'arrow' (Arrow IPC stream), None for ETL_ARTIFACT_FORMAT (default 'csv').
+
+    Returns:
+        str: The format to use.
+    """
+    fmt = fmt or ARTIFACT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown artifact format '{fmt}', expected one of {sorted(FORMATS)}")
+    if fmt != 'csv' and pa is None:
+        raise ImportError(f"The '{fmt}' artifact format needs pyarrow")
+    return fmt
+
+
+def artifact_path(artifact, fmt=None):
+    """
+    Returns the file path of an artifact, e.g. 'data/3_normalized_data/books.parquet'.
+
+    Args:
+        artifact (str): Artifact path without extension, one of the constants above.
+        fmt (str): Artifact format, None for ETL_ARTIFACT_FORMAT.
+    """
+    return artifact + FORMATS[artifact_format(fmt)]
+
+
+def decimal_types(arrow_type):
+    """Keeps decimal columns as pyarrow-backed decimals instead of Python Decimal objects."""
+    return pd.ArrowDtype(arrow_type) if pa.types.is_decimal(arrow_type) else None
+
+
+class ArtifactWriter:
+    """
+    Writes a stage artifact in one go or batch by batch.
+
+    CSV batches are appended to one file with a single header. Parquet
+    batches become row groups (zstd-compressed) and Arrow batches become
+    record batches (lz4-compressed) of one IPC stream, whose schema is
+    taken from the first batch; later batches are cast to it. The stream
+    rather than the file variant of IPC is used because it allows each
+    batch to carry its own category dictionary. Parquet and
+    Arrow files carry the pandas dtypes (categories, nullable integers,
+    decimals) and SCHEMA_VERSION in their metadata.
+
+    Data is written to '<path>.tmp' and renamed over the artifact on
+    close(), so readers never see a half-written file.
+
+    Use as `with ArtifactWriter(...) as writer`.
+
+    Args:
+        artifact (str): Artifact path without extension, one of the constants above.
+        fmt (str): Artifact format, None for ETL_ARTIFACT_FORMAT.
+        index (bool): Store the DataFrame index as well.
+    """
+
+    def __init__(self, artifact, fmt=None, index=False):
+        self.fmt = artifact_format(fmt)
+        self.path = artifact_path(artifact, self.fmt)
+        self.tmp_path = self.path + '.tmp'
+        self.index = index
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+        self.batches = 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, df):
+        """Appends one DataFrame to the artifact."""
+        if self.fmt == 'csv':
+            df.to_csv(self.tmp_path, index=self.index, mode='a' if self.batches else 'w', header=not self.batches)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=self.index)
+            if self.writer is None:
+                self.schema = table.schema.with_metadata(
+                    {**(table.schema.metadata or {}), SCHEMA_VERSION_KEY: SCHEMA_VERSION.encode()})
+                if self.fmt == 'parquet':
+                    self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression='zstd')
+                else:
+                    self.writer = pa_ipc.new_stream(self.tmp_path, self.schema,
+                                                    options=pa_ipc.IpcWriteOptions(compression='lz4'))
+            self.writer.write_table(table.cast(self.schema))
+        self.rows += len(df)
+        self.batches += 1
+
+    def close(self):
+        """Finishes the file and moves it into place. Nothing is written if write() was never called."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.batches:
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Discards the partial file and leaves the previous artifact in place."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def write_artifact(df, artifact, fmt=None, index=False):
+    """
+    Writes a DataFrame as a stage artifact.
+
+    Args:
+        df (pd.DataFrame): Data to write.
+        artifact (str): Artifact path without extension, one of the constants above.
+        fmt (str): Artifact format, None for ETL_ARTIFACT_FORMAT.
+        index (bool): Store the DataFrame index as well.
+    """
+    with ArtifactWriter(artifact, fmt, index) as writer:
+        writer.write(df)
+
+
+def read_artifact(artifact, fmt=None, csv_options=None):
+    """
+    Reads a stage artifact back into a DataFrame.
+
+    Parquet and Arrow files are memory-mapped and come back with the dtypes
+    they were written with. A file written with a different SCHEMA_VERSION
+    raises a ValueError, so a stale artifact is never loaded silently.
+
+    Args:
+        artifact (str): Artifact path without extension, one of the constants above.
+        fmt (str): Artifact format, None for ETL_ARTIFACT_FORMAT.
+        csv_options (dict): Extra pd.read_csv arguments for CSV artifacts, e.g. {'index_col': 0}.
+
+    Returns:
+        pd.DataFrame: The artifact's data.
+    """
+    fmt = artifact_format(fmt)
+    path = artifact_path(artifact, fmt)
+    if fmt == 'csv':
+        return pd.read_csv(path, **(csv_options or {}))
+
+    if fmt == 'parquet':
+        table = pq.read_table(path, memory_map=True)
+    else:
+        table = pa_ipc.open_stream(pa.memory_map(path)).read_all()
+    version = (table.schema.metadata or {}).get(SCHEMA_VERSION_KEY, b'').decode()
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"{path} has schema version '{version}', expected '{SCHEMA_VERSION}'; "
+                         f"re-run the pipeline to rebuild it")
+    return table.to_pandas(types_mapper=decimal_types)
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from etl.logger import get_logger
+from etl.metrics import METRICS
+
+logger = get_logger(__name__)
+
+CACHE_DIR = os.getenv('EXTRACT_CACHE_DIR', 'data/0_http_cache')
+CACHE_TTL = float(os.getenv('EXTRACT_CACHE_TTL', '3600'))
+CACHE_MAX_BYTES = int(os.getenv('EXTRACT_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+
+class CachedResponse:
+    """Minimal stand-in for a requests/httpx response served from the cache."""
+
+    def __init__(self, content, content_type):
+        self.status_code = 200
+        self.content = content
+        self.headers = {'content-type': content_type or ''}
+        self.from_cache = True
+
+
+class CacheEntry:
+    """One cached URL: body digest, validators and timestamps."""
+
+    def __init__(self, url, digest, content_type, etag, last_modified, fetched_at, ttl):
+        self.url = url
+        self.digest = digest
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.fresh = time.time() - fetched_at < ttl
+
+    def validators(self):
+        """
+        Returns:
+            dict: If-None-Match / If-Modified-Since headers for a conditional GET.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class CacheStats:
+    def __init__(self):
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evicted = 0
+        self.bytes_saved = 0
+
+    def summary(self):
+        lookups = self.fresh_hits + self.revalidated + self.misses
+        hit_rate = (self.fresh_hits + self.revalidated) / lookups if lookups else 0.0
+        return (f'{self.fresh_hits} fresh hits, {self.revalidated} revalidated (304), '
+                f'{self.misses} misses, hit rate {hit_rate:.0%}, {self.evicted} evicted, '
+                f'{self.bytes_saved / 1024:.0f} KiB not downloaded')
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for fetched pages.
+
+    Bodies are zlib-compressed and stored once per SHA-256 digest under
+    `<directory>/bodies/`, so identical pages share a file. A SQLite index
+    maps each URL to its digest, ETag, Last-Modified and timestamps.
+
+    Entries younger than `ttl` are served without touching the network.
+    Older entries are revalidated with a conditional GET, and a 304 only
+    refreshes the timestamp. When the bodies exceed `max_bytes`, the least
+    recently used entries are evicted.
+
+    The index is shared by the async crawler and threads, so every access
+    goes through one lock.
+
+    Args:
+        directory (str): Cache directory (env: EXTRACT_CACHE_DIR).
+        ttl (float): Seconds an entry is served without revalidation (env: EXTRACT_CACHE_TTL).
+        max_bytes (int): Size limit for the compressed bodies (env: EXTRACT_CACHE_MAX_MB).
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.stores = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            content_type TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            size INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self.conn.commit()
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest[:2], digest + '.z')
+
+    def lookup(self, url):
+        """
+        Returns:
+            CacheEntry or None: The cached entry for `url`, if any.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT digest, content_type, etag, last_modified, fetched_at FROM entries WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(self._body_path(row[0])):
+            with self._lock:
+                self.conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.conn.commit()
+            return None
+        return CacheEntry(url, *row, ttl=self.ttl)
+
+    def _read(self, entry):
+        with open(self._body_path(entry.digest), 'rb') as f:
+            content = zlib.decompress(f.read())
+        with self._lock:
+            self.conn.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (time.time(), entry.url))
+            self.conn.commit()
+        self.stats.bytes_saved += len(content)
+        return CachedResponse(content, entry.content_type)
+
+    def hit(self, entry):
+        """Serves a fresh entry without a request."""
+        self.stats.fresh_hits += 1
+        return self._read(entry)
+
+    def revalidated(self, entry, headers):
+        """Serves an entry the server answered with 304 Not Modified, restarting its TTL."""
+        self.stats.revalidated += 1
+        with self._lock:
+            self.conn.execute(
+                'UPDATE entries SET fetched_at = ?, etag = COALESCE(?, etag) WHERE url = ?',
+                (time.time(), headers.get('etag'), entry.url))
+            self.conn.commit()
+        return self._read(entry)
+
+    def store(self, url, content, headers):
+        """
+        Caches a 200 response body with its validators.
+
+        Args:
+            url (str): Requested URL.
+            content (bytes): Response body.
+            headers (Mapping): Response headers (case-insensitive lookup).
+        """
+        self.stats.misses += 1
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._body_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(content, 6))
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, digest, headers.get('content-type'), headers.get('etag'),
+                 headers.get('last-modified'), now, now, os.path.getsize(path)))
+            self.conn.commit()
+            self.stores += 1
+        if self.stores % 500 == 0:
+            self.evict()
+
+    def evict(self):
+        """Drops least recently used entries until the bodies fit into max_bytes."""
+        with self._lock:
+            total = self.conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.conn.execute('SELECT url, digest, size FROM entries ORDER BY accessed_at').fetchall()
+            for url, digest, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.stats.evicted += 1
+                shared = self.conn.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone()
+                if shared is None:
+                    total -= size
+                    try:
+                        os.remove(self._body_path(digest))
+                    except FileNotFoundError:
+                        pass
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self.conn.close()
+        METRICS.inc('http_cache_lookups_total', self.stats.fresh_hits, result='fresh')
+        METRICS.inc('http_cache_lookups_total', self.stats.revalidated, result='revalidated')
+        METRICS.inc('http_cache_lookups_total', self.stats.misses, result='miss')
+        METRICS.inc('http_cache_bytes_saved_total', self.stats.bytes_saved)
+        logger.info(f'HTTP cache: {self.stats.summary()}')
+
+
+def cached_response(cache, url, entry, response):
+    """
+    Updates the cache with a network response and returns what the caller should use.
+
+    Args:
+        cache (ResponseCache): The cache, None when caching is off.
+        url (str): Requested URL.
+        entry (CacheEntry): Stale entry the request revalidated, if any.
+        response: requests or httpx response.
+
+    Returns:
+        The cached body for a 304, otherwise `response` itself.
+    """
+    if cache is None:
+        return response
+    if response.status_code == 304 and entry is not None:
+        return cache.revalidated(entry, response.headers)
+    if response.status_code == 200:
+        cache.store(url, response.content, response.headers)
+    return response
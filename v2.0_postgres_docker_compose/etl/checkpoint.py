@@ -0,0 +1,170 @@
+import hashlib
+import json
+import math
+import os
+import time
+
+from etl.artifacts import artifact_format, artifact_path
+from etl.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINTS = os.getenv('ETL_CHECKPOINTS', '1') == '1'
+REUSE_EXTRACT = os.getenv('ETL_REUSE_EXTRACT', '0') == '1'
+MANIFEST_PATH = os.getenv('ETL_MANIFEST', 'data/checkpoint_manifest.json')
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Source files whose code decides each stage's output.
+STAGE_CODE = {
+    'extract': ['extract.py', 'crawler.py', 'fetch.py', 'parsers.py', 'incremental.py', 'stages.py'],
+    'transform': ['transform.py', 'dedup.py'],
+    'normalize': ['normalize.py', 'dictionary.py']}
+SHARED_CODE = ['artifacts.py', 'checkpoint.py']
+
+
+def file_digest(path):
+    """Returns the SHA-256 hex digest of a file's content."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def code_version(stage):
+    """
+    Returns a digest of the source code a stage's output depends on.
+
+    Args:
+        stage (str): A key of STAGE_CODE.
+
+    Returns:
+        str: SHA-256 over the stage's modules and the shared artifact code.
+    """
+    digest = hashlib.sha256()
+    for name in STAGE_CODE[stage] + SHARED_CODE:
+        digest.update(name.encode())
+        with open(os.path.join(PACKAGE_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Checkpoint manifest of the batch pipeline, kept in MANIFEST_PATH.
+
+    For every completed stage it records a fingerprint (the code version,
+    the content hashes of the input artifacts and the settings that change
+    the output) and the content hashes of the artifacts it wrote. A stage
+    is current when its fingerprint is unchanged and its outputs are still
+    on disk with the recorded content, so it can be skipped and its
+    artifacts read instead. Because the fingerprint uses content hashes, a
+    code change that leaves a stage's output identical does not invalidate
+    the stages after it.
+
+    Args:
+        path (str): Manifest file (env: ETL_MANIFEST).
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.stages = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.stages = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading checkpoint manifest, running every stage: {e}")
+
+    def fingerprint(self, stage, inputs=(), settings=None, state=()):
+        """
+        Builds a stage's fingerprint.
+
+        Args:
+            stage (str): A key of STAGE_CODE.
+            inputs (Iterable): Artifacts (paths without extension) the stage reads.
+            settings (dict): Other values the output depends on, JSON-serializable.
+            state (Iterable): Other files (paths) the stage reads and may update, e.g. a
+                persistent dictionary; a missing file counts as its own state.
+
+        Returns:
+            dict: The fingerprint, None if an input artifact is missing.
+        """
+        paths = [artifact_path(artifact) for artifact in inputs]
+        if not all(os.path.isfile(path) for path in paths):
+            return None
+        fingerprint = {'code': code_version(stage),
+                       'inputs': {path: file_digest(path) for path in paths},
+                       'settings': {'artifact_format': artifact_format(), **(settings or {})}}
+        if state:
+            fingerprint['state'] = {path: file_digest(path) if os.path.isfile(path) else None for path in state}
+        return fingerprint
+
+    def is_current(self, stage, fingerprint):
+        """
+        Tells whether a stage can be skipped.
+
+        Returns:
+            bool: True if the stage last ran with this fingerprint and its outputs are unchanged.
+        """
+        entry = self.stages.get(stage)
+        if fingerprint is None or entry is None or entry['fingerprint'] != fingerprint:
+            return False
+        return all(os.path.isfile(path) and file_digest(path) == digest for path, digest in entry['outputs'].items())
+
+    def record(self, stage, fingerprint, outputs, since=0):
+        """
+        Records a completed stage and saves the manifest.
+
+        Nothing is recorded if an output artifact is missing or older than
+        `since` (the stage logged an error instead of writing it), so the
+        stage runs again next time.
+
+        Args:
+            stage (str): A key of STAGE_CODE.
+            fingerprint (dict): The stage's fingerprint, see fingerprint().
+            outputs (Iterable): Artifacts (paths without extension) the stage wrote.
+            since (float): Time the stage started.
+        """
+        paths = [artifact_path(artifact) for artifact in outputs]
+        written = all(os.path.isfile(path) and os.path.getmtime(path) >= math.floor(since) for path in paths)
+        if fingerprint is None or not written:
+            self.stages.pop(stage, None)
+        else:
+            self.stages[stage] = {'fingerprint': fingerprint,
+                                  'outputs': {path: file_digest(path) for path in paths}}
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.stages, f, indent=2, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as e:
+            logger.error(f"Error saving checkpoint manifest: {e}")
+
+
+def run_stage(manifest, stage, run, reuse, inputs=(), outputs=(), settings=None, state=(), enabled=True):
+    """
+    Runs a pipeline stage unless its checkpoint is current.
+
+    Args:
+        manifest (Manifest): The run's checkpoint manifest.
+        stage (str): A key of STAGE_CODE.
+        run (callable): Runs the stage and returns its result.
+        reuse (callable): Reads the stage's result back from its artifacts.
+        inputs (Iterable): Artifacts the stage reads.
+        outputs (Iterable): Artifacts the stage writes.
+        settings (dict): Other values the output depends on.
+        state (Iterable): Files the stage reads and may update, see Manifest.fingerprint().
+        enabled (bool): False always runs the stage (it is still recorded).
+
+    Returns:
+        The stage's result, computed or reused.
+    """
+    fingerprint = manifest.fingerprint(stage, inputs, settings, state)
+    if enabled and manifest.is_current(stage, fingerprint):
+        logger.info(f"Checkpoint: '{stage}' is up to date, reusing its artifacts")
+        return reuse()
+    started = time.time()
+    result = run()
+    if state and fingerprint is not None:
+        # The stage may have updated its state files; the next run starts from what it left.
+        fingerprint = manifest.fingerprint(stage, inputs, settings, state)
+    manifest.record(stage, fingerprint, outputs, since=started)
+    return result
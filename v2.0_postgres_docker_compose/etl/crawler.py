@@ -0,0 +1,269 @@
+import asyncio
+import importlib.util
+import queue
+import threading
+import time
+
+from collections import deque
+from contextlib import aclosing
+
+from etl.extract import MAX_FAILED_PAGES, parse_book_page, parse_catalogue_page, parse_page_count
+from etl.fetch import AsyncFetcher, fetch_text
+from etl.logger import get_logger, with_log_context
+from etl.stages import PARSE_QUEUE, PARSE_WORKERS, ParseStage
+
+logger = get_logger(__name__)
+
+
+class Crawl:
+    """
+    State shared by the tasks of one async crawl.
+
+    Args:
+        fetcher (AsyncFetcher): Pooled, rate limited fetcher.
+        stage (ParseStage): Hands fetched pages to the parsers.
+        snapshot (ListingSnapshot): Previous run's listings, for incremental extraction.
+        base_url (str): Catalogue base URL.
+    """
+
+    def __init__(self, fetcher, stage, snapshot, base_url):
+        self.fetcher = fetcher
+        self.stage = stage
+        self.snapshot = snapshot
+        self.base_url = base_url
+
+    async def fetch_html(self, url):
+        """
+        Fetches one page through the shared async fetcher.
+
+        Returns:
+            str or None: Decoded HTML, None when the page does not exist.
+        """
+        start = time.monotonic()
+        response = await self.fetcher.get(url)
+        if response.status_code != 200:
+            return None
+        html = fetch_text(response)
+        self.stage.fetched(html, time.monotonic() - start)
+        return html
+
+    async def book(self, url):
+        """
+        Fetches and parses one book detail page.
+
+        Errors are logged and the book is skipped, as in the serial crawler.
+
+        Returns:
+            dict or None: The raw record, None if the book could not be processed.
+        """
+        try:
+            html = await self.fetch_html(url)
+            if html is None:
+                raise ValueError(f'page not found: {url}')
+            return await self.stage.parse(parse_book_page, html)
+        except Exception as e:
+            logger.error(f"Error processing book: {e}", extra={'url': url})
+            return None
+
+    async def listing(self, item):
+        """
+        Returns the raw record for one catalogue listing.
+
+        Books the snapshot reports as unchanged are carried forward without
+        a request; the others are fetched from their detail page.
+        """
+        record = self.snapshot.previous_record(item)
+        if record is not None:
+            self.snapshot.record(item, record, carried=True)
+            return record
+        record = await self.book(item['url'])
+        if record is not None:
+            self.snapshot.record(item, record)
+        return record
+
+    async def catalogue_page(self, page_num, html=None):
+        """
+        Crawls one catalogue page and all of its detail pages concurrently.
+
+        Args:
+            page_num (int): Catalogue page number.
+            html (str): Already fetched page HTML, if any.
+
+        Returns:
+            list or None: Raw records in page order, None if the page does not exist.
+        """
+        try:
+            if html is None:
+                html = await self.fetch_html(f'{self.base_url}page-{page_num}.html')
+            if html is None:
+                return None
+            items = await self.stage.parse(parse_catalogue_page, html, self.base_url)
+            logger.info(f'Scraping page {page_num}')
+        except Exception as e:
+            logger.error(f"Failed to load page {page_num}: {e}")
+            return []
+
+        records = await asyncio.gather(*(self.listing(item) for item in items))
+        return [record for record in records if record is not None]
+
+
+async def crawl_pages(base_url, concurrency, snapshot, http2=False, limiter=None, cache=None,
+                      parse_workers=PARSE_WORKERS, parse_queue=PARSE_QUEUE, window=None):
+    """
+    Crawls the catalogue and yields the records of each catalogue page in order.
+
+    The first catalogue page is fetched on its own to read the page count
+    from the pager. After that at most `window` catalogue pages (each with
+    its detail pages) are crawled at a time; the next page is scheduled as
+    soon as the oldest one has been yielded. With `window=None` every page
+    is scheduled at once. If the pager is missing, pages are crawled in
+    order until the first missing page, like the serial crawler.
+
+    Yields:
+        list: Raw records of one catalogue page, empty if the page failed.
+    """
+    if http2 and importlib.util.find_spec('h2') is None:
+        logger.warning('HTTP/2 requested but the h2 package is not installed, using HTTP/1.1')
+        http2 = False
+
+    async with AsyncFetcher(concurrency, http2, limiter, cache=cache) as fetcher, \
+            ParseStage(parse_workers, parse_queue) as stage:
+        crawl = Crawl(fetcher, stage, snapshot, base_url)
+        try:
+            first_page = await crawl.fetch_html(f'{base_url}page-1.html')
+        except Exception as e:
+            first_page = None
+            logger.error(f"Failed to load page 1: {e}")
+        if first_page is None:
+            logger.error('Catalogue page 1 could not be loaded')
+            return
+
+        page_count = parse_page_count(first_page)
+        if page_count is None:
+            yield await crawl.catalogue_page(1, first_page)
+            page_num = 2
+            failed_pages = 0
+            while failed_pages < MAX_FAILED_PAGES:
+                records = await crawl.catalogue_page(page_num)
+                if records is None:
+                    return
+                failed_pages = 0 if records else failed_pages + 1
+                yield records
+                page_num += 1
+            return
+
+        window = max(1, window or page_count)
+        pending = deque()
+        next_page = 1
+        try:
+            while pending or next_page <= page_count:
+                while len(pending) < window and next_page <= page_count:
+                    html = first_page if next_page == 1 else None
+                    pending.append(asyncio.ensure_future(crawl.catalogue_page(next_page, html)))
+                    next_page += 1
+                yield await pending.popleft() or []
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def crawl_async(base_url, concurrency, snapshot, http2=False, limiter=None, cache=None,
+                      parse_workers=PARSE_WORKERS, parse_queue=PARSE_QUEUE):
+    """
+    Crawls the whole catalogue with at most `concurrency` requests in flight.
+
+    Every catalogue page is scheduled at once (see crawl_pages).
+
+    Returns:
+        list: Raw records in catalogue order.
+    """
+    return [record async for page in crawl_pages(base_url, concurrency, snapshot, http2, limiter, cache,
+                                                 parse_workers, parse_queue)
+            for record in page]
+
+
+def crawl(base_url, snapshot, concurrency=16, http2=False, limiter=None, cache=None,
+          parse_workers=PARSE_WORKERS, parse_queue=PARSE_QUEUE):
+    """
+    Synchronous entry point for the async crawler.
+
+    Args:
+        base_url (str): Catalogue base URL.
+        snapshot (ListingSnapshot): Previous run's listings, for incremental extraction.
+        concurrency (int): Maximum number of requests in flight.
+        http2 (bool): Negotiate HTTP/2 when available.
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache): On-disk response cache, None to always hit the network.
+        parse_workers (int): Parser processes, 0 parses on the event loop (env: EXTRACT_PARSE_WORKERS).
+        parse_queue (int): Fetched pages waiting for a parser before fetching pauses (env: EXTRACT_PARSE_QUEUE).
+
+    Returns:
+        list: Raw records in catalogue order.
+    """
+    return asyncio.run(crawl_async(base_url, max(1, concurrency), snapshot, http2, limiter, cache,
+                                   parse_workers, parse_queue))
+
+
+def crawl_stream(base_url, snapshot, concurrency=16, http2=False, limiter=None, cache=None,
+                 parse_workers=PARSE_WORKERS, parse_queue=PARSE_QUEUE, window=4):
+    """
+    Synchronous generator over the catalogue pages of an async crawl.
+
+    The event loop runs in a background thread and hands each page's
+    records over a one-slot queue, so the crawler stays at most `window`
+    catalogue pages ahead of the consumer and memory does not grow with
+    the size of the catalogue. Closing the generator early stops the crawl.
+
+    Args:
+        base_url (str): Catalogue base URL.
+        snapshot (ListingSnapshot): Previous run's listings, for incremental extraction.
+        concurrency (int): Maximum number of requests in flight.
+        http2 (bool): Negotiate HTTP/2 when available.
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache): On-disk response cache, None to always hit the network.
+        parse_workers (int): Parser processes, 0 parses on the event loop.
+        parse_queue (int): Fetched pages waiting for a parser before fetching pauses.
+        window (int): Catalogue pages crawled ahead of the consumer.
+
+    Yields:
+        list: Raw records of one catalogue page, in catalogue order.
+    """
+    pages = queue.Queue(maxsize=1)
+    stop = threading.Event()
+
+    async def produce():
+        crawler = crawl_pages(base_url, max(1, concurrency), snapshot, http2, limiter, cache,
+                              parse_workers, parse_queue, window)
+        async with aclosing(crawler):
+            async for records in crawler:
+                await asyncio.to_thread(pages.put, records)
+                if stop.is_set():
+                    break
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            pages.put(e)
+        else:
+            pages.put(None)
+
+    thread = threading.Thread(target=with_log_context(run), name='crawler', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
@@ -0,0 +1,192 @@
+import atexit
+import os
+import threading
+
+from contextlib import contextmanager
+
+import psycopg
+
+from etl.logger import get_logger
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+logger = get_logger(__name__)
+
+# The pipeline's database; the tests point this at a throwaway one (tests/conftest.py).
+DATABASE = 'books_website'
+ADMIN_DATABASE = 'postgres'
+POOL_MIN_SIZE = int(os.getenv('POSTGRES_POOL_MIN_SIZE', '1'))
+# A parallel load (see parallel_load() in etl/load.py) holds LOAD_WORKERS + 1 connections at once.
+POOL_MAX_SIZE = max(int(os.getenv('POSTGRES_POOL_MAX_SIZE', '8')), int(os.getenv('LOAD_WORKERS', '1')) + 1)
+POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', '30'))
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+def connection_params():
+    """
+    Returns the PostgreSQL connection parameters.
+
+    They are read from environment variables with the following defaults:
+        - POSTGRES_USER (default: 'postgres')
+        - POSTGRES_PASSWORD (default: 'postgres')
+        - POSTGRES_HOST (default: 'localhost')
+        - POSTGRES_PORT (default: '5432')
+
+    Returns:
+        dict: Keyword arguments for psycopg.connect, without dbname.
+    """
+    return {
+        'user': os.getenv("POSTGRES_USER", "postgres"),
+        'password': os.getenv("POSTGRES_PASSWORD", "postgres"),
+        'host': os.getenv("POSTGRES_HOST", "localhost"),
+        'port': os.getenv("POSTGRES_PORT", "5432")}
+
+
+def get_pool(dbname=None):
+    """
+    Returns the connection pool of a database, opening it on first use.
+
+    There is one pool per database for the whole run, sized by
+    POSTGRES_POOL_MIN_SIZE and POSTGRES_POOL_MAX_SIZE (default 1 and 8),
+    but at least LOAD_WORKERS + 1 connections so a parallel load does not
+    wait on itself.
+    Connections are health-checked when they are handed out, so one
+    dropped by the server is replaced instead of failing the caller.
+    Connections to the 'postgres' maintenance database are in autocommit
+    mode (CREATE DATABASE cannot run in a transaction).
+
+    Args:
+        dbname (str): Database name, None for DATABASE.
+
+    Returns:
+        ConnectionPool: The pool, None if psycopg_pool is not installed.
+    """
+    if ConnectionPool is None:
+        return None
+    dbname = dbname or DATABASE
+    with POOLS_LOCK:
+        if dbname not in POOLS:
+            POOLS[dbname] = ConnectionPool(
+                kwargs={'dbname': dbname, 'autocommit': dbname == ADMIN_DATABASE, **connection_params()},
+                min_size=POOL_MIN_SIZE, max_size=max(POOL_MIN_SIZE, POOL_MAX_SIZE), timeout=POOL_TIMEOUT,
+                check=ConnectionPool.check_connection, name=dbname, open=True)
+        return POOLS[dbname]
+
+
+@contextmanager
+def connection(dbname=None):
+    """
+    Borrows a connection from the database's pool.
+
+    Use as `with connection() as conn`. Like `with psycopg.connect(...)`, the
+    transaction is committed when the block ends and rolled back if it
+    raises; the connection then goes back to the pool instead of being
+    closed. Without psycopg_pool a new connection is opened and closed.
+
+    Args:
+        dbname (str): Database name, None for DATABASE.
+
+    Yields:
+        psycopg.Connection: The connection.
+    """
+    dbname = dbname or DATABASE
+    pool = get_pool(dbname)
+    if pool is None:
+        with psycopg.connect(dbname=dbname, autocommit=dbname == ADMIN_DATABASE, **connection_params()) as conn:
+            yield conn
+        return
+    with pool.connection() as conn:
+        yield conn
+
+
+def pool_capacity(dbname=None):
+    """
+    Returns the most connections the database's pool hands out at once.
+
+    Args:
+        dbname (str): Database name, None for DATABASE.
+
+    Returns:
+        int: The pool's maximum size, None without psycopg_pool (no limit).
+    """
+    pool = get_pool(dbname)
+    return None if pool is None else pool.max_size
+
+
+def create_database(dbname=None):
+    """
+    Creates a database if it doesn't exist.
+
+    Several containers may try at the same time; the ones that lose the
+    race find the database already there.
+
+    Args:
+        dbname (str): Database name, None for DATABASE.
+    """
+    dbname = dbname or DATABASE
+    with connection(ADMIN_DATABASE) as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute(f'CREATE DATABASE {dbname}')
+            except (psycopg.errors.DuplicateDatabase, psycopg.errors.UniqueViolation):
+                logger.info(f'Database {dbname} already exists')
+
+
+def drop_database(dbname):
+    """
+    Closes the pool of a database and drops the database, if it exists.
+
+    Connections other processes still have open are terminated.
+
+    Args:
+        dbname (str): Database name.
+    """
+    with POOLS_LOCK:
+        pool = POOLS.pop(dbname, None)
+    if pool is not None:
+        pool.close()
+    with connection(ADMIN_DATABASE) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS {dbname} WITH (FORCE)')
+
+
+def pool_metrics():
+    """
+    Returns the counters of every open pool.
+
+    Among them: 'requests_num' (checkouts), 'requests_queued' (checkouts
+    that had to wait), 'requests_wait_ms' (total wait), 'usage_ms' (total
+    time connections were checked out), 'connections_num' (connections
+    opened), 'pool_size' and 'pool_available'. A growing wait time under
+    concurrent loads means POSTGRES_POOL_MAX_SIZE is too small.
+
+    Returns:
+        dict: Counters per database name.
+    """
+    with POOLS_LOCK:
+        return {dbname: pool.get_stats() for dbname, pool in POOLS.items()}
+
+
+def close_pools(report=True):
+    """
+    Closes every pool.
+
+    Args:
+        report (bool): Log each pool's checkout and wait-time metrics first.
+    """
+    for dbname, stats in (pool_metrics() if report else {}).items():
+        logger.info(f"Connection pool '{dbname}': {stats.get('requests_num', 0)} checkouts, "
+                    f"{stats.get('requests_queued', 0)} waited {stats.get('requests_wait_ms', 0)} ms in total, "
+                    f"{stats.get('connections_num', 0)} connections opened, max size {stats.get('pool_max')}")
+    with POOLS_LOCK:
+        for pool in POOLS.values():
+            pool.close()
+        POOLS.clear()
+
+
+# Pools still open at exit (e.g. after the tests) are closed quietly.
+atexit.register(close_pools, report=False)
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from etl.logger import get_logger
+from etl.metrics import METRICS
+
+logger = get_logger(__name__)
+
+DEDUP_INDEX = os.getenv('ETL_DEDUP_INDEX', 'data/dedup_index.npz')
+SKIP_UNCHANGED = os.getenv('LOAD_SKIP_UNCHANGED', '1') == '1'
+
+NEW, UNCHANGED, CHANGED = 0, 1, 2
+STATUS_NAMES = ('new', 'unchanged', 'changed')
+
+# Hash of a missing value, and the multiplier that mixes the column hashes of a row.
+MISSING_HASH = np.uint64(0x9E3779B97F4A7C15)
+MIX = np.uint64(0x100000001B3)
+
+
+def repeated_rows(df, key='upc'):
+    """
+    Marks rows that repeat an earlier row exactly, comparing whole rows only where the key repeats.
+
+    An exact repeat has the same key, so the full-row comparison only runs
+    on the (usually few) rows whose key occurs more than once, instead of
+    hashing every column of every row like DataFrame.duplicated().
+
+    Args:
+        df (pd.DataFrame): Rows of one run or batch.
+        key (str): Key column.
+
+    Returns:
+        np.ndarray: Boolean mask, True for the repeats (the first occurrence is False).
+    """
+    candidates = df[key].duplicated(keep=False).to_numpy()
+    repeated = np.zeros(len(df), dtype=bool)
+    if candidates.any():
+        repeated[candidates] = df[candidates].duplicated().to_numpy()
+    return repeated
+
+
+def row_fingerprints(df):
+    """
+    Returns a 64-bit fingerprint of every row that is stable across runs.
+
+    Each column is factorized and only its distinct values are hashed (by
+    their text, with pandas' fixed-key SipHash), so low-cardinality columns
+    cost one hash per value, not per row.
+
+    Args:
+        df (pd.DataFrame): Rows to fingerprint.
+
+    Returns:
+        np.ndarray: uint64 fingerprints.
+    """
+    fingerprints = np.zeros(len(df), dtype='uint64')
+    for column in df.columns:
+        codes, uniques = pd.factorize(df[column])
+        hashes = pd.util.hash_array(np.asarray(pd.Index(uniques).astype(str), dtype=object))
+        fingerprints = (fingerprints * MIX) ^ np.append(hashes, MISSING_HASH)[codes]
+    return fingerprints
+
+
+class DedupIndex:
+    """
+    UPC-keyed record of the rows in the database and their fingerprints.
+
+    The index is saved as two arrays in an .npz file: the UPCs as fixed
+    width bytes and a uint64 fingerprint per UPC, 24 bytes per book.
+    Lookups go through a hash table (pd.Index), one O(1) probe per row, and
+    classify each row as new, unchanged or changed since the index was
+    written; the UPCs that are no longer there are the removed ones.
+
+    It describes what the last load left in the database, so it is only
+    written after a load commits, and cleared by loads that do not keep it
+    up to date. Delete the file to make the next merge load compare every
+    row again.
+
+    Args:
+        path (str): Index file, None for ETL_DEDUP_INDEX.
+    """
+
+    def __init__(self, path=None):
+        self.path = path = path or DEDUP_INDEX
+        self.keys = np.array([], dtype='S1')
+        self.fingerprints = np.array([], dtype='uint64')
+        if os.path.isfile(path):
+            try:
+                with np.load(path, allow_pickle=False) as stored:
+                    self.keys, self.fingerprints = stored['keys'], stored['fingerprints']
+            except Exception as e:
+                logger.error(f"Error reading dedup index, comparing every row: {e}")
+        self.lookup = pd.Index(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def encode_keys(keys):
+        return np.array(pd.Series(keys).astype(str).str.strip().to_numpy(dtype=str), dtype='S')
+
+    def classify(self, keys, fingerprints):
+        """
+        Compares rows with the index.
+
+        Args:
+            keys (Iterable): UPCs of the rows.
+            fingerprints (np.ndarray): Their row_fingerprints().
+
+        Returns:
+            tuple: Status per row (NEW, UNCHANGED or CHANGED) and the UPCs
+                in the index that are not among `keys` (str).
+        """
+        keys = self.encode_keys(keys)
+        positions = self.lookup.get_indexer(keys)
+        known = positions >= 0
+        status = np.full(len(keys), NEW, dtype='int8')
+        status[known] = np.where(self.fingerprints[positions[known]] == fingerprints[known], UNCHANGED, CHANGED)
+        removed = self.keys[pd.Index(keys).get_indexer(self.keys) < 0].astype(str)
+        for code, name in enumerate(STATUS_NAMES):
+            METRICS.inc('dedup_rows_total', int((status == code).sum()), status=name)
+        return status, removed
+
+    def replace(self, keys, fingerprints):
+        """Makes the index describe exactly these rows."""
+        self.keys = self.encode_keys(keys)
+        self.fingerprints = np.asarray(fingerprints, dtype='uint64')
+        self.lookup = pd.Index(self.keys)
+
+    def save(self):
+        """Writes the index (to a temporary file that replaces it)."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        np.savez(tmp_path, keys=self.keys, fingerprints=self.fingerprints)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forgets the rows, e.g. after a load that did not go through the index."""
+        self.replace([], np.array([], dtype='uint64'))
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from etl.logger import get_logger
+
+logger = get_logger(__name__)
+
+DICTIONARY_DIR = os.getenv('ETL_DICTIONARY_DIR', 'data/dictionaries')
+
+
+def dictionary_path(name, directory=DICTIONARY_DIR):
+    """Returns the CSV file of a dictionary."""
+    return os.path.join(directory, f'{name}.csv')
+
+
+class Dictionary:
+    """
+    Persistent value-to-ID mapping of a low-cardinality column.
+
+    The mapping is kept in '<directory>/<name>.csv' (id, value). IDs are
+    never reassigned: values seen in earlier runs keep their ID and new
+    values get the next free ones, in alphabetical order within one call.
+    A new genre therefore leaves the genre_id of every existing book as it
+    was, and a merge load only writes the rows that really changed.
+
+    Columns are encoded with pd.factorize(): the mapping is looked up once
+    per distinct value, not once per row, and category columns are not
+    even scanned.
+
+    Args:
+        name (str): Dictionary name, e.g. 'genre'.
+        directory (str): Directory of the dictionary files (env: ETL_DICTIONARY_DIR).
+    """
+
+    def __init__(self, name, directory=DICTIONARY_DIR):
+        self.name = name
+        self.path = dictionary_path(name, directory)
+        self.ids = {}
+        self.changed = False
+        if os.path.isfile(self.path):
+            try:
+                stored = pd.read_csv(self.path, dtype={'id': 'int64', 'value': str}, keep_default_na=False)
+                self.ids = dict(zip(stored['value'], stored['id']))
+            except Exception as e:
+                raise ValueError(f"Dictionary '{name}' in {self.path} cannot be read: {e}")
+
+    def add(self, values):
+        """
+        Gives the values not in the dictionary yet the next free IDs.
+
+        Surrounding whitespace is stripped and missing values are ignored.
+
+        Args:
+            values (Iterable): Values of the current data, repeated or not.
+
+        Returns:
+            pd.DataFrame: The added entries (id, value), empty if there were none.
+        """
+        uniques = pd.Series(pd.unique(pd.Series(values, dtype=object).dropna().astype(str).str.strip()))
+        new_values = sorted(set(uniques) - self.ids.keys())
+        start = max(self.ids.values(), default=0) + 1
+        for idx, value in enumerate(new_values, start=start):
+            self.ids[value] = idx
+        if new_values:
+            self.changed = True
+            logger.info(f"Dictionary '{self.name}': {len(new_values)} new values, {len(self.ids)} in total")
+        return pd.DataFrame({'id': range(start, start + len(new_values)), 'value': new_values})
+
+    def encode(self, values, dtype='Int16'):
+        """
+        Replaces every value with its ID, adding values that are new.
+
+        Args:
+            values (pd.Series): Column to encode (strings or categories).
+            dtype (str): Nullable integer dtype of the result.
+
+        Returns:
+            pd.Series: The IDs, with the index of `values`; missing values stay missing.
+        """
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.strip()
+        self.add(uniques)
+        lookup = np.array([self.ids[value] for value in uniques] + [0], dtype='int64')
+        # factorize() marks missing values with code -1, which picks the trailing 0.
+        ids = pd.array(lookup[codes], dtype=dtype)
+        ids[codes < 0] = pd.NA
+        return pd.Series(ids, index=values.index, name=values.name)
+
+    def frame(self, column='value'):
+        """
+        Returns the whole dictionary as a lookup table ordered by ID.
+
+        Args:
+            column (str): Name of the value column, e.g. 'genre'.
+        """
+        entries = sorted(self.ids.items(), key=lambda item: item[1])
+        return pd.DataFrame({'id': [idx for _, idx in entries], column: [value for value, _ in entries]})
+
+    def save(self):
+        """Writes the dictionary back if values were added (to a temporary file that replaces it)."""
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.frame().to_csv(self.path + '.tmp', index=False)
+        os.replace(self.path + '.tmp', self.path)
+        self.changed = False
@@ -1,90 +1,293 @@
 import os
-import requests
-import time
+
+from contextlib import closing
 
 import pandas as pd
 
+from etl.artifacts import RAW_DATA, ArtifactWriter, write_artifact
+from etl.cache import ResponseCache
+from etl.fetch import FetchError, Fetcher, fetch_text
+from etl.incremental import INCREMENTAL, ListingSnapshot
 from etl.logger import get_logger
-from bs4 import BeautifulSoup
+from etl.parsers import get_parser
+from etl.stages import PARSE_WORKERS
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 logger = get_logger(__name__)
 
-def extract():
+BASE_URL = os.getenv('BOOKS_BASE_URL', 'https://books.toscrape.com/catalogue/')
+CONCURRENCY = int(os.getenv('EXTRACT_CONCURRENCY', '16'))
+HTTP2 = os.getenv('EXTRACT_HTTP2', '0') == '1'
+CACHE = os.getenv('EXTRACT_CACHE', '1') == '1'
+STREAM_WINDOW = int(os.getenv('EXTRACT_STREAM_WINDOW', '4'))
+FRONTIER = os.getenv('EXTRACT_FRONTIER', '0') == '1'
+MAX_FAILED_PAGES = 3
+
+RAW_COLUMNS = [
+    'titles', 'genre', 'ratings', 'upc', 'product_type',
+    'price_excl_tax_gbp', 'price_incl_tax_gbp', 'tax', 'in_stock',
+    'num_reviews']
+
+
+def parse_catalogue_page(html, base_url=BASE_URL):
+    """
+    Returns the books listed on one catalogue page.
+
+    Args:
+        html (str): Catalogue page HTML.
+        base_url (str): Catalogue base URL the relative links resolve against.
+
+    Returns:
+        list: One dict per book in page order, with the absolute detail page
+            'url' and the title, rating, price and availability shown in the listing.
+    """
+    return get_parser().catalogue_items(html, base_url)
+
+
+def parse_page_count(html):
+    """
+    Reads the total number of catalogue pages from the 'Page 1 of N' pager.
+
+    Args:
+        html (str): Catalogue page HTML.
+
+    Returns:
+        int or None: Number of catalogue pages, None if there is no pager.
+    """
+    return get_parser().page_count(html)
+
+
+def parse_book_page(html):
+    """
+    Parses a book detail page into a raw record.
+
+    The parser backend is chosen with EXTRACT_PARSER (see etl/parsers.py).
+
+    Args:
+        html (str): Book detail page HTML.
+
+    Returns:
+        dict: One value per column in RAW_COLUMNS, as scraped text.
+    """
+    return get_parser().book_page(html)
+
+
+def save_raw_data(records):
+    """
+    Builds the raw DataFrame and saves it to 'data/1_extract_raw_data/books_raw_data'.
+
+    The file format is chosen with ETL_ARTIFACT_FORMAT (see etl/artifacts.py).
+
+    Args:
+        records (list): Raw records as returned by parse_book_page.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing raw book data.
+    """
+    books_raw_df = pd.DataFrame(records, columns=RAW_COLUMNS)
+    try:
+        write_artifact(books_raw_df, RAW_DATA)
+    except Exception as e:
+        logger.error(f"Error saving extracted data: {e}")
+
+    return books_raw_df
+
+
+def open_cache(cache):
+    """
+    Resolves the `cache` argument of the extract functions.
+
+    Args:
+        cache (ResponseCache or bool): A cache, True for the default on-disk cache, False for none.
+
+    Returns:
+        ResponseCache or None: The cache to use.
+    """
+    if cache is True:
+        return ResponseCache()
+    return cache or None
+
+
+def extract(base_url=BASE_URL, concurrency=CONCURRENCY, http2=HTTP2, limiter=None, cache=CACHE,
+            incremental=INCREMENTAL, parse_workers=PARSE_WORKERS, frontier=FRONTIER):
     """
     Extracts book data from the 'Books to Scrape' website.
 
     Scrapes **all catalog pages** and retrieves metadata for each book,
     including title, genre, rating, price, stock info, UPC, and number of reviews.
-    The data is returned as a pandas DataFrame and also saved to 'extract_raw_data/books_raw_data.csv'.
+    Catalogue and detail pages are fetched concurrently by the async crawler
+    in etl/crawler.py over a keep-alive connection pool. Request pacing,
+    retries and backoff are handled by the fetch layer in etl/fetch.py.
+    Pages are kept in an on-disk cache (etl/cache.py) and revalidated with
+    conditional GETs, so re-runs against an unchanged site transfer little.
+    In incremental mode, books whose catalogue listing is unchanged since
+    the last run are carried forward without fetching their detail page
+    (see etl/incremental.py). With parse_workers > 0, fetched pages go
+    through a bounded queue to a process pool of parsers (etl/stages.py).
+    When httpx is not installed the serial crawler is used instead.
+    With `frontier`, the URLs are shared through a work queue in PostgreSQL
+    with the workers of other containers instead (see etl/frontier.py).
+    The data is returned as a pandas DataFrame and also saved to 'extract_raw_data/books_raw_data'.
+
+    Args:
+        base_url (str): Catalogue base URL (env: BOOKS_BASE_URL).
+        concurrency (int): Maximum number of requests in flight (env: EXTRACT_CONCURRENCY).
+        http2 (bool): Negotiate HTTP/2 when the h2 package is available (env: EXTRACT_HTTP2).
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache or bool): Response cache, True for the default one (env: EXTRACT_CACHE).
+        incremental (bool): Only fetch detail pages of new or changed books (env: EXTRACT_INCREMENTAL).
+        parse_workers (int): Parser processes, 0 parses on the event loop (env: EXTRACT_PARSE_WORKERS).
+        frontier (bool): Crawl through the shared PostgreSQL frontier (env: EXTRACT_FRONTIER).
 
     Returns:
         pd.DataFrame: A DataFrame containing raw book data.
     """
-    book_dict={
-        'titles':[], 'genre':[], 'ratings':[], 'upc':[], 'product_type':[],
-        'price_excl_tax_gbp':[], 'price_incl_tax_gbp':[], 'tax':[], 'in_stock':[],
-        'num_reviews':[]}
-
-    page_num=1
-
-    while True:
-        try:
-            url=f'https://books.toscrape.com/catalogue/page-{page_num}.html'
-            response=requests.get(url)
-            
-            if response.status_code!=200:
-                break 
-                
-            soup=BeautifulSoup(response.text, 'html.parser')
-            books=soup.find_all('h3')
-            logger.info(f'Scraping page {page_num}')
-
-        except Exception as e:
-            logger.error(f"Failed to load page {page_num}: {e}")
-            continue    
-
-        for book in books:
+    if frontier:
+        from etl.frontier import extract_frontier
+        return extract_frontier(base_url, concurrency, limiter, cache)
+
+    if httpx is None:
+        logger.warning('httpx is not installed, using serial extraction')
+        return extract_serial(base_url, limiter, cache, incremental)
+
+    from etl.crawler import crawl
+    snapshot = ListingSnapshot(enabled=incremental, base_url=base_url)
+    records = crawl(base_url, snapshot, concurrency=concurrency, http2=http2, limiter=limiter,
+                    cache=open_cache(cache), parse_workers=parse_workers)
+    books_raw_df = save_raw_data(records)
+    snapshot.save()
+    return books_raw_df
+
+
+def extract_serial(base_url=BASE_URL, limiter=None, cache=CACHE, incremental=INCREMENTAL):
+    """
+    Extracts book data one request at a time.
+
+    Each catalogue page is fetched, then each of its detail pages, over one
+    pooled session. It is kept as a fallback for environments without httpx
+    and as the baseline for benchmarks/bench_extract.py.
+
+    A catalogue page that still fails after its retry budget is skipped;
+    the crawl stops after MAX_FAILED_PAGES consecutive failed pages.
+
+    Args:
+        base_url (str): Catalogue base URL.
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache or bool): Response cache, True for the default one (env: EXTRACT_CACHE).
+        incremental (bool): Only fetch detail pages of new or changed books (env: EXTRACT_INCREMENTAL).
+
+    Returns:
+        pd.DataFrame: A DataFrame containing raw book data.
+    """
+    snapshot = ListingSnapshot(enabled=incremental, base_url=base_url)
+    records = [record for page in serial_pages(base_url, snapshot, limiter, open_cache(cache))
+               for record in page]
+    books_raw_df = save_raw_data(records)
+    snapshot.save()
+    return books_raw_df
+
+
+def serial_pages(base_url, snapshot, limiter=None, cache=None):
+    """
+    Generator behind extract_serial: crawls one catalogue page at a time.
+
+    Args:
+        base_url (str): Catalogue base URL.
+        snapshot (ListingSnapshot): Previous run's listings, for incremental extraction.
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache): On-disk response cache, None to always hit the network.
+
+    Yields:
+        list: Raw records of one catalogue page, empty if the page failed.
+    """
+    page_num = 1
+    failed_pages = 0
+    fetcher = Fetcher(limiter, cache=cache)
+
+    try:
+        while failed_pages < MAX_FAILED_PAGES:
             try:
-                a_tag=book.find('a')
-                relative_link=a_tag['href']
-                full_link='https://books.toscrape.com/catalogue/' + relative_link
-
-                soup_2=BeautifulSoup(requests.get(full_link).text, 'html.parser')
-                title=soup_2.find('li', class_='active').text.strip()
-                breadcrumb=soup_2.find('ul', class_='breadcrumb')
-                genre_li=breadcrumb.find_all('li')[2].text.strip()
-                rating=soup_2.find('p', class_='star-rating')['class'][1]
-
-                table=soup_2.find('table', class_='table table-striped')
-                product_info = {}
-                for row in table.find_all('tr'):
-                    key = row.th.text.strip()
-                    value = row.td.text.strip()
-                    product_info[key] = value
-        
-                book_dict['titles'].append(title)
-                book_dict['genre'].append(genre_li)
-                book_dict['ratings'].append(rating)
-                book_dict['upc'].append(product_info.get('UPC', 'N/A'))  
-                book_dict['product_type'].append(product_info.get('Product Type', 'N/A'))  
-                book_dict['price_excl_tax_gbp'].append(product_info.get('Price (excl. tax)', 'N/A'))  
-                book_dict['price_incl_tax_gbp'].append(product_info.get('Price (incl. tax)', 'N/A')) 
-                book_dict['tax'].append(product_info.get('Tax', 'N/A')) 
-                book_dict['in_stock'].append(product_info.get('Availability', 'N/A')) 
-                book_dict['num_reviews'].append(product_info.get('Number of reviews', 'N/A')) 
-
-            except Exception as e:
-                logger.error(f"Error processing book: {e}")
+                response = fetcher.get(f'{base_url}page-{page_num}.html')
+
+                if response.status_code != 200:
+                    break
+
+                items = parse_catalogue_page(fetch_text(response), base_url)
+                logger.info(f'Scraping page {page_num}')
+                failed_pages = 0
+
+            except FetchError as e:
+                logger.error(f"Failed to load page {page_num}: {e}")
+                failed_pages += 1
+                page_num += 1
+                yield []
                 continue
-                
-        page_num+=1
-        time.sleep(0.5)
-            
-    try:
-        os.makedirs('data/1_extract_raw_data', exist_ok=True)
-        books_raw_df=pd.DataFrame(book_dict)
-        books_raw_df.to_csv('data/1_extract_raw_data/books_raw_data.csv', index=False)  
-    except Exception as e:
-        logger.error(f"Error saving extracted data: {e}")      
-    
-    return books_raw_df
\ No newline at end of file
+
+            records = []
+            for item in items:
+                record = snapshot.previous_record(item)
+                if record is not None:
+                    snapshot.record(item, record, carried=True)
+                    records.append(record)
+                    continue
+                try:
+                    record = parse_book_page(fetch_text(fetcher.get(item['url'])))
+                except Exception as e:
+                    logger.error(f"Error processing book: {e}", extra={'url': item['url']})
+                    continue
+                snapshot.record(item, record)
+                records.append(record)
+
+            yield records
+            page_num += 1
+    finally:
+        fetcher.close()
+
+
+def extract_batches(base_url=BASE_URL, concurrency=CONCURRENCY, http2=HTTP2, limiter=None, cache=CACHE,
+                    incremental=INCREMENTAL, parse_workers=PARSE_WORKERS, window=STREAM_WINDOW):
+    """
+    Extracts book data as a stream of per-catalogue-page DataFrames.
+
+    This is the streaming counterpart of extract(): the async crawler (or
+    the serial one when httpx is missing) stays at most `window` catalogue
+    pages ahead of the consumer, and each page's records are appended to
+    the raw artifact before the batch is handed on. Only the pages in
+    flight are held in memory, however large the catalogue is.
+
+    Args:
+        base_url (str): Catalogue base URL (env: BOOKS_BASE_URL).
+        concurrency (int): Maximum number of requests in flight (env: EXTRACT_CONCURRENCY).
+        http2 (bool): Negotiate HTTP/2 when the h2 package is available (env: EXTRACT_HTTP2).
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache or bool): Response cache, True for the default one (env: EXTRACT_CACHE).
+        incremental (bool): Only fetch detail pages of new or changed books (env: EXTRACT_INCREMENTAL).
+        parse_workers (int): Parser processes, 0 parses on the event loop (env: EXTRACT_PARSE_WORKERS).
+        window (int): Catalogue pages crawled ahead of the consumer (env: EXTRACT_STREAM_WINDOW).
+
+    Yields:
+        pd.DataFrame: Raw book data of one catalogue page.
+    """
+    snapshot = ListingSnapshot(enabled=incremental, base_url=base_url)
+    if httpx is None:
+        logger.warning('httpx is not installed, using serial extraction')
+        pages = serial_pages(base_url, snapshot, limiter, open_cache(cache))
+    else:
+        from etl.crawler import crawl_stream
+        pages = crawl_stream(base_url, snapshot, concurrency=concurrency, http2=http2, limiter=limiter,
+                             cache=open_cache(cache), parse_workers=parse_workers, window=window)
+
+    with closing(pages), ArtifactWriter(RAW_DATA) as writer:
+        for records in pages:
+            if not records:
+                continue
+            books_raw_df = pd.DataFrame(records, columns=RAW_COLUMNS)
+            writer.write(books_raw_df)
+            yield books_raw_df
+        if not writer.batches:
+            writer.write(pd.DataFrame(columns=RAW_COLUMNS))
+    snapshot.save()
@@ -0,0 +1,347 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+
+from etl.cache import cached_response
+from etl.logger import get_logger
+from etl.metrics import METRICS
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = get_logger(__name__)
+
+RATE = float(os.getenv('EXTRACT_RATE', '10'))
+MIN_RATE = float(os.getenv('EXTRACT_MIN_RATE', '0.5'))
+MAX_RATE = float(os.getenv('EXTRACT_MAX_RATE', '100'))
+TARGET_LATENCY = float(os.getenv('EXTRACT_TARGET_LATENCY', '2.0'))
+MAX_RETRIES = int(os.getenv('EXTRACT_MAX_RETRIES', '5'))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+TIMEOUT = 30.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """Raised when a URL still fails after its retry budget is spent."""
+
+    def __init__(self, url, reason):
+        super().__init__(f'{url}: {reason}')
+        self.url = url
+        self.reason = reason
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to the server's health (AIMD).
+
+    Every healthy response adds `increase / rate` requests/sec, so the rate
+    grows by about `increase` per second of healthy traffic. A 429, a 5xx,
+    a transport error or a response slower than `target_latency` multiplies
+    the rate by `decrease`, at most once per second so that one burst of
+    errors from in-flight requests counts as a single congestion event.
+
+    The bucket is shared by threads and asyncio tasks: a caller reserves a
+    token under a lock and then sleeps (or awaits) until it is due.
+
+    Args:
+        rate (float): Initial requests per second.
+        min_rate (float): Lower bound for the rate.
+        max_rate (float): Upper bound for the rate.
+        burst (int): Bucket capacity, the number of requests allowed back to back.
+        increase (float): Additive increase in requests/sec per second.
+        decrease (float): Multiplicative decrease factor.
+        target_latency (float): Responses slower than this count as congestion.
+    """
+
+    def __init__(self, rate=RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=5,
+                 increase=1.0, decrease=0.5, target_latency=TARGET_LATENCY):
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.throttle_events = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes one token.
+
+        Returns:
+            float: Seconds the caller has to wait before sending its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def record(self, latency, status=None):
+        """
+        Feeds one request outcome back into the rate.
+
+        Args:
+            latency (float): Seconds the request took.
+            status (int): HTTP status code, None for a transport error.
+        """
+        congested = status is None or status in RETRY_STATUSES or latency > self.target_latency
+        with self._lock:
+            if not congested:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+                return
+            now = time.monotonic()
+            if now - self.last_decrease >= 1.0:
+                self.last_decrease = now
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.throttle_events += 1
+                logger.warning(f'Server congestion (status {status}, {latency:.2f} s), '
+                               f'rate lowered to {self.rate:.1f} req/s')
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Capped exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Zero-based number of the attempt that just failed.
+        retry_after (str): Retry-After header value, honoured when it is a number of seconds.
+
+    Returns:
+        float: Seconds to wait before the next attempt.
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        try:
+            delay = max(delay, min(BACKOFF_CAP, float(retry_after)))
+        except ValueError:
+            pass
+    return delay
+
+
+def decode_html(content, content_type=''):
+    """
+    Decodes a response body the same way requests' Response.text does.
+
+    The site does not send a charset, so requests falls back to ISO-8859-1.
+    The raw CSV (and the '.str[2:]' price slicing in transform) depend on
+    that decoding, so every fetch path has to produce identical text.
+
+    Args:
+        content (bytes): Raw response body.
+        content_type (str): Value of the Content-Type header.
+
+    Returns:
+        str: Decoded HTML.
+    """
+    charset = 'ISO-8859-1'
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'charset' and value:
+            charset = value.strip('"\'')
+    return content.decode(charset, errors='replace')
+
+
+def fetch_text(response):
+    """Decoded body of a requests, httpx or cached response."""
+    return decode_html(response.content, response.headers.get('content-type', ''))
+
+
+def record_response(latency, response):
+    """Adds a network response's latency and body size to the run's metrics."""
+    METRICS.observe('http_request_seconds', latency)
+    METRICS.inc('http_responses_total', status=response.status_code)
+    METRICS.inc('http_bytes_downloaded_total', len(response.content))
+
+
+class FetchStats:
+    """Request counters shared by the fetchers, logged at the end of a crawl."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def export(self):
+        """Adds the counters to the run's metrics."""
+        METRICS.inc('http_requests_total', self.requests)
+        METRICS.inc('http_retries_total', self.retries)
+        METRICS.inc('http_failed_urls_total', self.failures)
+
+    def summary(self, limiter):
+        return (f'{self.requests} requests, {self.retries} retries, {self.failures} failed URLs, '
+                f'{limiter.throttle_events} throttle events, final rate {limiter.rate:.1f} req/s')
+
+
+class Fetcher:
+    """
+    Blocking fetcher on a pooled requests.Session.
+
+    Args:
+        limiter (AdaptiveRateLimiter): Shared rate limiter.
+        max_retries (int): Retry budget per URL.
+        pool_size (int): Connections kept alive per host.
+        cache (ResponseCache): On-disk response cache, None to always hit the network.
+    """
+
+    def __init__(self, limiter=None, max_retries=MAX_RETRIES, pool_size=10, cache=None):
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.stats = FetchStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url):
+        """
+        GETs a URL through the cache, retrying 429/5xx and transport errors with backoff.
+
+        Returns:
+            requests.Response or CachedResponse: The first response that is not retryable.
+
+        Raises:
+            FetchError: When the retry budget is spent.
+        """
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry is not None and entry.fresh:
+            return self.cache.hit(entry)
+        response = self._request(url, entry.validators() if entry else {})
+        return cached_response(self.cache, url, entry, response)
+
+    def _request(self, url, headers):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self.stats.requests += 1
+            start = time.monotonic()
+            retry_after = None
+            try:
+                response = self.session.get(url, headers=headers, timeout=TIMEOUT)
+            except requests.RequestException as e:
+                self.limiter.record(time.monotonic() - start)
+                reason = str(e)
+            else:
+                latency = time.monotonic() - start
+                self.limiter.record(latency, response.status_code)
+                record_response(latency, response)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                reason = f'HTTP {response.status_code}'
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt < self.max_retries:
+                self.stats.retries += 1
+                time.sleep(backoff_delay(attempt, retry_after))
+
+        self.stats.failures += 1
+        raise FetchError(url, reason)
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+        self.stats.export()
+        logger.info(f'Fetcher: {self.stats.summary(self.limiter)}')
+
+
+class AsyncFetcher:
+    """
+    Async fetcher on a pooled httpx.AsyncClient (keep-alive, optional HTTP/2).
+
+    Use as `async with AsyncFetcher(...) as fetcher`.
+
+    Args:
+        concurrency (int): Maximum number of requests in flight.
+        http2 (bool): Negotiate HTTP/2.
+        limiter (AdaptiveRateLimiter): Shared rate limiter.
+        max_retries (int): Retry budget per URL.
+        cache (ResponseCache): On-disk response cache, None to always hit the network.
+    """
+
+    def __init__(self, concurrency=16, http2=False, limiter=None, max_retries=MAX_RETRIES, cache=None):
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.stats = FetchStats()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self.client = httpx.AsyncClient(http2=http2, limits=limits, timeout=httpx.Timeout(TIMEOUT))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        if self.cache:
+            self.cache.close()
+        self.stats.export()
+        logger.info(f'Fetcher: {self.stats.summary(self.limiter)}')
+
+    async def get(self, url):
+        """
+        GETs a URL through the cache, retrying 429/5xx and transport errors with backoff.
+
+        Returns:
+            httpx.Response or CachedResponse: The first response that is not retryable.
+
+        Raises:
+            FetchError: When the retry budget is spent.
+        """
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry is not None and entry.fresh:
+            return self.cache.hit(entry)
+        response = await self._request(url, entry.validators() if entry else {})
+        return cached_response(self.cache, url, entry, response)
+
+    async def _request(self, url, headers):
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore:
+                await self.limiter.acquire_async()
+                self.stats.requests += 1
+                start = time.monotonic()
+                retry_after = None
+                try:
+                    response = await self.client.get(url, headers=headers)
+                except httpx.TransportError as e:
+                    self.limiter.record(time.monotonic() - start)
+                    reason = str(e) or type(e).__name__
+                else:
+                    latency = time.monotonic() - start
+                    self.limiter.record(latency, response.status_code)
+                    record_response(latency, response)
+                    if response.status_code not in RETRY_STATUSES:
+                        return response
+                    reason = f'HTTP {response.status_code}'
+                    retry_after = response.headers.get('retry-after')
+
+            if attempt < self.max_retries:
+                self.stats.retries += 1
+                await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+        self.stats.failures += 1
+        raise FetchError(url, reason)
@@ -0,0 +1,316 @@
+import json
+import os
+import socket
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from etl.db import connection, create_database
+from etl.extract import (BASE_URL, CACHE, CONCURRENCY, open_cache, parse_book_page, parse_catalogue_page,
+                         parse_page_count, save_raw_data)
+from etl.fetch import FetchError, Fetcher, fetch_text
+from etl.logger import get_logger, with_log_context
+
+logger = get_logger(__name__)
+
+CRAWL_ID = os.getenv('EXTRACT_CRAWL_ID', 'books')
+BATCH_SIZE = int(os.getenv('FRONTIER_BATCH_SIZE', '32'))
+LEASE_SECONDS = float(os.getenv('FRONTIER_LEASE_SECONDS', '120'))
+MAX_ATTEMPTS = int(os.getenv('FRONTIER_MAX_ATTEMPTS', '3'))
+POLL_SECONDS = float(os.getenv('FRONTIER_POLL_SECONDS', '1'))
+WAIT_SECONDS = float(os.getenv('FRONTIER_WAIT_SECONDS', '300'))
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS crawl_runs (
+        crawl_id TEXT PRIMARY KEY,
+        base_url TEXT NOT NULL,
+        status TEXT NOT NULL,
+        started_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )''',
+    '''CREATE TABLE IF NOT EXISTS crawl_frontier (
+        crawl_id TEXT NOT NULL REFERENCES crawl_runs ON DELETE CASCADE,
+        url TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        page_num INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        leased_by TEXT,
+        lease_expires TIMESTAMPTZ,
+        record JSONB,
+        error TEXT,
+        PRIMARY KEY (crawl_id, url)
+    )''',
+    '''CREATE INDEX IF NOT EXISTS crawl_frontier_claim
+        ON crawl_frontier (crawl_id, page_num, position) WHERE state IN ('pending', 'leased')''']
+
+
+def prepare_frontier():
+    """Creates the 'books_website' database and the frontier tables if they don't exist."""
+    create_database()
+    with connection() as conn:
+        # Serializes the DDL of workers that start at the same time.
+        conn.execute("SELECT pg_advisory_xact_lock(hashtext('crawl_frontier'))")
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+
+def start_crawl(crawl_id=CRAWL_ID, base_url=BASE_URL):
+    """
+    Opens a crawl, or continues the unfinished one with the same id.
+
+    A finished crawl with the same id is deleted and started over from the
+    first catalogue page. An unfinished one (its coordinator crashed) is
+    picked up where it stopped: pages already fetched are not fetched again.
+
+    Args:
+        crawl_id (str): Crawl name shared by the coordinator and its workers (env: EXTRACT_CRAWL_ID).
+        base_url (str): Catalogue base URL.
+    """
+    prepare_frontier()
+    with connection() as conn:
+        row = conn.execute('SELECT status FROM crawl_runs WHERE crawl_id = %s FOR UPDATE', (crawl_id,)).fetchone()
+        if row is not None and row[0] == 'running':
+            counts = dict(conn.execute('SELECT state, COUNT(*) FROM crawl_frontier '
+                                       'WHERE crawl_id = %s GROUP BY state', (crawl_id,)).fetchall())
+            logger.info(f"Resuming crawl '{crawl_id}': {counts}")
+            return
+        conn.execute('DELETE FROM crawl_runs WHERE crawl_id = %s', (crawl_id,))
+        conn.execute("INSERT INTO crawl_runs (crawl_id, base_url, status) VALUES (%s, %s, 'running')",
+                     (crawl_id, base_url))
+        conn.execute("INSERT INTO crawl_frontier (crawl_id, url, kind, page_num, position) "
+                     "VALUES (%s, %s, 'catalogue', 1, 0)", (crawl_id, f'{base_url}page-1.html'))
+
+
+def claim(crawl_id, worker, batch_size=BATCH_SIZE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Leases a batch of URLs to a worker.
+
+    Pending URLs and URLs whose lease has expired (their worker died or
+    hung) are claimed with FOR UPDATE SKIP LOCKED, so concurrent workers
+    never get the same URL and never wait for each other. Catalogue pages
+    go first, as they add the detail pages to the frontier. An expired URL
+    that has used up `max_attempts` is marked failed instead.
+
+    Args:
+        crawl_id (str): Crawl to work on.
+        worker (str): Worker id written into the lease.
+        batch_size (int): Maximum number of URLs to lease (env: FRONTIER_BATCH_SIZE).
+        lease_seconds (float): Lease duration (env: FRONTIER_LEASE_SECONDS).
+        max_attempts (int): Leases granted per URL (env: FRONTIER_MAX_ATTEMPTS).
+
+    Returns:
+        list: (url, kind, page_num) of the leased URLs, empty if none is available.
+    """
+    with connection() as conn:
+        conn.execute("""
+            UPDATE crawl_frontier SET state = 'failed', leased_by = NULL, error = 'lease expired'
+            WHERE crawl_id = %s AND state = 'leased' AND lease_expires < now() AND attempts >= %s
+        """, (crawl_id, max_attempts))
+        return conn.execute("""
+            UPDATE crawl_frontier f
+            SET state = 'leased', leased_by = %s, attempts = f.attempts + 1,
+                lease_expires = now() + make_interval(secs => %s)
+            FROM (
+                SELECT url FROM crawl_frontier
+                WHERE crawl_id = %s
+                  AND (state = 'pending' OR (state = 'leased' AND lease_expires < now()))
+                ORDER BY kind = 'catalogue' DESC, page_num, position
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) batch
+            WHERE f.crawl_id = %s AND f.url = batch.url
+            RETURNING f.url, f.kind, f.page_num
+        """, (worker, lease_seconds, crawl_id, batch_size, crawl_id)).fetchall()
+
+
+def process(fetcher, base_url, url, kind, page_num):
+    """
+    Fetches and parses one leased URL.
+
+    Returns:
+        dict: 'state' ('done', 'pending' to retry or 'failed'), the book
+            'record' or the URLs 'discovered' on a catalogue page, and the 'error'.
+    """
+    try:
+        response = fetcher.get(url)
+    except FetchError as e:
+        return {'state': 'pending', 'error': str(e)}
+    if response.status_code != 200:
+        # Past the last catalogue page; a missing detail page is an error.
+        if kind == 'catalogue':
+            return {'state': 'done'}
+        return {'state': 'failed', 'error': f'HTTP {response.status_code}'}
+    try:
+        html = fetch_text(response)
+        if kind == 'book':
+            return {'state': 'done', 'record': parse_book_page(html)}
+        discovered = [(item['url'], 'book', page_num, position)
+                      for position, item in enumerate(parse_catalogue_page(html, base_url))]
+        page_count = parse_page_count(html)
+        if page_num == 1 and page_count:
+            discovered += [(f'{base_url}page-{num}.html', 'catalogue', num, 0) for num in range(2, page_count + 1)]
+        elif page_count is None and discovered:
+            discovered.append((f'{base_url}page-{page_num + 1}.html', 'catalogue', page_num + 1, 0))
+        logger.info(f'Scraping page {page_num}')
+        return {'state': 'done', 'discovered': discovered}
+    except Exception as e:
+        logger.error(f"Error processing {url}: {e}", extra={'url': url})
+        return {'state': 'failed', 'error': str(e)}
+
+
+def complete(crawl_id, worker, results, max_attempts=MAX_ATTEMPTS):
+    """
+    Writes a batch's results back in one transaction.
+
+    Only URLs still leased by `worker` are updated, so a worker whose lease
+    expired while it was working cannot overwrite the URL's new owner.
+    URLs found on catalogue pages are added unless already present.
+
+    Args:
+        crawl_id (str): Crawl the batch belongs to.
+        worker (str): Worker id the batch was leased to.
+        results (list): (url, result) pairs, see process().
+        max_attempts (int): Attempts after which a retryable error is final.
+    """
+    discovered = [(crawl_id, *row) for _, result in results for row in result.get('discovered', [])]
+    updates = [(result['state'], max_attempts, result['state'],
+                json.dumps(result['record']) if 'record' in result else None, result.get('error'),
+                crawl_id, url, worker) for url, result in results]
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.executemany("""
+                INSERT INTO crawl_frontier (crawl_id, url, kind, page_num, position)
+                VALUES (%s, %s, %s, %s, %s) ON CONFLICT DO NOTHING
+            """, discovered)
+            cur.executemany("""
+                UPDATE crawl_frontier
+                SET state = CASE WHEN %s = 'pending' AND attempts >= %s THEN 'failed' ELSE %s END,
+                    record = %s, error = %s, leased_by = NULL, lease_expires = NULL
+                WHERE crawl_id = %s AND url = %s AND leased_by = %s AND state = 'leased'
+            """, updates)
+
+
+def open_work(crawl_id):
+    """
+    Returns a crawl's state.
+
+    Returns:
+        tuple: Base URL, status ('running', 'done' or None if there is no
+            such crawl) and the number of URLs still pending or leased.
+    """
+    with connection() as conn:
+        row = conn.execute('SELECT base_url, status FROM crawl_runs WHERE crawl_id = %s', (crawl_id,)).fetchone()
+        if row is None:
+            return None, None, 0
+        count = conn.execute("SELECT COUNT(*) FROM crawl_frontier "
+                             "WHERE crawl_id = %s AND state IN ('pending', 'leased')", (crawl_id,)).fetchone()[0]
+        return row[0], row[1], count
+
+
+def run_worker(crawl_id=CRAWL_ID, concurrency=CONCURRENCY, limiter=None, cache=CACHE, worker=None,
+               batch_size=BATCH_SIZE, lease_seconds=LEASE_SECONDS, wait_seconds=WAIT_SECONDS):
+    """
+    Crawls URLs of a shared frontier until the crawl has no work left.
+
+    The worker leases a batch, fetches its URLs over `concurrency` threads
+    of one pooled, rate-limited Fetcher, writes the results back and
+    repeats. While other workers still hold leases it polls, since their
+    catalogue pages may add URLs or their leases may expire. Any number of
+    workers can run on any number of hosts against the same database.
+
+    Args:
+        crawl_id (str): Crawl to work on (env: EXTRACT_CRAWL_ID).
+        concurrency (int): Requests in flight in this worker (env: EXTRACT_CONCURRENCY).
+        limiter (AdaptiveRateLimiter): Rate limiter of this worker.
+        cache (ResponseCache or bool): Response cache, True for the default one (env: EXTRACT_CACHE).
+        worker (str): Worker id, '<host>-<pid>' by default.
+        batch_size (int): URLs leased at a time (env: FRONTIER_BATCH_SIZE).
+        lease_seconds (float): Lease duration (env: FRONTIER_LEASE_SECONDS).
+        wait_seconds (float): How long to wait for the crawl to be started (env: FRONTIER_WAIT_SECONDS).
+
+    Returns:
+        int: Number of URLs this worker completed.
+    """
+    worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        base_url, status, _ = open_work(crawl_id)
+        if status == 'running':
+            break
+        if time.monotonic() > deadline:
+            logger.info(f"No running crawl '{crawl_id}', worker {worker} exits")
+            return 0
+        time.sleep(POLL_SECONDS)
+
+    fetcher = Fetcher(limiter, pool_size=concurrency, cache=open_cache(cache))
+    completed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                batch = claim(crawl_id, worker, batch_size, lease_seconds)
+                if not batch:
+                    _, status, remaining = open_work(crawl_id)
+                    if status != 'running' or remaining == 0:
+                        break
+                    time.sleep(POLL_SECONDS)
+                    continue
+                results = executor.map(with_log_context(lambda row: (row[0], process(fetcher, base_url, *row))), batch)
+                complete(crawl_id, worker, list(results))
+                completed += len(batch)
+    finally:
+        fetcher.close()
+    logger.info(f"Frontier worker {worker} completed {completed} URLs of crawl '{crawl_id}'")
+    return completed
+
+
+def collect(crawl_id=CRAWL_ID):
+    """
+    Merges the crawled records in catalogue order and closes the crawl.
+
+    Returns:
+        list: Raw records of the detail pages that were fetched.
+    """
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT record FROM crawl_frontier
+            WHERE crawl_id = %s AND kind = 'book' AND state = 'done'
+            ORDER BY page_num, position
+        """, (crawl_id,)).fetchall()
+        failed = conn.execute("SELECT COUNT(*) FROM crawl_frontier WHERE crawl_id = %s AND state = 'failed'",
+                              (crawl_id,)).fetchone()[0]
+        conn.execute("UPDATE crawl_runs SET status = 'done' WHERE crawl_id = %s", (crawl_id,))
+    if failed:
+        logger.error(f"Crawl '{crawl_id}': {failed} URLs failed")
+    return [row[0] for row in rows]
+
+
+def extract_frontier(base_url=BASE_URL, concurrency=CONCURRENCY, limiter=None, cache=CACHE, crawl_id=CRAWL_ID):
+    """
+    Extracts book data through the shared URL frontier in PostgreSQL.
+
+    This function:
+    - Starts the crawl (or resumes an unfinished one) by putting the first
+      catalogue page into the frontier
+    - Works on it like any other worker (see run_worker()) until no URL is
+      left; workers started with `python -m etl.frontier` in other
+      containers share the work
+    - Merges the records in catalogue order and saves the raw artifact
+
+    Args:
+        base_url (str): Catalogue base URL (env: BOOKS_BASE_URL).
+        concurrency (int): Requests in flight in this process (env: EXTRACT_CONCURRENCY).
+        limiter (AdaptiveRateLimiter): Rate limiter, a default one is built from the EXTRACT_* env vars.
+        cache (ResponseCache or bool): Response cache, True for the default one (env: EXTRACT_CACHE).
+        crawl_id (str): Crawl name shared with the workers (env: EXTRACT_CRAWL_ID).
+
+    Returns:
+        pd.DataFrame: A DataFrame containing raw book data.
+    """
+    start_crawl(crawl_id, base_url)
+    run_worker(crawl_id, concurrency, limiter, cache, wait_seconds=0)
+    return save_raw_data(collect(crawl_id))
+
+
+if __name__ == '__main__':
+    run_worker()
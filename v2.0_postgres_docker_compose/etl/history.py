@@ -0,0 +1,212 @@
+import os
+
+from datetime import datetime, timezone
+
+from etl.logger import get_logger
+from etl.metrics import METRICS
+
+logger = get_logger(__name__)
+
+HISTORY = os.getenv('LOAD_HISTORY', '0') == '1'
+HISTORY_RETENTION_MONTHS = int(os.getenv('LOAD_HISTORY_RETENTION_MONTHS', '24'))
+HISTORY_COLUMNS = ['upc', 'price_excl_tax_gbp', 'price_incl_tax_gbp', 'in_stock']
+TRACKED_COLUMNS = HISTORY_COLUMNS[1:]
+
+# The price_history partitions are named after their month: price_history_YYYY_MM.
+PARTITION_PREFIX = 'price_history_'
+
+HISTORY_INDEXES = {
+    # Rows arrive in valid_from order, so a BRIN index (a few pages per partition) prunes time ranges.
+    'price_history_valid_from_brin': 'price_history USING brin (valid_from)',
+    # One book's versions, for trends.
+    'price_history_upc_idx': 'price_history (upc, valid_from)',
+    # The open versions, which every snapshot compares with.
+    'price_history_current_idx': 'price_history (upc) WHERE valid_to IS NULL',
+}
+
+
+def month_start(when, months=0):
+    """Returns midnight UTC on the first day of the month of `when`, shifted by `months`."""
+    index = when.year * 12 + when.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y_%m}'
+
+
+def create_history(cur):
+    """
+    Creates the 'price_history' table, its indexes and the prices_at() function, if they don't exist.
+
+    price_history holds one row per version of a book's prices and stock
+    (SCD type 2): the version is current from valid_from until valid_to,
+    NULL while it still is. The table is partitioned by month of
+    valid_from, so time-range queries only read the partitions they need
+    and old months are dropped whole (expire_partitions()).
+
+    Args:
+        cur (psycopg.Cursor): Cursor on 'books_website'.
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+        upc CHAR(25) NOT NULL,
+        price_excl_tax_gbp NUMERIC(5,2),
+        price_incl_tax_gbp NUMERIC(5,2),
+        in_stock INTEGER,
+        valid_from TIMESTAMPTZ NOT NULL,
+        valid_to TIMESTAMPTZ
+        ) PARTITION BY RANGE (valid_from)
+    ''')
+    for name, definition in HISTORY_INDEXES.items():
+        cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+    cur.execute('''
+        CREATE UNLOGGED TABLE IF NOT EXISTS price_history_staging (
+        upc CHAR(25),
+        price_excl_tax_gbp NUMERIC(5,2),
+        price_incl_tax_gbp NUMERIC(5,2),
+        in_stock INTEGER
+        )
+    ''')
+    # The catalogue as it was at a point in time; a SQL function, so it is inlined and partitions pruned.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION prices_at(at TIMESTAMPTZ) RETURNS SETOF price_history
+        LANGUAGE sql STABLE AS $$
+            SELECT * FROM price_history
+            WHERE valid_from <= at AND (valid_to IS NULL OR valid_to > at)
+        $$
+    ''')
+
+
+def create_partition(cur, month):
+    """Creates the partition of price_history for the month starting at `month`, if it doesn't exist."""
+    cur.execute(f'''
+        CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF price_history
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')
+    ''')
+
+
+def expire_partitions(cur, now, months=HISTORY_RETENTION_MONTHS):
+    """
+    Drops the partitions of price_history that are older than the retention period.
+
+    Versions in them that were still current at the cutoff (the start of
+    the oldest month kept) are first copied into the cutoff's partition
+    with valid_from set to the cutoff, so the point-in-time view of every
+    kept moment stays complete.
+
+    Args:
+        cur (psycopg.Cursor): Cursor on 'books_website'.
+        now (datetime): Time of the snapshot being recorded.
+        months (int): Months of history to keep, including the current one; 0 keeps everything.
+
+    Returns:
+        list: Names of the dropped partitions.
+    """
+    if months <= 0:
+        return []
+    cutoff = month_start(now, 1 - months)
+    cur.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'price_history'::regclass
+        ORDER BY child.relname
+    """)
+    expired = [name for (name,) in cur.fetchall() if name < partition_name(cutoff)]
+    if expired:
+        create_partition(cur, cutoff)
+    for name in expired:
+        cur.execute(f'''
+            INSERT INTO price_history ({', '.join(HISTORY_COLUMNS)}, valid_from, valid_to)
+            SELECT {', '.join(HISTORY_COLUMNS)}, %(cutoff)s, valid_to FROM {name}
+            WHERE valid_to IS NULL OR valid_to > %(cutoff)s
+        ''', {'cutoff': cutoff})
+        carried = cur.rowcount
+        cur.execute(f'DROP TABLE {name}')
+        logger.info(f"Dropped history partition '{name}', {carried} versions still current carried forward")
+    return expired
+
+
+def record_history(conn, books_df=None, in_stock_df=None, snapshot_at=None):
+    """
+    Records a snapshot of every book's prices and stock in price_history, writing only changes.
+
+    This function:
+    - COPYs the snapshot into the UNLOGGED 'price_history_staging' table,
+      or without DataFrames copies the 'books' and 'in_stock' tables there
+      (the load of the caller's transaction)
+    - Closes (sets valid_to on) the current versions whose prices or stock
+      changed, and those of books that are no longer in the snapshot
+    - Opens a version for every new or changed book
+    - Drops partitions older than LOAD_HISTORY_RETENTION_MONTHS
+
+    Unchanged books write nothing, so the table grows by the changes, not
+    by the catalogue. Snapshots must be recorded in time order. Loads
+    (etl/load.py, etl/streaming.py) call it with LOAD_HISTORY=1 before they
+    commit, so the history only ever has what the tables had.
+
+    Args:
+        conn (psycopg.Connection): Connection to 'books_website'; the caller commits.
+        books_df (pd.DataFrame): Books table (validated), None to snapshot the database tables.
+        in_stock_df (pd.DataFrame): Stock table, row-aligned with books_df.
+        snapshot_at (datetime): Time of the snapshot (timezone aware), None for now.
+
+    Returns:
+        dict: Number of 'opened' and 'closed' versions.
+    """
+    from etl.load import copy_frame
+
+    snapshot_at = snapshot_at or datetime.now(timezone.utc)
+    params = {'at': snapshot_at}
+    with conn.cursor() as cur:
+        create_history(cur)
+        later = cur.execute('SELECT MAX(valid_from) FROM price_history WHERE valid_from >= %(at)s', params).fetchone()[0]
+        if later is not None:
+            raise ValueError(f'price_history already has a snapshot at {later}, after {snapshot_at}')
+        create_partition(cur, month_start(snapshot_at))
+        cur.execute('TRUNCATE price_history_staging')
+        if books_df is None or in_stock_df is None:
+            cur.execute(f'''
+                INSERT INTO price_history_staging ({', '.join(HISTORY_COLUMNS)})
+                SELECT {', '.join(f'books.{column}' for column in HISTORY_COLUMNS[:-1])}, in_stock.in_stock
+                FROM books JOIN in_stock USING (upc)
+            ''')
+            books = cur.rowcount
+        else:
+            snapshot_df = books_df[HISTORY_COLUMNS[:-1]].assign(in_stock=in_stock_df['in_stock'].to_numpy())
+            copy_frame(cur, 'price_history', snapshot_df, 'price_history_staging')
+            books = len(snapshot_df)
+        cur.execute('ANALYZE price_history_staging')
+
+        cur.execute(f'''
+            UPDATE price_history AS history SET valid_to = %(at)s
+            FROM price_history_staging AS staging
+            WHERE history.valid_to IS NULL AND history.upc = staging.upc
+              AND ROW({', '.join(f'history.{column}' for column in TRACKED_COLUMNS)})
+                  IS DISTINCT FROM ROW({', '.join(f'staging.{column}' for column in TRACKED_COLUMNS)})
+        ''', params)
+        changed = cur.rowcount
+        cur.execute('''
+            UPDATE price_history AS history SET valid_to = %(at)s
+            WHERE history.valid_to IS NULL AND NOT EXISTS (
+                SELECT 1 FROM price_history_staging AS staging WHERE staging.upc = history.upc)
+        ''', params)
+        removed = cur.rowcount
+        cur.execute(f'''
+            INSERT INTO price_history ({', '.join(HISTORY_COLUMNS)}, valid_from)
+            SELECT {', '.join(f'staging.{column}' for column in HISTORY_COLUMNS)}, %(at)s
+            FROM price_history_staging AS staging
+            WHERE NOT EXISTS (
+                SELECT 1 FROM price_history AS history WHERE history.upc = staging.upc AND history.valid_to IS NULL)
+        ''', params)
+        opened = cur.rowcount
+        cur.execute('TRUNCATE price_history_staging')
+        expire_partitions(cur, snapshot_at)
+
+    counts = {'opened': opened, 'closed': changed + removed}
+    for change, count in counts.items():
+        METRICS.inc('history_rows_total', count, change=change)
+    logger.info(f'Price history at {snapshot_at:%Y-%m-%d %H:%M}: {opened - changed} new books, '
+                f'{changed} changed, {removed} removed, {books - opened} unchanged')
+    return counts
+
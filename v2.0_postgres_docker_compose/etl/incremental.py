@@ -0,0 +1,195 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+from etl.artifacts import artifact_path, read_artifact
+from etl.logger import get_logger
+
+logger = get_logger(__name__)
+
+INCREMENTAL = os.getenv('EXTRACT_INCREMENTAL', '0') == '1'
+REFRESH_DAYS = float(os.getenv('EXTRACT_REFRESH_DAYS', '7'))
+RESUME = os.getenv('EXTRACT_RESUME', '1') == '1'
+
+LISTING_FIELDS = ['titles', 'ratings', 'price_incl_tax_gbp', 'availability']
+LISTING_COLUMNS = ['url', 'upc', *LISTING_FIELDS, 'fetched_at']
+
+
+class ListingSnapshot:
+    """
+    Detects new and changed books from the catalogue pages alone.
+
+    Every run writes 'listing_index.csv' next to the raw artifact: one row per
+    detail page URL with the title, rating, price and availability shown on
+    the catalogue page, the book's UPC and when its detail page was last
+    fetched. On the next run a book whose listing fields are unchanged and
+    whose detail page is younger than `refresh_days` is carried forward
+    from the previous books_raw_data artifact instead of being fetched.
+
+    The listing only says 'In stock', not how many, so stock counts of
+    unchanged books are refreshed by the `refresh_days` expiry.
+
+    Every fetched record is also appended to 'extract_journal.jsonl' as soon
+    as it arrives, and the journal is deleted once the run completes. If a
+    run crashes, the next one finds the journal and reuses its records for
+    listings that have not changed since and that are younger than
+    `refresh_days`, so only the detail pages the crashed run had not
+    reached are fetched again. This applies to incremental and full runs
+    alike, but only to a journal of the same `base_url`; any other is
+    discarded.
+
+    Args:
+        directory (str): Directory holding the books_raw_data artifact and listing_index.csv.
+        enabled (bool): Carry unchanged books forward (env: EXTRACT_INCREMENTAL).
+            When False every book is fetched, but the index is still written
+            so that the next incremental run has a baseline.
+        refresh_days (float): Maximum age of a carried-forward record (env: EXTRACT_REFRESH_DAYS).
+        resume (bool): Reuse the journal of an interrupted run (env: EXTRACT_RESUME).
+        base_url (str): Catalogue being crawled, recorded in the journal.
+    """
+
+    def __init__(self, directory='data/1_extract_raw_data', enabled=INCREMENTAL, refresh_days=REFRESH_DAYS,
+                 resume=RESUME, base_url=None):
+        self.directory = directory
+        self.base_url = base_url
+        self.enabled = enabled
+        self.max_age = refresh_days * 86400
+        self.previous = {}
+        self.records = {}
+        self.resumed = {}
+        self.current = []
+        self.carried = 0
+        self.fetched = 0
+        self.journal_path = os.path.join(directory, 'extract_journal.jsonl')
+        self.journal = None
+        if enabled:
+            self._load()
+        if resume:
+            self._load_journal()
+        elif os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+
+    def _load(self):
+        index_path = os.path.join(self.directory, 'listing_index.csv')
+        raw_artifact = os.path.join(self.directory, 'books_raw_data')
+        if not (os.path.isfile(index_path) and os.path.isfile(artifact_path(raw_artifact))):
+            logger.info('No previous listing snapshot, extracting every book')
+            return
+        try:
+            index_df = pd.read_csv(index_path, dtype=str, keep_default_na=False)
+            raw_df = read_artifact(raw_artifact, csv_options={'dtype': str, 'keep_default_na': False})
+        except Exception as e:
+            logger.error(f"Error reading listing snapshot, extracting every book: {e}")
+            return
+        self.previous = {row['url']: row for row in index_df.to_dict('records')}
+        self.records = {record['upc']: record for record in raw_df.to_dict('records')}
+
+    def _load_journal(self):
+        if not os.path.isfile(self.journal_path):
+            return
+        base_url = None
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may have been cut off by the crash.
+                        continue
+                    if 'url' in entry:
+                        self.resumed[entry['url']] = entry
+                    else:
+                        base_url = entry.get('base_url')
+        except Exception as e:
+            logger.error(f"Error reading extract journal, fetching every book: {e}")
+            self.resumed = {}
+            return
+        if base_url != self.base_url:
+            logger.info(f'Discarding the extract journal of a crawl of {base_url}')
+            self.resumed = {}
+            os.remove(self.journal_path)
+            return
+        logger.info(f'Resuming an interrupted extract: {len(self.resumed)} detail pages already fetched')
+
+    def previous_record(self, item):
+        """
+        Returns the previous raw record if the book can be carried forward.
+
+        Args:
+            item (dict): Catalogue listing as returned by parse_catalogue_page.
+
+        Returns:
+            dict or None: The unchanged raw record, None if the detail page has to be fetched.
+        """
+        if None in (item[field] for field in LISTING_FIELDS):
+            return None
+        resumed = self.resumed.pop(item['url'], None)
+        if (resumed is not None and all(resumed[field] == item[field] for field in LISTING_FIELDS)
+                and time.time() - float(resumed['fetched_at']) <= self.max_age):
+            # Kept for record(), which takes the fetch time from it.
+            self.resumed[item['url']] = resumed
+            return resumed['record']
+        previous = self.previous.get(item['url'])
+        if previous is None:
+            return None
+        if any(previous[field] != item[field] for field in LISTING_FIELDS):
+            return None
+        if time.time() - float(previous['fetched_at']) > self.max_age:
+            return None
+        return self.records.get(previous['upc'])
+
+    def record(self, item, record, carried=False):
+        """
+        Adds a book to the index written at the end of the run.
+
+        Args:
+            item (dict): Catalogue listing.
+            record (dict): Raw record extracted (or carried forward) for it.
+            carried (bool): True if the record came from the previous snapshot.
+        """
+        if not carried:
+            fetched_at = repr(time.time())
+            self._journal({'url': item['url'], **{field: item[field] for field in LISTING_FIELDS},
+                           'fetched_at': fetched_at, 'record': record})
+        elif item['url'] in self.resumed:
+            fetched_at = self.resumed[item['url']]['fetched_at']
+        else:
+            fetched_at = self.previous[item['url']]['fetched_at']
+        self.current.append({'url': item['url'], 'upc': record['upc'],
+                             **{field: item[field] for field in LISTING_FIELDS}, 'fetched_at': fetched_at})
+        if carried:
+            self.carried += 1
+        else:
+            self.fetched += 1
+
+    def _journal(self, entry):
+        try:
+            if self.journal is None:
+                os.makedirs(self.directory, exist_ok=True)
+                started = os.path.isfile(self.journal_path)
+                self.journal = open(self.journal_path, 'a', encoding='utf-8')
+                if not started:
+                    self.journal.write(json.dumps({'base_url': self.base_url}) + '\n')
+            self.journal.write(json.dumps(entry, default=str) + '\n')
+            self.journal.flush()
+        except Exception as e:
+            logger.error(f"Error writing extract journal: {e}")
+
+    def save(self):
+        """Writes listing_index.csv for the next run and deletes the journal of the completed run."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            pd.DataFrame(self.current, columns=LISTING_COLUMNS).to_csv(
+                os.path.join(self.directory, 'listing_index.csv'), index=False)
+        except Exception as e:
+            logger.error(f"Error saving listing snapshot: {e}")
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        if self.enabled:
+            logger.info(f'Incremental extract: {self.fetched} detail pages fetched, '
+                        f'{self.carried} unchanged books carried forward')
@@ -1,42 +1,58 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd 
-import psycopg
 
-from etl.logger import get_logger
-from psycopg.errors import DuplicateDatabase
+from etl.analytics import create_analytics, resume_analytics, suspend_analytics
+from etl.artifacts import BOOKS, GENRES, IN_STOCK, artifact_format, artifact_path, read_artifact
+from etl.db import connection, create_database, pool_capacity
+from etl.dedup import SKIP_UNCHANGED, UNCHANGED, DedupIndex, row_fingerprints
+from etl.history import HISTORY, HISTORY_COLUMNS, record_history
+from etl.logger import get_logger, with_log_context
+from etl.metrics import METRICS
+from etl.pgcopy import binary_copy_blocks, pa
 
 logger = get_logger(__name__)
 
-def load():
-    """
-    Creates the 'books_website' PostgreSQL database if it doesn't exist, 
-    creates all tables, if they don't exist ('books', 'genres', 'in_stock'), 
-    and loads data from CSV files into these tables using PostgreSQL's COPY command.
+LOAD_MODE = os.getenv('LOAD_MODE', 'replace')
+LOAD_MODES = ('replace', 'merge')
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '1'))
+TABLE_KEYS = {'in_stock': 'upc', 'genres': 'genre_id', 'books': 'upc'}
 
-    The database connection parameters (user, password, host, port) are read 
-    from environment variables with the following defaults:
-        - POSTGRES_USER (default: 'postgres')
-        - POSTGRES_PASSWORD (default: 'postgres')
-        - POSTGRES_HOST (default: 'localhost')
-        - POSTGRES_PORT (default: '5432')
+TABLE_COLUMNS = {
+    'in_stock': ['upc', 'in_stock'],
+    'genres': ['genre_id', 'genre'],
+    'books': ['upc', 'titles', 'genre_id', 'ratings', 'product_type', 'price_excl_tax_gbp',
+              'price_incl_tax_gbp', 'tax', 'num_reviews'],
+    'quarantine': ['upc', 'titles', 'reasons', 'record'],
+    'price_history': HISTORY_COLUMNS}
+# Binary COPY wire types, see etl/pgcopy.py. CHAR/VARCHAR columns accept text.
+TABLE_TYPES = {
+    'in_stock': ['text', 'int4'],
+    'genres': ['int4', 'text'],
+    'books': ['text', 'text', 'int2', 'int2', 'text', 'numeric', 'numeric', 'numeric', 'int4'],
+    'quarantine': ['text', 'text', 'text', 'text'],
+    'price_history': ['text', 'numeric', 'numeric', 'int4']}
+# Keys and foreign keys the tables are created with, in the order they are added back.
+# parallel_load() drops them for its COPYs; restore_constraints() repairs an interrupted one.
+TABLE_CONSTRAINTS = {
+    'in_stock': {'in_stock_pkey': 'PRIMARY KEY (upc)'},
+    'genres': {'genres_pkey': 'PRIMARY KEY (genre_id)'},
+    'books': {'books_upc_fkey': 'FOREIGN KEY (upc) REFERENCES in_stock(upc)',
+              'books_genre_id_fkey': 'FOREIGN KEY (genre_id) REFERENCES genres(genre_id)'}}
 
-    This function handles the database creation, table setup, and bulk data loading.
+
+def prepare_database(truncate=True):
     """
-    user = os.getenv("POSTGRES_USER", "postgres")
-    password = os.getenv("POSTGRES_PASSWORD", "postgres")
-    host = os.getenv("POSTGRES_HOST", "localhost")
-    port = os.getenv("POSTGRES_PORT", "5432")
+    Creates the 'books_website' database and its tables if they don't exist, and empties the tables.
 
-    with psycopg.connect(dbname="postgres", user=user, password=password, host=host, port=port) as conn:
-        conn.autocommit = True
-        with conn.cursor() as cur:
-            try:
-                cur.execute('CREATE DATABASE books_website')
-            except DuplicateDatabase:
-                logger.info('Database books already exists')
+    Args:
+        truncate (bool): Empty the tables; False keeps them for a merge load.
+    """
+    create_database()
 
-    with psycopg.connect(dbname="books_website", user=user, password=password, host=host, port=port ) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
 
 
@@ -68,40 +84,566 @@ def load():
             )
             ''')
 
-            cur.execute('TRUNCATE TABLE books, genres, in_stock;')
-         
-    with psycopg.connect(dbname="books_website", user=user, password=password, host=host, port=port) as conn:
+            restore_constraints(cur)
+
+            # Key for merge loads; tables created before merge mode have no primary key on books.
+            cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS books_upc_key ON books (upc)')
+
+            # Rows rejected by validation (etl/validate.py), with the reasons and the whole row as
+            # JSON text (binary COPY sends text; query it as record::jsonb).
+            cur.execute('''
+            CREATE TABLE IF NOT EXISTS quarantine (
+            upc TEXT,
+            titles TEXT,
+            reasons TEXT,
+            record TEXT,
+            quarantined_at TIMESTAMPTZ DEFAULT now()
+            )
+            ''')
+
+            # Dashboard indexes and the incrementally maintained genre_stats aggregates.
+            create_analytics(cur)
+
+            if truncate:
+                cur.execute('TRUNCATE TABLE books, genres, in_stock;')
+
+
+def restore_constraints(cur):
+    """
+    Repairs the tables after a parallel load that stopped before restoring their constraints.
+
+    parallel_load() commits the dropped keys and foreign keys and the
+    disabled genre_stats insert trigger before its COPYs start, so a
+    process that dies in between leaves the tables without them, and
+    merge loads (ON CONFLICT) fail. If any is missing, the tables hold a
+    partial load: like after a failed copy, they are emptied, then the
+    constraints and the trigger are put back.
+
+    Args:
+        cur (psycopg.Cursor): Cursor on 'books_website', after the tables were created.
+
+    Returns:
+        bool: Whether the tables needed repairing.
+    """
+    cur.execute('SELECT conname FROM pg_constraint WHERE conrelid = ANY(%s::regclass[])', (list(TABLE_CONSTRAINTS),))
+    present = {name for (name,) in cur.fetchall()}
+    missing = [(table, name, definition) for table, constraints in TABLE_CONSTRAINTS.items()
+               for name, definition in constraints.items() if name not in present]
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger "
+                "WHERE tgname = 'books_genre_stats_insert' AND tgenabled = 'D')")
+    suspended = cur.fetchone()[0]
+    if not missing and not suspended:
+        return False
+    logger.warning(f'An interrupted parallel load left the tables without {[name for _, name, _ in missing]}'
+                   f'{" and the genre_stats trigger disabled" if suspended else ""}; emptying and repairing them')
+    cur.execute('TRUNCATE TABLE books, genres, in_stock')
+    for table, name, definition in missing:
+        cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    if suspended:
+        resume_analytics(cur)
+    return True
+
+
+def record_copy(table, rows, nbytes, started):
+    """Adds one COPY's rows, bytes sent and duration to the run's metrics."""
+    METRICS.inc('copy_rows_total', rows, table=table)
+    METRICS.inc('copy_bytes_total', nbytes, table=table)
+    METRICS.inc('copy_seconds_total', time.perf_counter() - started, table=table)
+
+
+def copy_frame(cur, table, df, target=None):
+    """
+    Appends a DataFrame to a table with COPY ... FROM STDIN, without a file on disk.
+
+    With pyarrow installed the rows are encoded in PostgreSQL's binary COPY
+    format (typed integers and numerics, no text parsing on the server) and
+    sent in blocks of ROWS_PER_BLOCK rows, see etl/pgcopy.py. Without it
+    the frame is sent as CSV text.
+
+    Args:
+        cur (psycopg.Cursor): Cursor of the loading connection.
+        table (str): Table name, a key of TABLE_COLUMNS.
+        df (pd.DataFrame): Rows to load, columns in TABLE_COLUMNS order.
+        target (str): Table to copy into if not `table` itself, e.g. its staging table.
+    """
+    columns = ', '.join(TABLE_COLUMNS[table])
+    target = target or table
+    started = time.perf_counter()
+    if pa is None:
+        data = df.to_csv(index=False, header=False)
+        with cur.copy(f"COPY {target} ({columns}) FROM STDIN CSV") as copy:
+            copy.write(data)
+        record_copy(table, len(df), len(data), started)
+        return
+    nbytes = 0
+    with cur.copy(f"COPY {target} ({columns}) FROM STDIN (FORMAT BINARY)") as copy:
+        for block in binary_copy_blocks(df, TABLE_TYPES[table]):
+            copy.write(block)
+            nbytes += len(block)
+    record_copy(table, len(df), nbytes, started)
+
+
+def load_batch(conn, books_df, genre_df, in_stock_df, commit=True, staging=False):
+    """
+    Appends one batch of normalized tables and commits it.
+
+    Stock rows and new genres are loaded before the books that reference them.
+
+    Args:
+        conn (psycopg.Connection): Connection to 'books_website'.
+        books_df (pd.DataFrame): Books of the batch.
+        genre_df (pd.DataFrame): Genres first seen in the batch.
+        in_stock_df (pd.DataFrame): Stock rows of the batch.
+        commit (bool): Commit the batch; False leaves it in the caller's transaction.
+        staging (bool): Append to the staging tables instead (see create_staging()).
+    """
+    with conn.cursor() as cur:
+        for table, df in (('in_stock', in_stock_df), ('genres', genre_df), ('books', books_df)):
+            if table != 'genres' or not df.empty:
+                copy_frame(cur, table, df, f'{table}_staging' if staging else None)
+    if commit:
+        conn.commit()
+
+
+def load_quarantine(conn, quarantine_df, replace=True, staging=False):
+    """
+    Copies the rows rejected by validation into the 'quarantine' table.
+
+    Args:
+        conn (psycopg.Connection): Connection to 'books_website'; the caller commits.
+        quarantine_df (pd.DataFrame): Quarantined rows (upc, titles, reasons, record).
+        replace (bool): Empty the table first, so it holds the current run's rows only.
+        staging (bool): Append to 'quarantine_staging' instead (see create_staging()).
+    """
+    target = 'quarantine_staging' if staging else 'quarantine'
+    with conn.cursor() as cur:
+        if replace:
+            cur.execute(f'TRUNCATE {target}')
+        if not quarantine_df.empty:
+            copy_frame(cur, 'quarantine', quarantine_df, target)
+
+
+def create_staging(cur, table):
+    """Creates the UNLOGGED '<table>_staging' table (no WAL), with the table's columns, and empties it."""
+    cur.execute(f'CREATE UNLOGGED TABLE IF NOT EXISTS {table}_staging (LIKE {table})')
+    cur.execute(f'TRUNCATE {table}_staging')
+
+
+def publish_staging(cur, tables):
+    """
+    Replaces the rows of tables with those of their staging tables, then empties the staging tables.
+
+    The tables are truncated, which locks them against readers until the
+    caller commits, so this runs last in the loading transaction: readers
+    wait for one INSERT ... SELECT per table, not for the whole load. The
+    dashboard indexes and genre_stats are rebuilt afterwards (see
+    suspend_analytics()).
+
+    Args:
+        cur (psycopg.Cursor): Cursor of the loading transaction.
+        tables (list): Table names, in foreign key order.
+    """
+    cur.execute(f'TRUNCATE TABLE {", ".join(tables)}')
+    suspend_analytics(cur)
+    for table in tables:
+        columns = ', '.join(TABLE_COLUMNS[table])
+        cur.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_staging')
+    resume_analytics(cur)
+    cur.execute(f'TRUNCATE TABLE {", ".join(f"{table}_staging" for table in tables)}')
+
+
+def copy_csv_file(cur, table, path, target=None):
+    """
+    Streams a CSV artifact (with header) into a table with COPY ... FROM STDIN.
+
+    Args:
+        cur (psycopg.Cursor): Cursor of the loading connection.
+        table (str): Table name, a key of TABLE_COLUMNS.
+        path (str): CSV file, columns in TABLE_COLUMNS order.
+        target (str): Table to copy into if not `table` itself, e.g. its staging table.
+    """
+    columns = ', '.join(TABLE_COLUMNS[table])
+    started = time.perf_counter()
+    nbytes = 0
+    with cur.copy(f"COPY {target or table} ({columns}) FROM STDIN CSV HEADER") as copy:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                copy.write(line)
+                nbytes += len(line)
+    record_copy(table, cur.rowcount, nbytes, started)
+
+
+def copy_table(cur, table, df, artifact, target=None):
+    """
+    Copies one normalized table, from its DataFrame if given, otherwise from its artifact.
+
+    CSV artifacts are streamed to COPY line by line; Parquet and Arrow
+    artifacts are read (memory-mapped) into typed DataFrames and copied
+    like in-memory frames.
+
+    Args:
+        cur (psycopg.Cursor): Cursor of the loading connection.
+        table (str): Table name, a key of TABLE_COLUMNS.
+        df (pd.DataFrame): Rows to load, None to load `artifact`.
+        artifact (str): Normalized artifact of the table, see etl/artifacts.py.
+        target (str): Table to copy into if not `table` itself, e.g. its staging table.
+    """
+    if df is not None:
+        copy_frame(cur, table, df, target)
+    elif artifact_format() == 'csv':
+        copy_csv_file(cur, table, artifact_path(artifact), target)
+    else:
+        copy_frame(cur, table, read_artifact(artifact), target)
+
+
+def merge_table(cur, table):
+    """
+    Merges a table's staging table into it.
+
+    New keys are inserted and existing rows are only rewritten when a
+    column actually changed (ON CONFLICT ... DO UPDATE ... WHERE ... IS
+    DISTINCT FROM), so unchanged rows cost no writes.
+
+    Args:
+        cur (psycopg.Cursor): Cursor of the loading connection.
+        table (str): Table name, a key of TABLE_COLUMNS.
+
+    Returns:
+        dict: Number of 'inserted', 'updated' and 'unchanged' rows.
+    """
+    key = TABLE_KEYS[table]
+    columns = TABLE_COLUMNS[table]
+    values = [column for column in columns if column != key]
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in values)
+    current = ', '.join(f'{table}.{column}' for column in values)
+    staged = ', '.join(f'EXCLUDED.{column}' for column in values)
+    cur.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {table}_staging
+            ON CONFLICT ({key}) DO UPDATE SET {assignments}
+            WHERE ROW({current}) IS DISTINCT FROM ROW({staged})
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted),
+               (SELECT COUNT(*) FROM {table}_staging)
+        FROM upserted
+    """)
+    inserted, updated, staged_rows = cur.fetchone()
+    return {'inserted': inserted, 'updated': updated, 'unchanged': staged_rows - inserted - updated}
+
+
+def delete_missing(cur, table):
+    """
+    Deletes the rows of a table whose key is not in its staging table.
+
+    Returns:
+        int: Number of deleted rows.
+    """
+    key = TABLE_KEYS[table]
+    cur.execute(f"""
+        DELETE FROM {table} WHERE NOT EXISTS (
+            SELECT 1 FROM {table}_staging AS staging WHERE staging.{key} = {table}.{key})
+    """)
+    return cur.rowcount
+
+
+def delete_keys(cur, table, keys):
+    """
+    Deletes the rows of a table with the given keys.
+
+    Returns:
+        int: Number of deleted rows.
+    """
+    if not len(keys):
+        return 0
+    cur.execute(f'DELETE FROM {table} WHERE {TABLE_KEYS[table]} = ANY(%s::bpchar[])', (list(keys),))
+    return cur.rowcount
+
+
+def merge_load(conn, books_df=None, genre_df=None, in_stock_df=None, index=None):
+    """
+    Brings the tables in line with the normalized data, writing only what changed.
+
+    This function:
+    - COPYs every table into an UNLOGGED '<table>_staging' table (no WAL)
+    - Upserts genres, stock rows and books, in foreign key order, rewriting
+      only rows whose values changed (see merge_table())
+    - Deletes books, stock rows and genres that are no longer in the data,
+      then empties the staging tables
+    - With LOAD_HISTORY=1, records the prices and stock in price_history
+      (see etl/history.py)
+    - Commits everything in one transaction, so readers see either the
+      previous or the new tables, never a half-loaded state
+
+    With a DedupIndex (etl/dedup.py) holding the previous load, books and
+    stock rows whose fingerprint did not change are not even staged:
+    only new and changed rows are copied and merged, and the removed UPCs
+    are deleted by key. If the tables then do not hold exactly the
+    current rows (the index was stale), the merge is redone with every
+    row. The index is rewritten after the commit.
+
+    Args:
+        conn (psycopg.Connection): Connection to 'books_website'.
+        books_df (pd.DataFrame): Books table, None to load the artifact.
+        genre_df (pd.DataFrame): Genres table, None to load the artifact.
+        in_stock_df (pd.DataFrame): Stock table, None to load the artifact.
+        index (DedupIndex): Rows of the previous load, None to compare every row in the database.
+
+    Returns:
+        dict: Per table, the number of 'inserted', 'updated', 'unchanged' and 'deleted' rows.
+    """
+    frames = {'in_stock': in_stock_df, 'genres': genre_df, 'books': books_df}
+    artifacts = {'in_stock': IN_STOCK, 'genres': GENRES, 'books': BOOKS}
+    fingerprints = removed = None
+    skipped = 0
+    if index is not None and books_df is not None and in_stock_df is not None:
+        fingerprints = row_fingerprints(books_df.assign(in_stock=in_stock_df['in_stock'].to_numpy()))
+        if len(index):
+            status, removed = index.classify(books_df['upc'], fingerprints)
+            changed = status != UNCHANGED
+            frames['books'], frames['in_stock'] = books_df[changed], in_stock_df[changed]
+            skipped = len(books_df) - int(changed.sum())
+            logger.info(f'Dedup index: {skipped} unchanged books skipped, {int(changed.sum())} new or changed, '
+                        f'{len(removed)} removed')
+    counts = {}
+    with conn.cursor() as cur:
+        for table in ('genres', 'in_stock', 'books'):
+            create_staging(cur, table)
+            copy_table(cur, table, frames[table], artifacts[table], f'{table}_staging')
+            counts[table] = merge_table(cur, table)
+        for table in ('books', 'in_stock', 'genres'):
+            if removed is not None and table != 'genres':
+                counts[table]['deleted'] = delete_keys(cur, table, removed)
+                counts[table]['unchanged'] += skipped
+            else:
+                counts[table]['deleted'] = delete_missing(cur, table)
+            cur.execute(f'TRUNCATE {table}_staging')
+        if removed is not None:
+            stored = cur.execute('SELECT (SELECT COUNT(*) FROM books), (SELECT COUNT(*) FROM in_stock)').fetchone()
+            if stored != (len(books_df), len(in_stock_df)):
+                logger.warning(f'Dedup index is stale ({stored[0]} books in the database, {len(books_df)} expected), '
+                               'merging every row')
+                conn.rollback()
+                index.clear()
+                return merge_load(conn, books_df, genre_df, in_stock_df, index)
+    if HISTORY:
+        record_history(conn, books_df, in_stock_df)
+    conn.commit()
+    for table, table_counts in counts.items():
+        logger.info(f"Merged '{table}': " + ', '.join(f'{count} {name}' for name, count in table_counts.items()))
+    if fingerprints is not None:
+        index.replace(books_df['upc'], fingerprints)
+        index.save()
+    return counts
+
+
+def drop_constraints(cur):
+    """
+    Drops the keys, foreign keys and other indexes of the three tables before a bulk load.
+
+    Returns:
+        tuple: Statements that recreate the keys and indexes (one list per
+            table) and the foreign keys, to run once the data is in.
+    """
+    # price_history (etl/history.py) is partitioned, only exists in history mode and is not bulk loaded.
+    tables = [table for table in TABLE_COLUMNS if table != 'price_history']
+    cur.execute("""
+        SELECT conrelid::regclass::text, conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('p', 'u', 'f')
+        ORDER BY contype = 'f' DESC
+    """, (tables,))
+    constraints = cur.fetchall()
+    cur.execute("""
+        SELECT indrelid::regclass::text, indexrelid::regclass::text, pg_get_indexdef(indexrelid)
+        FROM pg_index
+        WHERE indrelid = ANY(%s::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)
+    """, (tables,))
+    indexes = cur.fetchall()
+
+    keys, foreign_keys = {}, []
+    for table, name, kind, definition in constraints:
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+        statement = f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+        if kind == 'f':
+            foreign_keys.append(statement)
+        else:
+            keys.setdefault(table, []).append(statement)
+    for table, name, definition in indexes:
+        cur.execute(f'DROP INDEX {name}')
+        keys.setdefault(table, []).append(definition)
+    return list(keys.values()), foreign_keys
+
+
+def run_statements(statements):
+    """Runs SQL statements in order on a connection of their own and commits them."""
+    with connection() as conn:
+        for statement in statements:
+            conn.execute(statement)
+
+
+def copy_chunk(table, df):
+    """Copies one table or chunk of a table on a connection of its own and commits it."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            copy_frame(cur, table, df)
+
+
+def parallel_load(books_df, genre_df, in_stock_df, workers):
+    """
+    Bulk loads the (empty) tables over several connections at once.
+
+    This function:
+    - Drops the primary keys, foreign keys and indexes of the tables, so
+      rows go in without per-row index updates or foreign key checks
+    - COPYs in_stock, genres and `workers` hash partitions (by UPC) of
+      books concurrently, each on its own connection
+    - Rebuilds the keys and indexes, one table per connection, then adds
+      the foreign keys back, which checks them in one pass per key, and
+      rebuilds genre_stats (see etl/analytics.py)
+    - Runs ANALYZE on the tables
+    - With LOAD_HISTORY=1, records the prices and stock in price_history
+      (see etl/history.py) once the tables are complete
+
+    If a copy fails, the tables are emptied before the constraints are
+    restored, and the error is raised. If the process dies instead, the
+    next prepare_database() does the same (see restore_constraints()).
+
+    Args:
+        books_df (pd.DataFrame): Books table.
+        genre_df (pd.DataFrame): Genres table.
+        in_stock_df (pd.DataFrame): Stock table.
+        workers (int): Number of concurrent connections.
+    """
+    partitions = pd.util.hash_pandas_object(books_df['upc'], index=False).to_numpy() % workers
+    tasks = [('in_stock', in_stock_df), ('genres', genre_df)]
+    tasks += [('books', books_df[partitions == partition]) for partition in range(workers)]
+
+    with connection() as conn, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
         with conn.cursor() as cur:
-            with cur.copy("COPY in_stock (upc, in_stock) FROM STDIN CSV HEADER") as copy:
-                with open('data/3_normalized_data/in_stock.csv', 'r', encoding='utf-8') as f:
-                    for line in f:
-                        copy.write(line)
+            keys, foreign_keys = drop_constraints(cur)
+            suspend_analytics(cur)
+        conn.commit()
+        try:
+            list(executor.map(with_log_context(lambda task: copy_chunk(*task)), tasks))
+        except Exception:
+            conn.execute('TRUNCATE TABLE books, genres, in_stock')
+            conn.commit()
+            raise
+        finally:
+            list(executor.map(with_log_context(run_statements), keys))
+            for statement in foreign_keys:
+                conn.execute(statement)
+            resume_analytics(conn)
+            conn.execute('ANALYZE books, genres, in_stock')
+            conn.commit()
+        if HISTORY:
+            record_history(conn, books_df, in_stock_df)
+            conn.commit()
+    logger.info(f'Loaded {len(books_df)} books over {workers} connections')
+
+
+def load(books_df=None, genre_df=None, in_stock_df=None, mode=None, workers=None):
+    """
+    Creates the 'books_website' PostgreSQL database if it doesn't exist, 
+    creates all tables, if they don't exist ('books', 'genres', 'in_stock'), 
+    and loads the normalized tables into these tables using PostgreSQL's COPY command.
 
-            with cur.copy("COPY genres (genre_id, genre) FROM STDIN CSV HEADER") as copy:
-                with open('data/3_normalized_data/genres.csv', 'r', encoding='utf-8') as f:
-                    for line in f:
-                        copy.write(line)
+    The normalized DataFrames returned by normalize() are copied straight
+    from memory with binary COPY (see copy_frame()). Without them the
+    normalized artifacts are loaded instead (see copy_table()).
 
-            with cur.copy("COPY books (upc, titles, genre_id, ratings, product_type, price_excl_tax_gbp, price_incl_tax_gbp, tax, num_reviews) FROM STDIN CSV HEADER") as copy:
-                with open('data/3_normalized_data/books.csv', 'r', encoding='utf-8') as f:
-                    for line in f:
-                        copy.write(line)
-            
-  
+    With LOAD_MODE=replace (the default) the tables are truncated and
+    reloaded; with LOAD_MODE=merge they are kept and only the changes are
+    applied (see merge_load()). Merge loads skip the books that did not
+    change since the previous load, going by the dedup index that every
+    load keeps up to date (LOAD_SKIP_UNCHANGED=0 compares every row in the
+    database instead, see etl/dedup.py).
 
+    With LOAD_WORKERS > 1 a replace load copies the tables over that many
+    connections at once, with keys and foreign keys rebuilt afterwards
+    (see parallel_load()). It needs `workers` + 1 pooled connections; a
+    pool smaller than that raises ValueError before anything is changed.
 
+    The database connection parameters (user, password, host, port) are read 
+    from environment variables, and connections come from the pipeline's
+    connection pool, see etl/db.py.
 
-    
+    The dashboard indexes and the genre_stats aggregates are rebuilt after
+    a replace load and follow merge loads change by change, see
+    etl/analytics.py.
 
-                
+    With LOAD_HISTORY=1 the prices and stock of the load are recorded in
+    the partitioned 'price_history' table, which keeps every change across
+    runs, in the load's transaction and from the rows it loaded (see
+    etl/history.py).
 
+    This function handles the database creation, table setup, and bulk data loading.
 
+    Args:
+        books_df (pd.DataFrame): Books table, None to load the artifacts.
+        genre_df (pd.DataFrame): Genres table, None to load the artifacts.
+        in_stock_df (pd.DataFrame): Stock table, None to load the artifacts.
+        mode (str): 'replace' or 'merge', None for LOAD_MODE.
+        workers (int): Connections for a replace load, None for LOAD_WORKERS.
 
+    Returns:
+        dict: The row counts of merge_load() in merge mode, otherwise None.
 
+    Raises:
+        ValueError: Unknown mode, or more workers than the connection pool can serve.
+    """
+    mode = mode or LOAD_MODE
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}', expected one of {list(LOAD_MODES)}")
+    workers = workers or LOAD_WORKERS
+    capacity = pool_capacity()
+    if mode == 'replace' and workers > 1 and capacity is not None and workers + 1 > capacity:
+        # Checked before the tables are emptied: the load would wait POSTGRES_POOL_TIMEOUT and fail.
+        raise ValueError(f'A load over {workers} connections needs {workers + 1} from the pool, '
+                         f'which has {capacity}; raise POSTGRES_POOL_MAX_SIZE or lower LOAD_WORKERS')
+    prepare_database(truncate=mode == 'replace')
 
+    index = DedupIndex() if SKIP_UNCHANGED else None
+    counts = None
+    if mode == 'replace' and workers > 1:
+        frames = [df if df is not None else read_artifact(artifact)
+                  for df, artifact in ((books_df, BOOKS), (genre_df, GENRES), (in_stock_df, IN_STOCK))]
+        parallel_load(*frames, workers)
+        record_loaded(index, books_df, in_stock_df)
+    elif mode == 'merge':
+        with connection() as conn:
+            counts = merge_load(conn, books_df, genre_df, in_stock_df, index)
+    else:
+        with connection() as conn:
+            frames = {'in_stock': in_stock_df, 'genres': genre_df, 'books': books_df}
+            with conn.cursor() as cur:
+                # Dashboard indexes and genre_stats are rebuilt after the COPY, not kept up per row.
+                suspend_analytics(cur)
+                for table, artifact in (('in_stock', IN_STOCK), ('genres', GENRES), ('books', BOOKS)):
+                    copy_table(cur, table, frames[table], artifact)
+                resume_analytics(cur)
+            if HISTORY:
+                record_history(conn, books_df, in_stock_df)
+        record_loaded(index, books_df, in_stock_df)
 
-        
+    return counts
 
 
+def record_loaded(index, books_df, in_stock_df):
+    """
+    Makes the dedup index describe the rows a replace load just wrote.
 
-                
\ No newline at end of file
+    Loads from the artifacts (no DataFrames) clear it instead, so the next
+    merge load compares every row.
+    """
+    if index is None:
+        return
+    if books_df is None or in_stock_df is None:
+        index.clear()
+        return
+    index.replace(books_df['upc'], row_fingerprints(books_df.assign(in_stock=in_stock_df['in_stock'].to_numpy())))
+    index.save()
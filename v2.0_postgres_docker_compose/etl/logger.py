@@ -1,5 +1,249 @@
+import atexit
+import contextvars
+import functools
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.util
 import os
+import queue
+import threading
+import time
+
+LOG_DIR = os.getenv('ETL_LOG_DIR', 'logs')
+LOG_FORMAT = os.getenv('ETL_LOG_FORMAT', 'text')
+LOG_MAX_BYTES = int(os.getenv('ETL_LOG_MAX_BYTES', str(10 * 2**20)))
+LOG_BACKUPS = int(os.getenv('ETL_LOG_BACKUPS', '5'))
+# Warnings and errors from one line of code beyond this many per window are dropped and counted.
+LOG_REPEAT_LIMIT = int(os.getenv('ETL_LOG_REPEAT_LIMIT', '20'))
+LOG_REPEAT_WINDOW = float(os.getenv('ETL_LOG_REPEAT_WINDOW', '60'))
+
+# Fields added to every record: the run ID and stage are set by etl/metrics.py,
+# the URL is passed per call with extra={'url': url}. The run ID is shared by
+# the process; the stage is per thread (and asyncio task), so concurrent
+# pipelines don't stamp each other's records. with_log_context() passes it on
+# to worker threads, which start without it.
+CONTEXT = {'run_id': None}
+STAGE = contextvars.ContextVar('stage', default=None)
+CONTEXT_FIELDS = ('run_id', 'stage', 'url')
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the run context, in the thread that logs them."""
+
+    def filter(self, record):
+        context = {**CONTEXT, 'stage': STAGE.get()}
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field))
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate-limits repeated warnings and errors.
+
+    Records are grouped by the line of code that logged them, so a message
+    about every failing book counts as one. Each line passes `limit`
+    records per `window` seconds; the rest are dropped, and the next
+    record that passes says how many were. INFO records always pass.
+    """
+
+    def __init__(self, limit=LOG_REPEAT_LIMIT, window=LOG_REPEAT_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.sites = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.limit <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            started, passed, dropped = self.sites.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, passed = now, 0
+            if passed >= self.limit:
+                self.sites[key] = (started, passed, dropped + 1)
+                return False
+            self.sites[key] = (started, passed + 1, 0)
+        if dropped:
+            record.msg = f'{record.msg} ({dropped} similar messages suppressed)'
+        return True
+
+    def suppressed(self):
+        """Returns (pathname, lineno, count) for every line with dropped records not reported yet, and resets the counts."""
+        with self.lock:
+            counts = [(*key, dropped) for key, (_, _, dropped) in self.sites.items() if dropped]
+            for pathname, lineno, _ in counts:
+                started, passed, _ = self.sites[(pathname, lineno)]
+                self.sites[(pathname, lineno)] = (started, passed, 0)
+        return counts
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines with the run context fields."""
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is not None:
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def file_handler():
+    """Returns the size-rotated log file handler, text or JSON lines (env: ETL_LOG_FORMAT)."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    if LOG_FORMAT == 'json':
+        handler = logging.handlers.RotatingFileHandler(os.path.join(LOG_DIR, 'pipeline_logs.jsonl'), mode='a',
+                                                       maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler = logging.handlers.RotatingFileHandler(os.path.join(LOG_DIR, 'pipeline_logs.txt'), mode='a',
+                                                       maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+class LogQueue:
+    """
+    Hands log records to a background thread that writes them.
+
+    Logging in the pipeline only stamps the record and puts it on a queue;
+    formatting and the file and terminal writes happen in a QueueListener
+    thread, so a crawl never waits for disk or terminal I/O and concurrent
+    workers do not contend on the handlers' locks. The listener is started
+    with the first logger and stopped (after writing what is queued) at
+    exit.
+
+    Worker processes do not write the log themselves: they send their
+    records over a multiprocessing queue (`child_queue()`) to the parent,
+    where a receiver thread puts them on the listener's queue, so there is
+    one writer of the log file however many processes log.
+    """
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.handler = logging.handlers.QueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter())
+        self.repeats = RepeatFilter()
+        self.handler.addFilter(self.repeats)
+        self.listener = None
+        self.children = None
+        self.receiver = None
+        self.forwarding = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.listener is None and not self.forwarding:
+                console_handler = logging.StreamHandler()
+                console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+                self.listener = logging.handlers.QueueListener(self.queue, file_handler(), console_handler)
+                self.listener.start()
+            self._start_receiver()
+
+    def _start_receiver(self):
+        if self.children is not None and self.receiver is None and self.listener is not None:
+            self.receiver = threading.Thread(target=self._receive, name='log-receiver', daemon=True)
+            self.receiver.start()
+
+    def _receive(self):
+        while (record := self.children.get()) is not None:
+            self.queue.put(record)
+
+    def stop(self):
+        """Writes the queued records, reports suppressed repeats and stops the listener."""
+        with self.lock:
+            listener, self.listener = self.listener, None
+            receiver, self.receiver = self.receiver, None
+        if receiver is not None:
+            self.children.put(None)
+            receiver.join()
+        for pathname, lineno, count in self.repeats.suppressed():
+            record = logging.LogRecord('etl.logger', logging.WARNING, pathname, lineno,
+                                       f'{count} similar messages suppressed', None, None)
+            ContextFilter().filter(record)
+            self.handler.queue.put(record)
+        if listener is None:
+            return
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def flush(self):
+        """Waits until every record logged so far is written."""
+        self.stop()
+        self.start()
+
+    def child_queue(self):
+        """
+        Returns the queue worker processes send their records to.
+
+        Pass it to forward_logs() in the worker, e.g. as the initializer of
+        a ProcessPoolExecutor.
+
+        Returns:
+            multiprocessing.Queue: The queue, read by this process.
+        """
+        with self.lock:
+            if self.children is None:
+                self.children = multiprocessing.Queue()
+            self._start_receiver()
+            return self.children
+
+    def forward(self, children):
+        """Sends this (worker) process's records to the parent's `children` queue instead of writing them."""
+        with self.lock:
+            listener, self.listener = self.listener, None
+            self.forwarding = True
+            self.children = children
+            self.handler.queue = children
+        if listener is not None:
+            # Started by an import in a spawned worker, before this was called.
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        # Worker processes may leave through os._exit(), which skips atexit
+        # but runs multiprocessing's finalizers.
+        multiprocessing.util.Finalize(self, self.stop, exitpriority=0)
+
+    def after_fork(self):
+        # The parent's threads do not exist in the child, and what it had
+        # queued is the parent's to write.
+        self.lock = threading.Lock()
+        self.listener = None
+        self.receiver = None
+        self.queue = queue.SimpleQueue()
+        self.handler.queue = self.queue
+        if self.children is not None:
+            self.forward(self.children)
+        else:
+            self.start()
+            multiprocessing.util.Finalize(self, self.stop, exitpriority=0)
+
+
+LOG_QUEUE = LogQueue()
+atexit.register(LOG_QUEUE.stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=LOG_QUEUE.after_fork)
+
+
+def forward_logs(children):
+    """Sends the records of a worker process to its parent's log, see LogQueue.child_queue()."""
+    LOG_QUEUE.forward(children)
+
 
 def get_logger(name):
 
@@ -7,16 +251,33 @@ def get_logger(name):
     logger.setLevel(logging.INFO)
 
     if not logger.handlers:
-        os.makedirs('logs',exist_ok=True)
+        LOG_QUEUE.start()
+        logger.addHandler(LOG_QUEUE.handler)
+
+    return logger
 
-        file_handler=logging.FileHandler('logs/pipeline_logs.txt', mode='a')
-        console_handler=logging.StreamHandler()
 
-        formatter=logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
+def set_log_context(**fields):
+    """Sets fields added to every record from now on, e.g. set_log_context(stage='transform') (this thread only)."""
+    if 'stage' in fields:
+        STAGE.set(fields.pop('stage'))
+    CONTEXT.update(fields)
 
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
 
-    return logger
+def with_log_context(func):
+    """Returns `func` wrapped to log with the caller's stage, for use as a thread target or executor task."""
+    stage = STAGE.get()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        token = STAGE.set(stage)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            STAGE.reset(token)
+    return run
+
+
+def flush_logs():
+    """Waits until everything logged so far is in the log file."""
+    LOG_QUEUE.flush()
@@ -0,0 +1,288 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+from etl.logger import STAGE, get_logger, set_log_context
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = get_logger(__name__)
+
+METRICS_DIR = os.getenv('ETL_METRICS_DIR', 'logs/metrics')
+PROFILE_STAGE = os.getenv('ETL_PROFILE_STAGE', '')
+PROFILE_MODE = os.getenv('ETL_PROFILE_MODE', 'cprofile')
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_TOP = 30
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def peak_rss_bytes():
+    """Returns the process's peak resident set size so far, None where the resource module is missing."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Returns (upper bound, observations <= bound) pairs, ending with '+Inf'."""
+        total = 0
+        pairs = []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    """
+    Performance metrics of one pipeline run.
+
+    Stages are timed with stage() (wall and CPU time, rows, rows/s and the
+    peak RSS reached by the end of the stage). Other code adds counters
+    with inc() and histogram observations with observe(), e.g. the fetchers
+    record HTTP latency and bytes downloaded and load() records COPY rows,
+    bytes and time per table. write() saves everything as JSON and in the
+    Prometheus text format. All methods are thread-safe.
+
+    Setting ETL_PROFILE_STAGE to a stage name also captures that stage with
+    cProfile (ETL_PROFILE_MODE=cprofile, the default: a .prof file for
+    pstats or snakeviz and a text summary) or tracemalloc
+    (ETL_PROFILE_MODE=tracemalloc: the top allocation sites and the traced
+    peak). cProfile only sees the thread that runs the stage, not the
+    parallel load's workers or the parser processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears all metrics and starts a new run."""
+        with self.lock:
+            self.run_id = time.strftime('%Y%m%dT%H%M%S')
+            self.started_at = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+        set_log_context(run_id=self.run_id)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): Counter name, ending in '_total' (exported with an 'etl_' prefix).
+            value (float): Amount to add.
+            **labels: Label values, e.g. table='books'.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """
+        Adds an observation to a histogram.
+
+        Args:
+            name (str): Histogram name, e.g. 'http_request_seconds'.
+            value (float): Observed value.
+            buckets (tuple): Bucket upper bounds, used when the histogram is created.
+            **labels: Label values.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a pipeline stage.
+
+        Use as `with METRICS.stage('transform') as stats:` and set
+        stats['rows'] to the number of rows the stage produced. A stage that
+        runs more than once adds up its times and rows. Records logged
+        during the stage, in this thread and the workers it starts with
+        with_log_context(), carry its name (see etl/logger.py).
+
+        Args:
+            name (str): Stage name, also matched against ETL_PROFILE_STAGE.
+
+        Yields:
+            dict: The stage's record.
+        """
+        stats = {'rows': 0}
+        stage_token = STAGE.set(name)
+        profiler = self._start_profile(name) if name == PROFILE_STAGE else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stats
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            STAGE.reset(stage_token)
+            if profiler is not None:
+                stats.update(self._stop_profile(name, profiler))
+            with self.lock:
+                record = self.stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0})
+                record['wall_seconds'] += wall
+                record['cpu_seconds'] += cpu
+                record['rows'] += stats.pop('rows') or 0
+                record['rows_per_second'] = record['rows'] / record['wall_seconds'] if record['wall_seconds'] else 0.0
+                record['peak_rss_bytes'] = peak_rss_bytes()
+                record.update(stats)
+            logger.info(f"Stage '{name}': {wall:.2f} s wall, {cpu:.2f} s CPU, {record['rows']} rows")
+
+    def _start_profile(self, name):
+        if PROFILE_MODE == 'tracemalloc':
+            tracemalloc.start(10)
+            return 'tracemalloc'
+        if PROFILE_MODE != 'cprofile':
+            logger.error(f"Unknown ETL_PROFILE_MODE '{PROFILE_MODE}', expected one of {PROFILE_MODES}")
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profile(self, name, profiler):
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        base = os.path.join(METRICS_DIR, f'{self.run_id}-{name}')
+        if profiler == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(base + '-tracemalloc.txt', 'w', encoding='utf-8') as f:
+                f.write(f'Traced peak: {peak / 2 ** 20:.1f} MiB\n')
+                for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                    f.write(f'{stat}\n')
+            logger.info(f"tracemalloc capture of '{name}' written to {base}-tracemalloc.txt")
+            return {'traced_peak_bytes': peak}
+        profiler.disable()
+        profiler.dump_stats(base + '.prof')
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        with open(base + '-cprofile.txt', 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        logger.info(f"cProfile capture of '{name}' written to {base}.prof")
+        return {}
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON-serializable dict.
+
+        Besides the raw counters and histograms it contains a 'copy'
+        section with rows/s and bytes/s per table, from the COPY counters.
+        """
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                           'buckets': [[bound, count] for bound, count in histogram.cumulative()]}
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+            copy = {}
+            for (name, labels), value in self.counters.items():
+                if name in ('copy_rows_total', 'copy_bytes_total', 'copy_seconds_total'):
+                    copy.setdefault(dict(labels).get('table'), {})[name[5:-6]] = value
+            for table in copy.values():
+                seconds = table.get('seconds') or 0
+                table['rows_per_second'] = table.get('rows', 0) / seconds if seconds else 0.0
+                table['bytes_per_second'] = table.get('bytes', 0) / seconds if seconds else 0.0
+            return {'run_id': self.run_id, 'started_at': self.started_at, 'finished_at': time.time(),
+                    'peak_rss_bytes': peak_rss_bytes(), 'stages': {name: dict(record) for name, record in
+                                                                   self.stages.items()},
+                    'copy': copy, 'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self, snapshot=None):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+
+        Stage records become gauges labelled by stage, e.g.
+        etl_stage_wall_seconds{stage="extract"}. The file can be picked up
+        by node_exporter's textfile collector or pushed to a Pushgateway.
+        """
+        snapshot = snapshot or self.snapshot()
+        lines = []
+
+        def labelled(labels):
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+        stage_fields = sorted({field for record in snapshot['stages'].values() for field in record})
+        for field in stage_fields:
+            lines.append(f'# TYPE etl_stage_{field} gauge')
+            for stage, record in snapshot['stages'].items():
+                if record.get(field) is not None:
+                    lines.append(f'etl_stage_{field}{labelled({"stage": stage})} {record[field]}')
+        if snapshot['peak_rss_bytes'] is not None:
+            lines += ['# TYPE etl_peak_rss_bytes gauge', f'etl_peak_rss_bytes {snapshot["peak_rss_bytes"]}']
+
+        typed = set()
+        for counter in snapshot['counters']:
+            name = f'etl_{counter["name"]}'
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{labelled(counter["labels"])} {counter["value"]}')
+        for histogram in snapshot['histograms']:
+            name = f'etl_{histogram["name"]}'
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            for bound, count in histogram['buckets']:
+                lines.append(f'{name}_bucket{labelled({**histogram["labels"], "le": bound})} {count}')
+            lines.append(f'{name}_sum{labelled(histogram["labels"])} {histogram["sum"]}')
+            lines.append(f'{name}_count{labelled(histogram["labels"])} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory=METRICS_DIR):
+        """
+        Writes the run's metrics to '<run_id>.json' and '<run_id>.prom' in `directory`.
+
+        Args:
+            directory (str): Output directory (env: ETL_METRICS_DIR).
+
+        Returns:
+            str: Path of the JSON file.
+        """
+        snapshot = self.snapshot()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.run_id}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+        with open(os.path.join(directory, f'{self.run_id}.prom'), 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(snapshot))
+        return path
+
+
+METRICS = Metrics()
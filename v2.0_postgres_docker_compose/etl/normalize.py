@@ -1,23 +1,46 @@
-import os
-
 import pandas as pd
 
+from etl.artifacts import BOOKS, GENRES, IN_STOCK, write_artifact
+from etl.dictionary import Dictionary
 from etl.logger import get_logger
 
 logger = get_logger(__name__)
 
+BOOK_COLUMNS = ['upc', 'titles', 'genre_id', 'ratings', 'product_type', 'price_excl_tax_gbp',
+                'price_incl_tax_gbp', 'tax', 'num_reviews']
+
+
+def split_tables(books_clean_df, genres):
+    """
+    Replaces genre names with IDs and splits the cleaned data into the books and in_stock tables.
+
+    Args:
+        books_clean_df (pd.DataFrame): The cleaned DataFrame containing book data.
+        genres (Dictionary): Genre dictionary; genres it does not know yet are added.
+
+    Returns:
+        tuple: books_df and in_stock_df.
+    """
+    books_clean_df['genre']=genres.encode(books_clean_df['genre'])
+    books_clean_df=books_clean_df.rename(columns={'genre':'genre_id'})
+    books_df=books_clean_df[BOOK_COLUMNS].copy()
+    in_stock_df = books_clean_df[['upc', 'in_stock']].copy()
+    return books_df, in_stock_df
+
+
 def normalize(books_clean_df):
     """
     Normalizes the cleaned book DataFrame into separate tables for relational storage.
 
     This function:
-    - Extracts unique genres and assigns IDs to create a genre lookup table.
+    - Looks the genres up in the persistent genre dictionary (etl/dictionary.py);
+      genres seen before keep their IDs and new ones are appended.
     - Replaces genre names in the books table with corresponding genre IDs.
     - Creates three DataFrames:
         1. books_df: Main book details with genre_id.
-        2. genre_df: Genre lookup table.
+        2. genre_df: Genre lookup table (the whole dictionary).
         3. in_stock_df: Availability of books (stock count).
-    - Saves each DataFrame to a separate CSV file.
+    - Saves each DataFrame to a separate artifact file (CSV, Parquet or Arrow).
 
     Args:
         books_clean_df (pd.DataFrame): The cleaned DataFrame containing book data.
@@ -29,24 +52,30 @@ def normalize(books_clean_df):
             - in_stock_df (pd.DataFrame)
     """
     try:
-        unique_genres = books_clean_df['genre'].unique()
-        unique_genres=[data.strip() for data in unique_genres]
-        unique_genres=sorted(unique_genres)
-        genre_to_id = {genre: idx for idx, genre in enumerate(unique_genres, start=1)}
-        genre_df = pd.DataFrame({'id': list(genre_to_id.values()),'genre': list(genre_to_id.keys())})
-        books_clean_df['genre']=books_clean_df['genre'].map(genre_to_id)
-        books_clean_df=books_clean_df.rename(columns={'genre':'genre_id'})
-        books_df=books_clean_df[['upc', 'titles', 'genre_id', 'ratings', 'product_type','price_excl_tax_gbp', 'price_incl_tax_gbp', 'tax', 'num_reviews']].copy()
-        in_stock_df = books_clean_df[['upc', 'in_stock']].copy()
+        genres = Dictionary('genre')
+        books_df, in_stock_df = split_tables(books_clean_df, genres)
+        genre_df = genres.frame('genre')
+        genres.save()
     except Exception as e:
         logger.error(f"Error normalization: {e}")
 
     try:
-        os.makedirs('data/3_normalized_data', exist_ok=True)
-        books_df.to_csv('data/3_normalized_data/books.csv', index=False)
-        genre_df.to_csv('data/3_normalized_data/genres.csv', index=False)
-        in_stock_df.to_csv('data/3_normalized_data/in_stock.csv', index=False)
+        save_normalized(books_df, genre_df, in_stock_df)
     except Exception as e:
         logger.error(f"Error saving normalized data: {e}")
 
     return books_df, genre_df, in_stock_df
+
+
+def save_normalized(books_df, genre_df, in_stock_df):
+    """
+    Saves the normalized tables to 'data/3_normalized_data' (CSV, Parquet or Arrow, see etl/artifacts.py).
+
+    Args:
+        books_df (pd.DataFrame): Books table.
+        genre_df (pd.DataFrame): Genre lookup table.
+        in_stock_df (pd.DataFrame): Stock table.
+    """
+    write_artifact(books_df, BOOKS)
+    write_artifact(genre_df, GENRES)
+    write_artifact(in_stock_df, IN_STOCK)
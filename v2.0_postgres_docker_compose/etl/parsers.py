@@ -0,0 +1,207 @@
+import os
+
+from etl.logger import get_logger
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+logger = get_logger(__name__)
+
+PARSER = os.getenv('EXTRACT_PARSER', 'lxml')
+
+PRODUCT_INFO_FIELDS = {
+    'upc': 'UPC',
+    'product_type': 'Product Type',
+    'price_excl_tax_gbp': 'Price (excl. tax)',
+    'price_incl_tax_gbp': 'Price (incl. tax)',
+    'tax': 'Tax',
+    'in_stock': 'Availability',
+    'num_reviews': 'Number of reviews'}
+
+
+def build_record(title, genre, rating, product_info):
+    """
+    Assembles a raw record from the fields read off a detail page.
+
+    Returns:
+        dict: One value per raw column, 'N/A' for product info rows that are missing.
+    """
+    record = {'titles': title, 'genre': genre, 'ratings': rating}
+    for column, label in PRODUCT_INFO_FIELDS.items():
+        record[column] = product_info.get(label, 'N/A')
+    return record
+
+
+def build_listing(url, title, rating, price, availability):
+    """
+    Assembles the fields a catalogue page shows for one book.
+
+    Returns:
+        dict: Detail page URL plus title, rating, price and availability as
+            scraped text (None where the listing lacks the field).
+    """
+    return {'url': url, 'titles': title, 'ratings': rating,
+            'price_incl_tax_gbp': price, 'availability': availability}
+
+
+class SoupParser:
+    """
+    BeautifulSoup ('html.parser') backend.
+
+    Builds the full document tree for every page. It is the reference
+    implementation and the fallback when lxml is not installed.
+    """
+
+    name = 'bs4'
+
+    def catalogue_items(self, html, base_url):
+        soup = BeautifulSoup(html, 'html.parser')
+        items = []
+        for book in soup.find_all('h3'):
+            link = book.find('a')
+            pod = book.find_parent('article')
+            rating = pod.find('p', class_='star-rating') if pod else None
+            price = pod.find('p', class_='price_color') if pod else None
+            stock = pod.find('p', class_='availability') if pod else None
+            items.append(build_listing(
+                base_url + link['href'], link.get('title'),
+                rating['class'][1] if rating and len(rating['class']) > 1 else None,
+                price.text.strip() if price else None,
+                stock.text.strip() if stock else None))
+        return items
+
+    def catalogue_links(self, html, base_url):
+        return [item['url'] for item in self.catalogue_items(html, base_url)]
+
+    def page_count(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        current = soup.find('li', class_='current')
+        if current is None:
+            return None
+        try:
+            return int(current.text.split()[-1])
+        except ValueError:
+            return None
+
+    def book_page(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        title = soup.find('li', class_='active').text.strip()
+        breadcrumb = soup.find('ul', class_='breadcrumb')
+        genre_li = breadcrumb.find_all('li')[2].text.strip()
+        rating = soup.find('p', class_='star-rating')['class'][1]
+
+        table = soup.find('table', class_='table table-striped')
+        product_info = {}
+        for row in table.find_all('tr'):
+            product_info[row.th.text.strip()] = row.td.text.strip()
+
+        return build_record(title, genre_li, rating, product_info)
+
+
+def has_class(name):
+    """XPath predicate matching a class token, like BeautifulSoup's class_= filter."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser:
+    """
+    lxml backend with precompiled XPath expressions.
+
+    libxml2 builds the tree in C and each field is read with one compiled
+    XPath query instead of walking Python objects, which makes it several
+    times faster than the BeautifulSoup backend. Every query mirrors the
+    corresponding BeautifulSoup lookup (first match, class tokens, exact
+    class string for the product table) so both return the same record.
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        self.headings = etree.XPath('//h3')
+        self.first_link = etree.XPath('(.//a)[1]')
+        self.product_pod = etree.XPath('ancestor::article[1]')
+        self.pod_rating = etree.XPath(f'(.//p[{has_class("star-rating")}])[1]/@class')
+        self.pod_price = etree.XPath(f'(.//p[{has_class("price_color")}])[1]')
+        self.pod_stock = etree.XPath(f'(.//p[{has_class("availability")}])[1]')
+        self.current_page = etree.XPath(f'(//li[{has_class("current")}])[1]')
+        self.title = etree.XPath(f'(//li[{has_class("active")}])[1]')
+        self.breadcrumb_items = etree.XPath(f'(//ul[{has_class("breadcrumb")}])[1]//li')
+        self.rating = etree.XPath(f'(//p[{has_class("star-rating")}])[1]/@class')
+        self.table_rows = etree.XPath('(//table[@class="table table-striped"])[1]//tr')
+        self.header_cell = etree.XPath('(.//th)[1]')
+        self.data_cell = etree.XPath('(.//td)[1]')
+
+    def catalogue_items(self, html, base_url):
+        root = lxml_html.fromstring(html)
+        items = []
+        for book in self.headings(root):
+            link = self.first_link(book)[0]
+            pod = self.product_pod(book)
+            rating = self.pod_rating(pod[0]) if pod else []
+            price = self.pod_price(pod[0]) if pod else []
+            stock = self.pod_stock(pod[0]) if pod else []
+            rating_classes = rating[0].split() if rating else []
+            items.append(build_listing(
+                base_url + link.get('href'), link.get('title'),
+                rating_classes[1] if len(rating_classes) > 1 else None,
+                price[0].text_content().strip() if price else None,
+                stock[0].text_content().strip() if stock else None))
+        return items
+
+    def catalogue_links(self, html, base_url):
+        return [item['url'] for item in self.catalogue_items(html, base_url)]
+
+    def page_count(self, html):
+        current = self.current_page(lxml_html.fromstring(html))
+        if not current:
+            return None
+        try:
+            return int(current[0].text_content().split()[-1])
+        except ValueError:
+            return None
+
+    def book_page(self, html):
+        root = lxml_html.fromstring(html)
+        title = self.title(root)[0].text_content().strip()
+        genre_li = self.breadcrumb_items(root)[2].text_content().strip()
+        rating = self.rating(root)[0].split()[1]
+
+        rows = self.table_rows(root)
+        if not rows:
+            raise AttributeError('product information table not found')
+        product_info = {}
+        for row in rows:
+            key = self.header_cell(row)[0].text_content().strip()
+            product_info[key] = self.data_cell(row)[0].text_content().strip()
+
+        return build_record(title, genre_li, rating, product_info)
+
+
+BACKENDS = {'bs4': SoupParser, 'lxml': LxmlParser}
+_parsers = {}
+
+
+def get_parser(name=None):
+    """
+    Returns the parser backend, created once per process.
+
+    Args:
+        name (str): 'lxml' or 'bs4' (env: EXTRACT_PARSER, default 'lxml').
+            Falls back to 'bs4' when lxml is not installed.
+
+    Returns:
+        SoupParser or LxmlParser: The parser backend.
+    """
+    name = name or PARSER
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}', expected one of {sorted(BACKENDS)}")
+    if name not in _parsers:
+        backend = name
+        if name == 'lxml' and etree is None:
+            logger.warning('lxml is not installed, using the BeautifulSoup parser')
+            backend = 'bs4'
+        _parsers[name] = BACKENDS[backend]()
+    return _parsers[name]
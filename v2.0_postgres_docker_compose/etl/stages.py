@@ -0,0 +1,321 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from etl.logger import LOG_QUEUE, forward_logs, get_logger, with_log_context
+from etl.metrics import METRICS
+
+logger = get_logger(__name__)
+
+PARSE_WORKERS = int(os.getenv('EXTRACT_PARSE_WORKERS', '0'))
+PARSE_QUEUE = int(os.getenv('EXTRACT_PARSE_QUEUE', '64'))
+PIPELINE_QUEUE = int(os.getenv('ETL_PIPELINE_QUEUE', '4'))
+
+# Marks the end of a stage's output.
+DONE = object()
+
+
+def timed_call(func, *args):
+    """Runs `func` in a parser worker and returns its result with the CPU time it used."""
+    start = time.process_time()
+    result = func(*args)
+    return result, time.process_time() - start
+
+
+class StageCounters:
+    """Throughput counters of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.idle = 0.0
+
+    def rate(self):
+        return self.items / self.busy if self.busy else 0.0
+
+
+class ParseStage:
+    """
+    Bounded queue between the fetch tasks and a process pool of parsers.
+
+    Fetch tasks hand each downloaded page to `parse()`, which puts it on an
+    asyncio queue of at most `queue_size` pages and waits for the record.
+    `workers` dispatcher tasks take pages off the queue and run the parser
+    in a ProcessPoolExecutor with the same number of processes, so parsing
+    uses every core while the event loop keeps downloading. When the
+    parsers fall behind, the queue fills up and `parse()` blocks, which
+    holds back the fetch tasks (back-pressure).
+
+    With `workers=0` pages are parsed inline on the event loop, as before.
+    The parsers' log records are written by this process (see
+    LogQueue.child_queue() in etl/logger.py).
+
+    Counters for both sides are logged on exit: fetch tasks blocked on a
+    full queue point at the parsers as the bottleneck, parsers idle on an
+    empty queue point at the network.
+
+    Use as `async with ParseStage(...) as stage`.
+
+    Args:
+        workers (int): Parser processes (env: EXTRACT_PARSE_WORKERS).
+        queue_size (int): Pages fetched but not yet parsed (env: EXTRACT_PARSE_QUEUE).
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, queue_size=PARSE_QUEUE):
+        self.workers = max(0, workers)
+        self.queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.fetch = StageCounters('fetch')
+        self.parsing = StageCounters('parse')
+        self.idle = 0.0
+        self.max_depth = 0
+        self.executor = None
+        self.dispatchers = []
+        self.started = None
+
+    async def __aenter__(self):
+        self.started = time.monotonic()
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=forward_logs,
+                                                initargs=(LOG_QUEUE.child_queue(),))
+            self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.log_summary()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = time.monotonic()
+            func, args, future = await self.queue.get()
+            self.idle += time.monotonic() - start
+            try:
+                result, cpu = await loop.run_in_executor(self.executor, timed_call, func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.parsing.busy += cpu
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.parsing.items += 1
+                self.queue.task_done()
+
+    def fetched(self, html, seconds):
+        """Records one downloaded page and the seconds the request took."""
+        self.fetch.items += 1
+        self.fetch.bytes += len(html)
+        self.fetch.busy += seconds
+
+    async def parse(self, func, *args):
+        """
+        Parses a page in the parser pool, or inline when there is no pool.
+
+        Args:
+            func (callable): Picklable parser function, e.g. etl.extract.parse_book_page.
+            *args: Its arguments, the page HTML first.
+
+        Returns:
+            The parser's result.
+        """
+        if self.executor is None:
+            result, cpu = timed_call(func, *args)
+            self.parsing.items += 1
+            self.parsing.busy += cpu
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        start = time.monotonic()
+        await self.queue.put((func, args, future))
+        self.fetch.blocked += time.monotonic() - start
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return await future
+
+    def log_summary(self):
+        elapsed = time.monotonic() - self.started
+        if not elapsed or not self.fetch.items:
+            return
+        logger.info(f'Fetch stage: {self.fetch.items} pages, {self.fetch.bytes / 1024:.0f} KiB, '
+                    f'{self.fetch.items / elapsed:.1f} pages/s, '
+                    f'blocked {self.fetch.blocked:.2f} s on a full parse queue')
+        logger.info(f'Parse stage: {self.parsing.items} pages, {self.workers or "inline"} workers, '
+                    f'{self.parsing.busy:.2f} CPU s ({self.parsing.rate():.0f} pages/s per worker), '
+                    f'peak queue {self.max_depth}, idle {self.idle:.2f} worker-s on an empty queue')
+        if self.workers:
+            bottleneck = 'parse' if self.fetch.blocked > self.idle / self.workers else 'fetch'
+            logger.info(f'Extract bottleneck: {bottleneck} stage')
+
+
+class StageFailed(Exception):
+    """Stops a stage thread because another stage failed."""
+
+
+class Pipeline:
+    """
+    Runs a source and a chain of stages at the same time, one thread each.
+
+    The source is iterated in an 'extract' thread and every item flows
+    through the stages in order, each stage taking its input from a queue
+    of at most `queue_size` items filled by the one before. A stage
+    returns what it hands on, or None to hand on nothing. While the load
+    stage writes one batch, the transform stage prepares the next and the
+    crawler fetches the one after, so the run takes about as long as its
+    slowest stage instead of the sum of all of them; when a stage falls
+    behind, the queue in front of it fills up and holds back the stages
+    before it (back-pressure).
+
+    The first exception in any thread stops the others and is raised by
+    run(); the source is closed, so a crawl stops too. Each stage's busy
+    time, time idle on an empty queue and time blocked on a full one are
+    logged and added to the run metrics (pipeline_*_seconds_total).
+
+    With `queue_size=0` everything runs one item at a time in the calling
+    thread, for comparison.
+
+    Args:
+        source (Iterable): Items of the first stage, e.g. extract_batches().
+        stages (list): (name, function) pairs.
+        queue_size (int): Items waiting in front of each stage (env: ETL_PIPELINE_QUEUE).
+    """
+
+    def __init__(self, source, stages, queue_size=PIPELINE_QUEUE):
+        self.source = source
+        self.stages = list(stages)
+        self.queue_size = max(0, queue_size)
+        self.counters = [StageCounters('extract')] + [StageCounters(name) for name, _ in self.stages]
+        self.stop = threading.Event()
+        self.errors = []
+
+    def run(self):
+        """Runs the pipeline to the end; returns the number of items the source produced."""
+        started = time.monotonic()
+        try:
+            if self.queue_size:
+                self._run_threads()
+            else:
+                self._run_inline()
+        finally:
+            self.log_summary(time.monotonic() - started)
+        return self.counters[0].items
+
+    def _run_inline(self):
+        source = iter(self.source)
+        try:
+            while True:
+                start = time.monotonic()
+                item = next(source, DONE)
+                self.counters[0].busy += time.monotonic() - start
+                if item is DONE:
+                    break
+                self.counters[0].items += 1
+                for (_, func), counters in zip(self.stages, self.counters[1:]):
+                    start = time.monotonic()
+                    item = func(item)
+                    counters.busy += time.monotonic() - start
+                    counters.items += 1
+                    if item is None:
+                        break
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+    def _run_threads(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=with_log_context(self._guard), args=(self._extract, queues[0]),
+                                    name='extract')]
+        for index, (name, func) in enumerate(self.stages):
+            output = queues[index + 1] if index + 1 < len(queues) else None
+            threads.append(threading.Thread(target=with_log_context(self._guard), name=name,
+                                            args=(self._stage, func, self.counters[index + 1], queues[index], output)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def _guard(self, target, *args):
+        try:
+            target(*args)
+        except StageFailed:
+            pass
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+
+    def _put(self, output, item, counters):
+        start = time.monotonic()
+        while True:
+            if self.stop.is_set():
+                raise StageFailed()
+            try:
+                output.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        counters.blocked += time.monotonic() - start
+
+    def _extract(self, output):
+        counters = self.counters[0]
+        source = iter(self.source)
+        try:
+            while True:
+                start = time.monotonic()
+                item = next(source, DONE)
+                counters.busy += time.monotonic() - start
+                if item is DONE:
+                    break
+                counters.items += 1
+                self._put(output, item, counters)
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+        self._put(output, DONE, counters)
+
+    def _stage(self, func, counters, source, output):
+        while True:
+            start = time.monotonic()
+            while True:
+                if self.stop.is_set():
+                    raise StageFailed()
+                try:
+                    item = source.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            counters.idle += time.monotonic() - start
+            if item is DONE:
+                break
+            start = time.monotonic()
+            result = func(item)
+            counters.busy += time.monotonic() - start
+            counters.items += 1
+            if result is not None and output is not None:
+                self._put(output, result, counters)
+        if output is not None:
+            self._put(output, DONE, counters)
+
+    def log_summary(self, elapsed):
+        for counters in self.counters:
+            for field in ('busy', 'idle', 'blocked'):
+                METRICS.inc(f'pipeline_{field}_seconds_total', getattr(counters, field), stage=counters.name)
+            logger.info(f'Pipeline stage {counters.name}: {counters.items} batches, busy {counters.busy:.2f} s, '
+                        f'idle {counters.idle:.2f} s on an empty queue, blocked {counters.blocked:.2f} s on a full one')
+        busiest = max(self.counters, key=lambda counters: counters.busy)
+        logger.info(f'Pipeline: {elapsed:.2f} s wall, {sum(c.busy for c in self.counters):.2f} s of stage work, '
+                    f'bottleneck {busiest.name} stage ({busiest.busy:.2f} s)')
@@ -0,0 +1,151 @@
+import os
+
+from contextlib import ExitStack
+
+import numpy as np
+
+from etl.artifacts import BOOKS, CLEANED_DATA, GENRES, IN_STOCK, QUARANTINE, TRANSFORM_ISSUES, ArtifactWriter
+from etl.extract import extract_batches
+from etl.db import connection
+from etl.dedup import DedupIndex, row_fingerprints
+from etl.history import HISTORY, record_history
+from etl.load import create_staging, load_batch, load_quarantine, prepare_database, publish_staging
+from etl.logger import get_logger
+from etl.dictionary import Dictionary
+from etl.normalize import split_tables
+from etl.stages import PIPELINE_QUEUE, Pipeline
+from etl.transform import report_issues, transform_books
+from etl.validate import validate_books
+
+logger = get_logger(__name__)
+
+STREAMING = os.getenv('ETL_STREAMING', '0') == '1'
+# Tables a streaming run replaces, in foreign key order.
+STREAMED_TABLES = ['in_stock', 'genres', 'books', 'quarantine']
+
+
+def run_streaming(batches=None, load=True, queue_size=PIPELINE_QUEUE):
+    """
+    Runs extract, transform, normalize and load at the same time, one batch of raw records at a time.
+
+    This function:
+    - Takes raw DataFrames from extract_batches() (one per catalogue page)
+    - Drops exact repeats of a book seen in an earlier batch, then cleans the batch with transform_books()
+    - Encodes genres with the persistent genre dictionary; genres seen for the first time get the next free IDs
+    - Appends every batch to the transform and normalize artifacts, and its bad values to transform_issues
+    - Validates every batch (see etl/validate.py); failing rows go to the quarantine artifact and table
+    - Appends the valid rows of every batch to the UNLOGGED staging tables with COPY
+    - Checks the row counts, replaces the tables with the staging tables and commits once, at the end
+    - With LOAD_HISTORY=1, records the loaded prices and stock in
+      price_history in the same transaction (see etl/history.py)
+
+    The stages run concurrently in a Pipeline (etl/stages.py): while one
+    batch is being loaded the next is transformed and later pages are
+    crawled, so the run takes about as long as the slowest stage. Only the
+    batches in flight are held in memory, so peak memory does not grow
+    with the size of the catalogue. The batches go into staging tables and
+    the tables are only emptied and refilled from them at the end, in the
+    same transaction (see publish_staging()): readers keep querying the
+    previous data during the crawl and wait only for that final copy. The
+    artifacts are moved into place when the run completes; a failed run
+    leaves the previous data and artifacts intact.
+
+    Repeats are keyed on the UPC, as in a batch run (see repeated_rows() in
+    etl/dedup.py): a row is dropped if an earlier batch had the same UPC
+    with the same values, compared by row_fingerprints(). A book listed
+    again with other values, e.g. a price that changed between catalogue
+    pages, is quarantined as a duplicate by validate_books(), so only its
+    first listing is loaded. Genre IDs come from the same dictionary as in
+    a batch run; the first batch loads all of it, later ones only the
+    genres they added.
+
+    Args:
+        batches (Iterable): Raw DataFrames, extract_batches() by default.
+        load (bool): Load the batches into PostgreSQL; False only writes the artifacts.
+        queue_size (int): Batches waiting in front of each stage, 0 runs the stages one after another.
+
+    Returns:
+        int: Number of books processed.
+    """
+    if batches is None:
+        batches = extract_batches()
+
+    if load:
+        prepare_database(truncate=False)
+        # The streaming load does not keep the merge load's dedup index up to date.
+        DedupIndex().clear()
+
+    genres = Dictionary('genre')
+    seen = {}
+    upcs = set()
+    totals = {'offset': 0, 'batches': 0, 'books': 0, 'valid': 0, 'loaded': 0}
+    with ExitStack() as artifacts:
+        conn = artifacts.enter_context(connection()) if load else None
+        cleaned = artifacts.enter_context(ArtifactWriter(CLEANED_DATA, index=True))
+        issues = artifacts.enter_context(ArtifactWriter(TRANSFORM_ISSUES))
+        tables = [artifacts.enter_context(ArtifactWriter(artifact)) for artifact in (BOOKS, GENRES, IN_STOCK)]
+        quarantine = artifacts.enter_context(ArtifactWriter(QUARANTINE))
+
+        def process(books_raw_df):
+            totals['batches'] += 1
+            books_raw_df.index += totals['offset']
+            totals['offset'] += len(books_raw_df)
+
+            # First fingerprint of every UPC; a batch has a few dozen rows.
+            repeated = np.zeros(len(books_raw_df), dtype=bool)
+            for position, (upc, fingerprint) in enumerate(zip(books_raw_df['upc'],
+                                                              row_fingerprints(books_raw_df))):
+                if upc in seen:
+                    repeated[position] = seen[upc] == fingerprint
+                else:
+                    seen[upc] = fingerprint
+            if repeated.any():
+                books_raw_df = books_raw_df[~repeated]
+
+            books_clean_df, issues_df = transform_books(books_raw_df)
+            report_issues(issues_df)
+            cleaned.write(books_clean_df)
+            if totals['batches'] == 1 or not issues_df.empty:
+                issues.write(issues_df)
+
+            known = len(genres.ids) if totals['batches'] > 1 else 0
+            books_df, in_stock_df = split_tables(books_clean_df, genres)
+            genre_df = genres.frame('genre').iloc[known:]
+            for writer, df in zip(tables, (books_df, genre_df, in_stock_df)):
+                writer.write(df)
+
+            totals['books'] += len(books_df)
+            books_df, in_stock_df, quarantine_df = validate_books(books_df, in_stock_df, genres.ids.values(), upcs)
+            if totals['batches'] == 1 or not quarantine_df.empty:
+                quarantine.write(quarantine_df)
+            totals['valid'] += len(books_df)
+            logger.info(f"Batch {totals['batches']}: {len(books_df)} books processed, {totals['books']} in total")
+            return (books_df, genre_df, in_stock_df, quarantine_df) if conn is not None else None
+
+        def load_tables(normalized):
+            books_df, genre_df, in_stock_df, quarantine_df = normalized
+            load_batch(conn, books_df, genre_df, in_stock_df, commit=False, staging=True)
+            load_quarantine(conn, quarantine_df, replace=False, staging=True)
+            totals['loaded'] += len(books_df)
+
+        if conn is not None:
+            with conn.cursor() as cur:
+                for table in STREAMED_TABLES:
+                    create_staging(cur, table)
+        stages = [('transform', process)] + ([('load', load_tables)] if conn is not None else [])
+        Pipeline(batches, stages, queue_size).run()
+        genres.save()
+
+        if conn is not None:
+            stored = conn.execute('SELECT (SELECT COUNT(*) FROM books_staging), '
+                                  '(SELECT COUNT(*) FROM in_stock_staging)').fetchone()
+            if stored != (totals['loaded'], totals['loaded']) or totals['loaded'] != totals['valid']:
+                raise RuntimeError(f"Streaming load is inconsistent: {totals['valid']} valid books, "
+                                   f"{stored[0]} books and {stored[1]} stock rows staged")
+            with conn.cursor() as cur:
+                publish_staging(cur, STREAMED_TABLES)
+            if HISTORY:
+                record_history(conn)
+            conn.commit()
+
+    return totals['books']
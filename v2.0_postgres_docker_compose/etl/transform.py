@@ -1,11 +1,160 @@
-import os
-
 import pandas as pd
 
+from etl.artifacts import CLEANED_DATA, TRANSFORM_ISSUES, write_artifact
+from etl.dedup import repeated_rows
 from etl.logger import get_logger
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 logger = get_logger(__name__)
 
+RATINGS = ['One', 'Two', 'Three', 'Four', 'Five']
+UNCATEGORIZED_GENRES = ['Default', 'Add a comment']
+MONEY_COLUMNS = ['price_excl_tax_gbp', 'price_incl_tax_gbp', 'tax']
+MONEY_DTYPE = pd.ArrowDtype(pa.decimal128(7, 2)) if pa is not None else 'float64'
+# Largest values the compact dtypes hold: 5 integer digits of decimal128(7, 2), and Int32.
+MONEY_DIGITS = 5
+COUNT_MAX = 2**31 - 1
+REPORTED_ISSUES = 20
+
+
+def parse_money(values):
+    """
+    Parses scraped prices such as 'Â£51.77' into fixed-point GBP amounts.
+
+    The currency prefix is stripped whatever its encoding, and the rest
+    must be a plain amount with two decimals. Amounts are exact
+    decimal128(7, 2) values, matching the NUMERIC columns in PostgreSQL;
+    without pyarrow they fall back to float64. Amounts too large for
+    decimal128(7, 2) are NA like unparseable ones.
+
+    Args:
+        values (pd.Series): Scraped price strings.
+
+    Returns:
+        pd.Series: Parsed amounts, NA where the value is not a price or out of range.
+    """
+    amounts = values.astype(str).str.replace(r'^[^\d-]+', '', regex=True)
+    valid = amounts.str.fullmatch(rf'0*\d{{1,{MONEY_DIGITS}}}\.\d{{2}}').fillna(False).astype(bool)
+    if pa is None:
+        return pd.to_numeric(amounts.where(valid), errors='coerce')
+    return amounts.where(valid).astype(MONEY_DTYPE)
+
+
+def parse_count(values):
+    """
+    Parses non-negative integer counts such as '3'.
+
+    Returns:
+        pd.Series: Int32 counts, NA where the value is not a count or does not fit in Int32.
+    """
+    counts = pd.to_numeric(values.astype(str).where(values.astype(str).str.fullmatch(r'\d+')), errors='coerce')
+    return counts.where(counts <= COUNT_MAX).astype('Int32')
+
+
+def parse_stock(values):
+    """
+    Reads the stock count out of availability texts such as 'In stock (22 available)'.
+
+    Returns:
+        pd.Series: Int32 counts, NA where the text holds no number.
+    """
+    return parse_count(values.astype(str).str.extract(r'(\d+)', expand=False))
+
+
+def parse_rating(values):
+    """
+    Maps star ratings 'One' to 'Five' onto 1 to 5.
+
+    Returns:
+        pd.Series: Int8 ratings, NA for anything that is not a star rating.
+    """
+    return values.map({rating: idx for idx, rating in enumerate(RATINGS, start=1)}).astype('Int8')
+
+
+def parse_distinct(values, parse):
+    """
+    Runs a parser over the distinct values of a column only.
+
+    Scraped columns repeat a small set of strings (five ratings, a few
+    dozen stock texts, a few thousand prices), so the column is factorized,
+    `parse` runs once per distinct value and the results are broadcast
+    back with take(). Nulls stay NA.
+
+    Args:
+        values (pd.Series): Raw column.
+        parse (callable): Vectorized parser taking and returning a Series.
+
+    Returns:
+        pd.Series: Parsed column with the index of `values`.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques))
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index)
+
+
+def transform_books(books_raw_df):
+    """
+    Cleans the raw books DataFrame and parses every column in one vectorized pass.
+
+    Each distinct raw value is parsed once (see parse_distinct()).
+
+    This function:
+    - Drops duplicate rows (compared in full only where the UPC repeats, see
+      etl/dedup.py) and rows with nulls
+    - Reclassifies the 'Default' and 'Add a comment' genres as 'Uncategorized'
+    - Builds a new DataFrame with explicit dtypes: category for genre and
+      product_type, Int8 ratings, fixed-point decimal prices and tax, Int32
+      stock and review counts
+    - Collects values that do not parse or are out of range, one row per bad value
+
+    A bad value only nulls its own cell; the rest of the row and column is kept.
+
+    Args:
+        books_raw_df (pd.DataFrame): Raw DataFrame with book data.
+
+    Returns:
+        tuple: The cleaned DataFrame and a DataFrame of bad values with the
+            raw row index, the column and the raw value.
+    """
+    books_raw_df = books_raw_df[~repeated_rows(books_raw_df)].dropna()
+
+    genre = books_raw_df['genre'].astype(str)
+    parsed = {
+        'titles': books_raw_df['titles'].astype(str),
+        'genre': genre.mask(genre.isin(UNCATEGORIZED_GENRES), 'Uncategorized').astype('category'),
+        'ratings': parse_distinct(books_raw_df['ratings'], parse_rating),
+        'upc': books_raw_df['upc'].astype(str),
+        'product_type': books_raw_df['product_type'].astype('category'),
+        **{column: parse_distinct(books_raw_df[column], parse_money) for column in MONEY_COLUMNS},
+        'in_stock': parse_distinct(books_raw_df['in_stock'], parse_stock),
+        'num_reviews': parse_distinct(books_raw_df['num_reviews'], parse_count)}
+    books_clean_df = pd.DataFrame(parsed, index=books_raw_df.index)
+
+    issues = []
+    for column in ['ratings', *MONEY_COLUMNS, 'in_stock', 'num_reviews']:
+        bad = books_clean_df[column].isna()
+        if bad.any():
+            issues.append(pd.DataFrame({'row': books_raw_df.index[bad], 'column': column,
+                                        'value': books_raw_df.loc[bad, column].astype(str).to_numpy()}))
+    issues_df = pd.concat(issues, ignore_index=True) if issues else pd.DataFrame(
+        {'row': pd.Series(dtype='int64'), 'column': pd.Series(dtype=str), 'value': pd.Series(dtype=str)})
+    return books_clean_df, issues_df
+
+
+def report_issues(issues_df):
+    """Logs how many values of each column failed to parse or were out of range, and the first few of them."""
+    if issues_df.empty:
+        return
+    for column, count in issues_df['column'].value_counts().items():
+        logger.warning(f"Transform: {count} bad values in column '{column}'")
+    for issue in issues_df.head(REPORTED_ISSUES).itertuples():
+        logger.warning(f"Transform: row {issue.row}, column '{issue.column}': bad value {issue.value!r}")
+
+
 def transform(books_raw_df):
     """
     Cleans and transforms the raw books DataFrame.
@@ -14,9 +163,10 @@ def transform(books_raw_df):
     - Drops duplicates and nulls
     - Converts data types
     - Maps string ratings to numeric
-    - Strips currency symbols and converts prices to float
+    - Strips currency symbols and converts prices to fixed-point decimals
     - Extracts stock numbers from text
-    - Saves cleaned data to 'books_cleaned_data.csv'
+    - Saves cleaned data to 'books_cleaned_data' and bad values to 'transform_issues'
+      (CSV, Parquet or Arrow, see etl/artifacts.py)
 
     Args:
         books_raw_df (pd.DataFrame): Raw DataFrame with book data.
@@ -24,41 +174,13 @@ def transform(books_raw_df):
     Returns:
         pd.DataFrame: Cleaned and transformed DataFrame.
     """
-    try:
-        check_duplicates=books_raw_df.duplicated().sum()
-        if check_duplicates !=0:
-            books_raw_df=books_raw_df.drop_duplicates()
-    except Exception as e:
-        logger.error(f"Error dropping nulls: {e}")
-
-    try:
-        check_null=books_raw_df.isnull().sum().sum()
-        if check_null!=0:
-            books_raw_df=books_raw_df.dropna()
-    except Exception as e:
-        logger.error(f"Error dropping duplicates: {e}")
+    books_clean_df, issues_df = transform_books(books_raw_df)
+    report_issues(issues_df)
 
     try:
-        books_raw_df['titles']=books_raw_df['titles'].astype(str)
-        books_raw_df['genre']=books_raw_df['genre'].astype(str)
-        books_raw_df['genre']= books_raw_df['genre'].replace(['Default', 'Add a comment'], 'Uncategorized')
-        books_raw_df['ratings']=books_raw_df['ratings'].astype(str)
-        rating_map = {'One': 1,'Two': 2,'Three': 3,'Four': 4,'Five': 5}
-        books_raw_df['ratings']=books_raw_df['ratings'].map(rating_map)
-        books_raw_df['upc']=books_raw_df['upc'].astype(str)
-        books_raw_df['product_type']=books_raw_df['product_type'].astype(str)
-        books_raw_df['price_excl_tax_gbp'] = books_raw_df['price_excl_tax_gbp'].astype(str).str[2:].astype(float)
-        books_raw_df['price_incl_tax_gbp'] = books_raw_df['price_incl_tax_gbp'].astype(str).str[2:].astype(float)
-        books_raw_df['tax'] = books_raw_df['tax'].str[2:].astype(float)
-        books_raw_df['in_stock']=books_raw_df['in_stock'].str.extract(r'(\d+)').astype(int)
-        books_raw_df['num_reviews']=books_raw_df['num_reviews'].astype(int)
-    except Exception as e:
-        logger.error(f"Error transforming column: {e}")
-
-    try:
-        os.makedirs('data/2_transform_data', exist_ok=True)
-        books_raw_df.to_csv('data/2_transform_data/books_cleaned_data.csv')
+        write_artifact(books_clean_df, CLEANED_DATA, index=True)
+        write_artifact(issues_df, TRANSFORM_ISSUES)
     except Exception as e:
         logger.error(f"Error saving transformed data: {e}")
-    
-    return books_raw_df
\ No newline at end of file
+
+    return books_clean_df
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+from etl.artifacts import QUARANTINE, write_artifact
+from etl.logger import get_logger
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = get_logger(__name__)
+
+# Column rules of the books and in_stock tables, matching their PostgreSQL types:
+#   required     no NA (transform() nulls values it cannot parse)
+#   type         'integer', 'decimal' or 'text'; other values must convert to it
+#   min, max     inclusive bounds
+#   pattern      regular expression the whole value must match
+#   max_length   longest text the column holds
+#   unique       no repeats (later repeats fail, the first occurrence is kept)
+#   references   the value must be a key of that table
+RULES = {
+    'upc': {'required': True, 'type': 'text', 'pattern': r'[0-9a-f]{16}', 'unique': True},
+    'titles': {'required': True, 'type': 'text', 'max_length': 300},
+    'genre_id': {'required': True, 'type': 'integer', 'references': 'genres'},
+    'ratings': {'required': True, 'type': 'integer', 'min': 1, 'max': 5},
+    'product_type': {'required': True, 'type': 'text', 'max_length': 15},
+    'price_excl_tax_gbp': {'required': True, 'type': 'decimal', 'min': 0, 'max': 999.99},
+    'price_incl_tax_gbp': {'required': True, 'type': 'decimal', 'min': 0, 'max': 999.99},
+    'tax': {'required': True, 'type': 'decimal', 'min': 0, 'max': 999.99},
+    'num_reviews': {'required': True, 'type': 'integer', 'min': 0, 'max': 2**31 - 1},
+    'in_stock': {'required': True, 'type': 'integer', 'min': 0, 'max': 2**31 - 1},
+}
+
+QUARANTINE_COLUMNS = ['upc', 'titles', 'reasons', 'record']
+
+
+def as_text(values):
+    """Returns a string column backed by Arrow when pyarrow is installed, for fast string kernels."""
+    return values.astype('string[pyarrow]' if pa is not None else 'string')
+
+
+def as_number(values, kind):
+    """Returns the column as numbers (float for comparisons), NA where a value does not convert."""
+    if kind == 'integer' and pd.api.types.is_integer_dtype(values.dtype):
+        return values
+    if isinstance(values.dtype, pd.ArrowDtype) and pa.types.is_decimal(values.dtype.pyarrow_dtype):
+        # Arrow casts decimals to floats natively; astype('Float64') would go through Python Decimals.
+        return values.astype(pd.ArrowDtype(pa.float64()))
+    return pd.to_numeric(values.astype(str) if values.dtype == object else values, errors='coerce')
+
+
+def check_column(values, rules, references):
+    """
+    Applies one column's rules as vectorized masks.
+
+    Args:
+        values (pd.Series): The column.
+        rules (dict): Its entry in RULES.
+        references (dict): Table name to the array of its keys, for 'references'.
+
+    Returns:
+        dict: Reason ('<column>: <rule>') to a boolean numpy array, True where the row fails.
+    """
+    column = values.name
+    failures = {}
+    missing = values.isna().to_numpy()
+    if rules.get('required'):
+        failures[f'{column}: missing'] = missing
+
+    kind = rules.get('type')
+    if kind in ('integer', 'decimal'):
+        numbers = as_number(values, kind)
+        not_numeric = numbers.isna().to_numpy() & ~missing
+        if kind == 'integer':
+            fraction = (numbers % 1 != 0).fillna(False).to_numpy(dtype=bool)
+            failures[f'{column}: not an integer'] = not_numeric | fraction
+        else:
+            failures[f'{column}: not a number'] = not_numeric
+        if 'min' in rules:
+            failures[f'{column}: below {rules["min"]}'] = (numbers < rules['min']).fillna(False).to_numpy(dtype=bool)
+        if 'max' in rules:
+            failures[f'{column}: above {rules["max"]}'] = (numbers > rules['max']).fillna(False).to_numpy(dtype=bool)
+        if 'references' in rules:
+            keys = references[rules['references']]
+            failures[f'{column}: unknown {rules["references"]} key'] = ~numbers.isin(keys).to_numpy(dtype=bool) & ~missing
+    if 'pattern' in rules or 'max_length' in rules:
+        # A category column is checked once per category.
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        text = as_text(pd.Series(values.cat.categories) if categorical else values)
+        checks = {}
+        if 'pattern' in rules:
+            checks[f'{column}: bad format'] = (~text.str.fullmatch(rules['pattern'])).fillna(False).to_numpy(dtype=bool)
+        if 'max_length' in rules:
+            checks[f'{column}: longer than {rules["max_length"]}'] = (
+                text.str.len() > rules['max_length']).fillna(False).to_numpy(dtype=bool)
+        if categorical:
+            codes = values.cat.codes.to_numpy()
+            checks = {reason: np.append(mask, False)[codes] for reason, mask in checks.items()}
+        failures.update(checks)
+    if rules.get('unique'):
+        failures[f'{column}: duplicate'] = values.duplicated().to_numpy() & ~missing
+    return {reason: mask for reason, mask in failures.items() if mask.any()}
+
+
+def validate_books(books_df, in_stock_df, genre_ids, seen_upcs=None):
+    """
+    Checks the normalized books and in_stock rows against RULES and splits off the rows that fail.
+
+    Every rule is one vectorized mask over the whole column; reasons are
+    only assembled for the rows that fail. A book fails together with its
+    stock row (the two frames are row-aligned, as split_tables() returns
+    them), so the good rows still satisfy the foreign keys and load in
+    bulk.
+
+    Args:
+        books_df (pd.DataFrame): Books table.
+        in_stock_df (pd.DataFrame): Stock table, row-aligned with books_df.
+        genre_ids (Iterable): Every genre_id the genres table holds.
+        seen_upcs (set): UPCs of earlier batches, which count as duplicates; updated in place.
+
+    Returns:
+        tuple: The good books_df and in_stock_df, and a quarantine DataFrame
+            (upc, titles, reasons, record) with the failing rows.
+    """
+    references = {'genres': np.fromiter(genre_ids, dtype='int64')}
+    failures = {}
+    for df in (books_df, in_stock_df):
+        for column in df.columns:
+            if column in RULES and not (df is in_stock_df and column == 'upc'):
+                failures.update(check_column(df[column], RULES[column], references))
+    if seen_upcs is not None:
+        repeated = books_df['upc'].isin(seen_upcs).to_numpy()
+        if repeated.any():
+            failures['upc: duplicate'] = failures.get('upc: duplicate', False) | repeated
+
+    bad = np.logical_or.reduce(list(failures.values())) if failures else np.zeros(len(books_df), dtype=bool)
+    if seen_upcs is not None:
+        seen_upcs.update(books_df['upc'][~bad])
+    if not bad.any():
+        return books_df, in_stock_df, pd.DataFrame(columns=QUARANTINE_COLUMNS)
+
+    reasons = pd.Series('', index=np.flatnonzero(bad), dtype=object)
+    for reason, mask in failures.items():
+        failing = mask[bad]
+        reasons[failing] = reasons[failing] + '; ' + reason
+    rejected = books_df[bad].assign(in_stock=in_stock_df['in_stock'].to_numpy()[bad])
+    quarantine_df = pd.DataFrame({
+        'upc': rejected['upc'].astype(str).to_numpy(),
+        'titles': rejected['titles'].astype(str).to_numpy(),
+        'reasons': reasons.str.removeprefix('; ').to_numpy(),
+        'record': rejected.astype(str).to_json(orient='records', lines=True).splitlines()})
+    return books_df[~bad], in_stock_df[~bad], quarantine_df
+
+
+def report_quarantine(quarantine_df, total):
+    """Logs how many rows were quarantined and the most common reasons."""
+    if quarantine_df.empty:
+        logger.info(f'Validation: all {total} rows passed')
+        return
+    logger.warning(f'Validation: {len(quarantine_df)} of {total} rows quarantined')
+    reasons = quarantine_df['reasons'].str.split('; ').explode().value_counts()
+    for reason, count in reasons.head(10).items():
+        logger.warning(f"Validation: {count} rows failed '{reason}'")
+
+
+def validate(books_df, genre_df, in_stock_df):
+    """
+    Validates the normalized tables before they are loaded.
+
+    This function:
+    - Checks every column of books and in_stock against RULES (types, ranges,
+      formats, lengths, UPC uniqueness and genre_id foreign keys)
+    - Removes the failing books and their stock rows
+    - Saves them with their reasons to the 'quarantine' artifact
+      (CSV, Parquet or Arrow, see etl/artifacts.py)
+
+    Without it, one bad value fails the COPY in load() and with it the whole load.
+
+    Args:
+        books_df (pd.DataFrame): Books table.
+        genre_df (pd.DataFrame): Genre lookup table.
+        in_stock_df (pd.DataFrame): Stock table, row-aligned with books_df.
+
+    Returns:
+        tuple: The good books_df and in_stock_df, and the quarantine DataFrame.
+    """
+    good_books_df, good_in_stock_df, quarantine_df = validate_books(books_df, in_stock_df, genre_df['id'])
+    report_quarantine(quarantine_df, len(books_df))
+    try:
+        write_artifact(quarantine_df, QUARANTINE)
+    except Exception as e:
+        logger.error(f"Error saving quarantined rows: {e}")
+    return good_books_df, good_in_stock_df, quarantine_df
@@ -10,11 +10,18 @@
 # Website:            https://books.toscrape.com/
 # -----------------------------------------------------------------------------
 
-from etl.extract import extract
+from etl.artifacts import BOOKS, CLEANED_DATA, GENRES, IN_STOCK, RAW_DATA, TRANSFORM_ISSUES, read_artifact
+from etl.checkpoint import CHECKPOINTS, REUSE_EXTRACT, Manifest, run_stage
+from etl.extract import BASE_URL, extract
 from etl.transform import transform
 from etl.normalize import normalize
-from etl.load import load
+from etl.dictionary import dictionary_path
+from etl.validate import validate
+from etl.db import close_pools, connection
+from etl.load import load, load_quarantine
 from etl.logger import get_logger
+from etl.metrics import METRICS
+from etl.streaming import STREAMING, run_streaming
 
 logger = get_logger(__name__)
 
@@ -26,27 +33,78 @@ def main():
     1. Extraction
     2. Cleaning and transformation
     3. Normalization
-    4. Loading to database
+    4. Validation (failing rows go to the quarantine artifact and table)
+    5. Loading to database
+    With ETL_STREAMING=1 the steps run at the same time, one catalogue page at a time (see etl/streaming.py).
+
+    Transform and normalize are skipped when the checkpoint manifest (see
+    etl/checkpoint.py) shows their code and input artifacts unchanged since
+    they last ran; their artifacts are read instead. Extraction is reused the
+    same way only with ETL_REUSE_EXTRACT=1, since the website itself may have
+    changed. Load always runs.
+
+    Every run writes its stage timings, HTTP and COPY metrics to
+    logs/metrics/<run id>.json and .prom (see etl/metrics.py).
     Usage:
     python3 main.py
     """
     try:
         logger.info('Starting the ETL pipeline...')
+        if STREAMING:
+            logger.info('Streaming batches through extract, transform, normalize and load...')
+            with METRICS.stage('streaming') as stats:
+                books = stats['rows'] = run_streaming()
+            logger.info(f'All data successfully loaded into the database ({books} books).')
+            return
+
+        manifest = Manifest()
+
         logger.info('Extracting data from source...')
-        raw_data = extract()  
+        with METRICS.stage('extract') as stats:
+            raw_data = run_stage(manifest, 'extract', extract,
+                                 lambda: read_artifact(RAW_DATA, csv_options={'dtype': str, 'keep_default_na': False}),
+                                 outputs=[RAW_DATA], settings={'base_url': BASE_URL}, enabled=REUSE_EXTRACT)
+            stats['rows'] = len(raw_data)
         logger.info('Data extracted successfully.')    
 
         logger.info('Cleaning and transforming the data...')
-        transforming_data = transform(raw_data)  
+        with METRICS.stage('transform') as stats:
+            transforming_data = run_stage(manifest, 'transform', lambda: transform(raw_data),
+                                          lambda: read_artifact(CLEANED_DATA, csv_options={'index_col': 0}),
+                                          inputs=[RAW_DATA], outputs=[CLEANED_DATA, TRANSFORM_ISSUES],
+                                          enabled=CHECKPOINTS)
+            stats['rows'] = len(transforming_data)
         logger.info('Splitting data into normalized tables: books, genres, in_stock') 
-        books_df, genre_df, in_stock_df = normalize(transforming_data)
+        with METRICS.stage('normalize') as stats:
+            books_df, genre_df, in_stock_df = run_stage(
+                manifest, 'normalize', lambda: normalize(transforming_data),
+                lambda: tuple(read_artifact(artifact) for artifact in (BOOKS, GENRES, IN_STOCK)),
+                inputs=[CLEANED_DATA], outputs=[BOOKS, GENRES, IN_STOCK], state=[dictionary_path('genre')],
+                enabled=CHECKPOINTS)
+            stats['rows'] = len(books_df)
         logger.info('Data cleaned and transformed successfully.') 
 
+        logger.info('Validating the normalized tables...')
+        with METRICS.stage('validate') as stats:
+            books_df, in_stock_df, quarantine_df = validate(books_df, genre_df, in_stock_df)
+            stats['rows'] = len(books_df)
+            stats['quarantined'] = len(quarantine_df)
+
         logger.info('Loading data into Postgres database...')
-        load()
+        with METRICS.stage('load') as stats:
+            load(books_df, genre_df, in_stock_df)
+            with connection() as conn:
+                load_quarantine(conn, quarantine_df)
+            stats['rows'] = len(books_df) + len(genre_df) + len(in_stock_df)
         logger.info('All data successfully loaded into the database.')
     except Exception as e:
         logger.error(f"ETL pipeline failed: {e}")  
+    finally:
+        close_pools()
+        try:
+            logger.info(f'Run metrics written to {METRICS.write()}')
+        except OSError as e:
+            logger.error(f"Error writing run metrics: {e}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_dir(tmp_path_factory):
+    """
+    Writes the pipeline log (etl.logger.LOG_DIR) to a temporary directory, not to the tracked logs/.
+
+    It is not pointed back afterwards: what is still queued at exit goes
+    to the same place.
+    """
+    import etl.logger
+
+    etl.logger.LOG_DIR = str(tmp_path_factory.mktemp("logs"))
+    etl.logger.flush_logs()
+    return etl.logger.LOG_DIR
+
+
+@pytest.fixture(scope="session")
+def scratch_database():
+    """A database of its own for the tests that write, created empty and dropped after the session."""
+    from etl.db import DATABASE, drop_database
+
+    name = f"{DATABASE}_test"
+    drop_database(name)
+    yield name
+    drop_database(name)
+
+
+@pytest.fixture
+def database(scratch_database, tmp_path, monkeypatch):
+    """
+    Points the pipeline (etl.db.DATABASE) at the scratch database, with its tables created.
+
+    The dedup index, which describes what the last load left in the
+    database, moves to tmp_path with it.
+    """
+    import etl.db
+    import etl.dedup
+    from etl.load import prepare_database
+
+    monkeypatch.setattr(etl.db, "DATABASE", scratch_database)
+    monkeypatch.setattr(etl.dedup, "DEDUP_INDEX", str(tmp_path / "dedup_index.npz"))
+    prepare_database(truncate=False)
+    return scratch_database
@@ -1,3 +1,4 @@
+import json
 import os
 import pandas as pd
 import pytest
@@ -6,52 +7,909 @@ import psycopg
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+def fast_limiter():
+    from etl.fetch import AdaptiveRateLimiter
+    return AdaptiveRateLimiter(rate=500, max_rate=500)
+
+
 
 
 def test_extract():
-    extract_csv_path = os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv")
-    assert os.path.isfile(extract_csv_path), "Extract CSV file does not exist"
+    from etl.artifacts import RAW_DATA, artifact_path, read_artifact
+
+    assert os.path.isfile(os.path.join(PROJECT_ROOT, artifact_path(RAW_DATA))), "Extract artifact does not exist"
 
-    df = pd.read_csv(extract_csv_path)
-    assert not df.empty, "Extract CSV file is empty"
+    df = read_artifact(os.path.join(PROJECT_ROOT, RAW_DATA))
+    assert not df.empty, "Extract artifact is empty"
 
 
 def test_transform():
-    transform_csv_path = os.path.join(PROJECT_ROOT, "data/2_transform_data/books_cleaned_data.csv")
-    assert os.path.isfile(transform_csv_path), "Transform CSV file does not exist"
+    from etl.artifacts import CLEANED_DATA, artifact_path, read_artifact
 
-    df = pd.read_csv(transform_csv_path)
-    assert not df.empty, "Transform CSV file is empty"
+    assert os.path.isfile(os.path.join(PROJECT_ROOT, artifact_path(CLEANED_DATA))), "Transform artifact does not exist"
+
+    df = read_artifact(os.path.join(PROJECT_ROOT, CLEANED_DATA))
+    assert not df.empty, "Transform artifact is empty"
 
 
 def test_normalize():
-    books_csv_path = os.path.join(PROJECT_ROOT, "data/3_normalized_data/books.csv")
-    genres_csv_path = os.path.join(PROJECT_ROOT, "data/3_normalized_data/genres.csv")
-    in_stock_csv_path = os.path.join(PROJECT_ROOT, "data/3_normalized_data/in_stock.csv")
+    from etl.artifacts import BOOKS, GENRES, IN_STOCK, artifact_path, read_artifact
 
-    assert os.path.isfile(books_csv_path), "books.csv does not exist"
-    assert os.path.isfile(genres_csv_path), "genres.csv does not exist"
-    assert os.path.isfile(in_stock_csv_path), "in_stock.csv does not exist"
+    for artifact in (BOOKS, GENRES, IN_STOCK):
+        path = os.path.join(PROJECT_ROOT, artifact_path(artifact))
+        assert os.path.isfile(path), f"{os.path.basename(path)} does not exist"
 
-    books_df = pd.read_csv(books_csv_path)
-    genres_df = pd.read_csv(genres_csv_path)
-    in_stock_df = pd.read_csv(in_stock_csv_path)
+    books_df = read_artifact(os.path.join(PROJECT_ROOT, BOOKS))
+    genres_df = read_artifact(os.path.join(PROJECT_ROOT, GENRES))
+    in_stock_df = read_artifact(os.path.join(PROJECT_ROOT, IN_STOCK))
 
-    assert not books_df.empty, "books.csv is empty"
-    assert not genres_df.empty, "genres.csv is empty"
-    assert not in_stock_df.empty, "in_stock.csv is empty"
+    assert not books_df.empty, "books artifact is empty"
+    assert not genres_df.empty, "genres artifact is empty"
+    assert not in_stock_df.empty, "in_stock artifact is empty"
 
 
 def test_load():
-    user = os.getenv("POSTGRES_USER", "postgres")
-    password = os.getenv("POSTGRES_PASSWORD", "postgres")
-    host = os.getenv("POSTGRES_HOST", "localhost")
-    port = os.getenv("POSTGRES_PORT", "5432")
-
+    from etl.db import connection
 
-    with psycopg.connect(dbname="books_website", user=user, password=password, host=host, port=port ) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT COUNT(*) FROM books;")
 
             count = cur.fetchone()[0]
             assert count > 0, "Table 'books' is empty"
+
+
+def test_transform_reports_out_of_range_values():
+    from etl.artifacts import RAW_DATA, read_artifact
+    from etl.transform import transform_books
+
+    raw_df = read_artifact(os.path.join(PROJECT_ROOT, RAW_DATA), csv_options={"dtype": str, "keep_default_na": False})
+    raw_df = raw_df.iloc[:5].copy()
+    raw_df.loc[raw_df.index[0], "price_incl_tax_gbp"] = "Â£123456.78"
+    raw_df.loc[raw_df.index[1], "num_reviews"] = "99999999999"
+    raw_df.loc[raw_df.index[2], "in_stock"] = "In stock (99999999999 available)"
+
+    books_clean_df, issues_df = transform_books(raw_df)
+    assert len(books_clean_df) == 5, "An out-of-range value dropped rows"
+    assert issues_df[["row", "column"]].values.tolist() == [
+        [raw_df.index[0], "price_incl_tax_gbp"], [raw_df.index[2], "in_stock"], [raw_df.index[1], "num_reviews"]]
+    assert books_clean_df["num_reviews"].isna().sum() == 1 and books_clean_df["price_excl_tax_gbp"].notna().all()
+
+
+def test_async_crawler_matches_serial(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.extract import extract, extract_serial
+
+    monkeypatch.chdir(tmp_path)
+    with StandInSite(load_books(45)) as site:
+        serial_df = extract_serial(site.base_url, fast_limiter(), cache=False)
+        async_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+        staged_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False, parse_workers=2)
+
+    assert len(async_df) == 45, "Async crawler missed books"
+    assert async_df.equals(serial_df), "Async crawler output differs from the serial crawler"
+    assert staged_df.equals(serial_df), "Process pool parsing output differs from the serial crawler"
+
+
+def test_fetcher_retries_server_errors(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.extract import extract
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('etl.fetch.BACKOFF_BASE', 0.001)
+    limiter = fast_limiter()
+    with StandInSite(load_books(40), error_rate=0.2) as site:
+        books_raw_df = extract(site.base_url, concurrency=8, limiter=limiter, cache=False)
+
+    assert site.errors_served > 0
+    assert len(books_raw_df) == 40, "Books were lost to retryable errors"
+    assert limiter.throttle_events > 0, "Rate limiter did not back off on 503s"
+
+
+def test_response_cache_revalidates(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.cache import ResponseCache
+    from etl.extract import extract
+
+    monkeypatch.chdir(tmp_path)
+    with StandInSite(load_books(30)) as site:
+        cold_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=ResponseCache("cache", ttl=3600))
+        served = site.requests_served
+        warm_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=ResponseCache("cache", ttl=3600))
+        assert site.requests_served == served, "Fresh cache entries were fetched again"
+
+        cache = ResponseCache("cache", ttl=0)
+        revalidated_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=cache)
+
+    assert site.not_modified_served == 32, "Stale entries were not revalidated with conditional GETs"
+    assert cache.stats.revalidated == 32 and cache.stats.misses == 0
+    assert warm_df.equals(cold_df) and revalidated_df.equals(cold_df)
+
+def test_incremental_extract_fetches_only_changed_books(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.extract import extract
+
+    monkeypatch.chdir(tmp_path)
+    books = load_books(40)
+    with StandInSite(books) as site:
+        extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False, incremental=True)
+    port = site.server.server_address[1]
+
+    books[5]["price_incl_tax_gbp"] = "£1.99"
+    books[5]["price_excl_tax_gbp"] = "£1.99"
+    with StandInSite(books, port=port) as site:
+        incremental_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False, incremental=True)
+        assert site.requests_served == 2 + 1, "Unchanged books were fetched again"
+        full_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False, incremental=False)
+
+    assert incremental_df.equals(full_df), "Incremental extract differs from a full extract"
+    assert incremental_df.loc[5, "price_incl_tax_gbp"] == "Â£1.99"
+
+def test_parser_backends_agree():
+    from etl.fetch import decode_html
+    from etl.parsers import BACKENDS, get_parser
+
+    fixtures = os.path.join(PROJECT_ROOT, "tests/fixtures")
+    with open(os.path.join(fixtures, "book_page.html"), "rb") as f:
+        book_html = decode_html(f.read())
+    with open(os.path.join(fixtures, "catalogue_page.html"), "rb") as f:
+        catalogue_html = decode_html(f.read())
+
+    records = [get_parser(name).book_page(book_html) for name in BACKENDS]
+    assert records[0]["upc"] == "a897fe39b1053632"
+    assert all(record == records[0] for record in records), "Parser backends disagree on the book page"
+
+    links = [get_parser(name).catalogue_links(catalogue_html, "") for name in BACKENDS]
+    assert len(links[0]) == 20
+    assert all(link == links[0] for link in links), "Parser backends disagree on the catalogue page"
+
+def test_streaming_pipeline_matches_batch(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.artifacts import BOOKS, CLEANED_DATA, GENRES, IN_STOCK, RAW_DATA, read_artifact
+    from etl.extract import extract, extract_batches
+    from etl.normalize import normalize
+    from etl.streaming import run_streaming
+    from etl.transform import transform
+
+    def artifacts():
+        tables = {name: read_artifact(artifact) for name, artifact in (("books", BOOKS), ("genres", GENRES),
+                                                                       ("in_stock", IN_STOCK))}
+        genres = dict(zip(tables["genres"]["id"], tables["genres"]["genre"]))
+        tables["books"]["genre_id"] = tables["books"]["genre_id"].map(genres)
+        return (read_artifact(RAW_DATA), read_artifact(CLEANED_DATA, csv_options={"index_col": 0}),
+                tables["books"], tables["in_stock"], sorted(genres.values()))
+
+    monkeypatch.chdir(tmp_path)
+    books = load_books(45)
+    books.insert(41, dict(books[3]))
+    with StandInSite(books) as site:
+        normalize(transform(extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)))
+        batch = artifacts()
+        processed = run_streaming(extract_batches(site.base_url, concurrency=8, limiter=fast_limiter(),
+                                                  cache=False, window=1), load=False)
+        streaming = artifacts()
+
+    assert processed == 45, "Duplicate book across batches was not dropped"
+    assert streaming[0].equals(batch[0]), "Streaming raw data differs from the batch pipeline"
+    assert streaming[1].equals(batch[1]), "Streaming cleaned data differs from the batch pipeline"
+    assert streaming[2].equals(batch[2]) and streaming[3].equals(batch[3])
+    assert streaming[4] == batch[4]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_typed_artifacts_round_trip(tmp_path, monkeypatch, fmt):
+    from etl.artifacts import CLEANED_DATA, ArtifactWriter, read_artifact
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("etl.artifacts.ARTIFACT_FORMAT", fmt)
+    books_clean_df = transform(raw_df)
+    normalize(books_clean_df.copy())
+
+    cleaned_df = read_artifact(CLEANED_DATA)
+    assert cleaned_df.equals(books_clean_df), "Typed artifact lost values, dtypes or the index"
+    assert str(cleaned_df["tax"].dtype).startswith("decimal128")
+
+    with ArtifactWriter("data/batched") as writer:
+        for start in range(0, len(books_clean_df), 300):
+            writer.write(books_clean_df.iloc[start:start + 300])
+    batched_df = read_artifact("data/batched")
+    assert batched_df.astype({"genre": str}).equals(books_clean_df.astype({"genre": str}))
+
+    monkeypatch.setattr("etl.artifacts.SCHEMA_VERSION", "0")
+    with pytest.raises(ValueError, match="schema version"):
+        read_artifact(CLEANED_DATA)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_load_reads_multi_batch_artifacts(tmp_path, monkeypatch, fmt, database):
+    import pyarrow as pa
+
+    from etl.artifacts import BOOKS, GENRES, IN_STOCK, ArtifactWriter, read_artifact
+    from etl.db import connection
+    from etl.load import load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("etl.artifacts.ARTIFACT_FORMAT", fmt)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+    # Written in batches, the columns read back in several chunks, as after a streaming run.
+    for artifact, df in ((BOOKS, books_df), (GENRES, genre_df), (IN_STOCK, in_stock_df)):
+        with ArtifactWriter(artifact) as writer:
+            for start in range(0, len(df), 300):
+                writer.write(df.iloc[start:start + 300])
+    assert pa.array(read_artifact(BOOKS)["tax"]).num_chunks > 1
+
+    load(mode="replace")
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*), SUM(price_incl_tax_gbp) FROM books").fetchone() == (
+            len(books_df), books_df["price_incl_tax_gbp"].sum())
+
+
+def test_binary_copy_matches_csv(tmp_path, monkeypatch):
+    from etl.db import connection_params
+    from etl.load import TABLE_COLUMNS, copy_frame
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+    books_df.loc[len(books_df)] = [None] * len(books_df.columns)
+    books_df.loc[len(books_df) - 1, ["upc", "price_excl_tax_gbp"]] = ["negative", -12.5]
+
+    with psycopg.connect(dbname="books_website", **connection_params()) as conn:
+        with conn.cursor() as cur:
+            for table, df in (("books", books_df), ("genres", genre_df), ("in_stock", in_stock_df)):
+                # A temporary table of the same name shadows the real one for this connection.
+                cur.execute(f"CREATE TEMP TABLE {table} (LIKE public.{table})")
+                order = ", ".join(TABLE_COLUMNS[table])
+                copy_frame(cur, table, df)
+                binary_rows = cur.execute(f"SELECT * FROM {table} ORDER BY {order}").fetchall()
+                cur.execute(f"TRUNCATE {table}")
+                with cur.copy(f"COPY {table} ({order}) FROM STDIN CSV") as copy:
+                    copy.write(df.to_csv(index=False, header=False))
+                csv_rows = cur.execute(f"SELECT * FROM {table} ORDER BY {order}").fetchall()
+                assert binary_rows == csv_rows, f"Binary COPY of '{table}' differs from CSV COPY"
+                assert len(binary_rows) == len(df)
+
+
+def test_merge_load_writes_only_changes(tmp_path, monkeypatch):
+    from etl.db import connection_params
+    from etl.load import merge_load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+
+    with psycopg.connect(dbname="books_website", **connection_params()) as conn:
+        for table in ("books", "genres", "in_stock"):
+            # A temporary table of the same name shadows the real one for this connection.
+            conn.execute(f"CREATE TEMP TABLE {table} (LIKE public.{table} INCLUDING ALL)")
+
+        counts = merge_load(conn, books_df, genre_df, in_stock_df)
+        assert counts["books"] == {"inserted": len(books_df), "updated": 0, "unchanged": 0, "deleted": 0}
+
+        changed_df = books_df.iloc[1:].copy()
+        changed_df.loc[changed_df.index[0], "num_reviews"] = 99
+        counts = merge_load(conn, changed_df, genre_df, in_stock_df.iloc[1:])
+        assert counts["books"] == {"inserted": 0, "updated": 1, "unchanged": len(books_df) - 2, "deleted": 1}
+        assert counts["in_stock"]["deleted"] == 1 and counts["in_stock"]["updated"] == 0
+        assert counts["genres"]["unchanged"] == len(genre_df)
+
+        reviews = conn.execute("SELECT SUM(num_reviews), COUNT(*) FROM books").fetchone()
+        assert reviews == (changed_df["num_reviews"].sum(), len(changed_df))
+
+
+def test_parallel_load_restores_constraints(tmp_path, monkeypatch, database):
+    from etl.analytics import suspend_analytics
+    from etl.db import connection, pool_capacity
+    from etl.load import drop_constraints, load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    def schema(conn):
+        constraints = conn.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                                   "WHERE conrelid IN ('books'::regclass, 'genres'::regclass, 'in_stock'::regclass) "
+                                   "ORDER BY conname").fetchall()
+        indexes = conn.execute("SELECT indexdef FROM pg_indexes WHERE tablename IN ('books', 'genres', 'in_stock') "
+                               "ORDER BY indexname").fetchall()
+        return constraints, indexes
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+
+    with connection() as conn:
+        before = schema(conn)
+
+    bad_df = books_df.copy()
+    bad_df.loc[bad_df.index[-1], "upc"] = "x" * 30
+    with pytest.raises(psycopg.errors.StringDataRightTruncation):
+        load(bad_df, genre_df, in_stock_df, mode="replace", workers=3)
+    with connection() as conn:
+        assert schema(conn) == before, "Constraints were not restored after a failed load"
+        assert conn.execute("SELECT COUNT(*) FROM in_stock").fetchone()[0] == 0
+
+    load(books_df, genre_df, in_stock_df, mode="replace", workers=3)
+    with connection() as conn:
+        assert schema(conn) == before, "Constraints were not restored after a parallel load"
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == len(books_df)
+
+    with pytest.raises(ValueError, match="POSTGRES_POOL_MAX_SIZE"):
+        load(books_df, genre_df, in_stock_df, mode="replace", workers=pool_capacity())
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == len(books_df), \
+            "A load the pool cannot serve emptied the tables"
+
+    # A load that died after dropping the constraints: the next run repairs the tables.
+    with connection() as conn:
+        with conn.cursor() as cur:
+            drop_constraints(cur)
+            suspend_analytics(cur)
+        conn.commit()
+        conn.execute("INSERT INTO books (upc) VALUES ('orphan')")
+    counts = load(books_df, genre_df, in_stock_df, mode="merge")
+    assert counts["books"]["inserted"] == len(books_df)
+    with connection() as conn:
+        assert schema(conn) == before, "Constraints of an interrupted load were not restored"
+        assert conn.execute("SELECT SUM(books) FROM genre_stats").fetchone()[0] == len(books_df)
+
+
+def test_connection_pool_reuses_connections():
+    from etl.db import connection, get_pool, pool_metrics
+
+    pids = set()
+    with connection() as conn:
+        pids.add(conn.info.backend_pid)
+    opened = get_pool().get_stats().get("connections_num", 0)
+    for _ in range(5):
+        with connection() as conn:
+            pids.add(conn.info.backend_pid)
+            assert conn.execute("SELECT 1").fetchone() == (1,)
+
+    assert get_pool().get_stats().get("connections_num", 0) == opened, "Checkouts opened new connections"
+    assert len(pids) <= get_pool().max_size
+    assert pool_metrics()["books_website"]["requests_num"] >= 6
+
+def test_extract_resumes_after_crash(tmp_path, monkeypatch):
+    import etl.extract
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.extract import extract
+
+    monkeypatch.chdir(tmp_path)
+    with StandInSite(load_books(40)) as site:
+        full_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+    port = site.server.server_address[1]
+
+    def crash(records):
+        raise RuntimeError("crash")
+
+    with StandInSite(load_books(40), port=port) as site, monkeypatch.context() as patch:
+        patch.setattr(etl.extract, "save_raw_data", crash)
+        with pytest.raises(RuntimeError):
+            extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+    journal = tmp_path / "data/1_extract_raw_data/extract_journal.jsonl"
+    header, *lines = journal.read_text().splitlines()
+    assert json.loads(header) == {"base_url": site.base_url}
+    # Five of the fetched pages are older than EXTRACT_REFRESH_DAYS.
+    for i in range(5):
+        lines[i] = json.dumps({**json.loads(lines[i]), "fetched_at": "0.0"})
+    crashed = "\n".join([header, *lines[:25]]) + "\n" + lines[25][:30]
+    journal.write_text(crashed)
+
+    with StandInSite(load_books(40), port=port) as site:
+        resumed_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+        assert site.requests_served == 2 + 15 + 5, "Detail pages of the crashed run were fetched again"
+
+    assert resumed_df.equals(full_df), "Resumed extract differs from a full extract"
+    assert not journal.exists()
+
+    # The journal of a crawl of another catalogue is not resumed.
+    journal.write_text(crashed.replace(json.dumps(site.base_url), json.dumps("http://elsewhere/"), 1))
+    with StandInSite(load_books(40), port=port) as site:
+        extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+        assert site.requests_served == 2 + 40
+
+def test_checkpoints_skip_unchanged_stages(tmp_path, monkeypatch):
+    from etl.artifacts import (BOOKS, CLEANED_DATA, GENRES, IN_STOCK, RAW_DATA, artifact_path, read_artifact,
+                               write_artifact)
+    from etl.checkpoint import Manifest, run_stage
+    from etl.dictionary import dictionary_path
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"),
+                         dtype=str, keep_default_na=False)
+    monkeypatch.chdir(tmp_path)
+    write_artifact(raw_df, RAW_DATA)
+    ran = []
+
+    def pipeline():
+        manifest = Manifest("data/manifest.json")
+        cleaned = run_stage(manifest, "transform",
+                            lambda: ran.append("transform") or transform(read_artifact(RAW_DATA)),
+                            lambda: read_artifact(CLEANED_DATA, csv_options={"index_col": 0}),
+                            inputs=[RAW_DATA], outputs=[CLEANED_DATA])
+        run_stage(manifest, "normalize", lambda: ran.append("normalize") or normalize(cleaned),
+                  lambda: None, inputs=[CLEANED_DATA], outputs=[BOOKS, GENRES, IN_STOCK],
+                  state=[dictionary_path("genre")])
+
+    pipeline()
+    pipeline()
+    assert ran == ["transform", "normalize"], "Unchanged stages ran again"
+
+    raw_df.loc[0, "num_reviews"] = "7"
+    write_artifact(raw_df, RAW_DATA)
+    pipeline()
+    assert ran[2:] == ["transform", "normalize"], "Changed input did not rerun the stages"
+
+    os.remove(artifact_path(BOOKS))
+    pipeline()
+    assert ran[4:] == ["normalize"], "Missing output did not rerun only its stage"
+
+    os.remove(dictionary_path("genre"))
+    pipeline()
+    pipeline()
+    assert ran[5:] == ["normalize"], "A reset genre dictionary did not rerun normalize once"
+
+def test_run_metrics_export(tmp_path, monkeypatch):
+    import json
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.db import connection
+    from etl.extract import extract
+    from etl.load import copy_frame
+    from etl.metrics import METRICS
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    monkeypatch.chdir(tmp_path)
+    METRICS.reset()
+    with StandInSite(load_books(30)) as site:
+        with METRICS.stage("extract") as stats:
+            raw_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+            stats["rows"] = len(raw_df)
+    books_df, _, _ = normalize(transform(raw_df))
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE books (LIKE public.books)")
+        copy_frame(cur, "books", books_df)
+        conn.rollback()
+    metrics = json.loads(open(METRICS.write("metrics")).read())
+
+    assert metrics["stages"]["extract"]["rows"] == 30
+    assert metrics["stages"]["extract"]["rows_per_second"] > 0 and metrics["peak_rss_bytes"] > 0
+    latency = next(h for h in metrics["histograms"] if h["name"] == "http_request_seconds")
+    assert latency["count"] == site.requests_served == latency["buckets"][-1][1]
+    downloaded = next(c for c in metrics["counters"] if c["name"] == "http_bytes_downloaded_total")
+    assert downloaded["value"] > 30 * 1000
+    assert metrics["copy"]["books"]["rows"] == 30 and metrics["copy"]["books"]["bytes_per_second"] > 0
+
+    prometheus = (tmp_path / "metrics" / f"{metrics['run_id']}.prom").read_text()
+    assert 'etl_stage_wall_seconds{stage="extract"}' in prometheus
+    assert f'etl_http_request_seconds_bucket{{le="+Inf"}} {site.requests_served}' in prometheus
+
+def test_synthetic_catalogue_crawls_cleanly(tmp_path, monkeypatch):
+    from benchmarks.stand_in_site import StandInSite, SyntheticCatalogue
+    from etl.artifacts import TRANSFORM_ISSUES, read_artifact
+    from etl.extract import extract
+    from etl.transform import transform
+
+    monkeypatch.chdir(tmp_path)
+    catalogue = SyntheticCatalogue(45, seed=7)
+    assert list(catalogue) == list(SyntheticCatalogue(45, seed=7)), "Synthetic catalogue is not reproducible"
+    with StandInSite(catalogue) as site:
+        raw_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+        assert site.requests_served == 45 + 3, "Unexpected number of pages crawled"
+    books_clean_df = transform(raw_df)
+
+    assert sorted(raw_df["upc"]) == sorted(book["upc"] for book in catalogue)
+    assert len(books_clean_df) == 45 and read_artifact(TRANSFORM_ISSUES).empty
+
+def test_frontier_workers_share_the_crawl(tmp_path, monkeypatch, database):
+    import threading
+    import etl.frontier
+    from benchmarks.stand_in_site import StandInSite, load_books
+    from etl.db import connection
+    from etl.extract import extract, save_raw_data
+    from etl.frontier import claim, collect, prepare_frontier, run_worker, start_crawl
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(etl.frontier, "POLL_SECONDS", 0.05)
+    prepare_frontier()
+    with connection() as conn:
+        conn.execute("DELETE FROM crawl_runs WHERE crawl_id = 'test'")
+
+    completed = []
+
+    def worker(name):
+        completed.append(run_worker("test", concurrency=4, limiter=fast_limiter(), cache=False, worker=name,
+                                    batch_size=8))
+
+    with StandInSite(load_books(65)) as site:
+        expected_df = extract(site.base_url, concurrency=8, limiter=fast_limiter(), cache=False)
+        pages = site.requests_served
+        start_crawl("test", site.base_url)
+        # A worker that dies right after leasing the first catalogue page.
+        assert claim("test", "crashed", lease_seconds=0.3) == [(f"{site.base_url}page-1.html", "catalogue", 1)]
+        threads = [threading.Thread(target=worker, args=(f"worker-{n}",)) for n in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        frontier_df = save_raw_data(collect("test"))
+        assert site.requests_served - pages == pages, "A URL was fetched twice"
+
+    assert frontier_df.equals(expected_df), "Frontier crawl differs from a single-process crawl"
+    assert sum(completed) == pages and min(completed) > 0, "Work was not shared between the workers"
+
+
+def test_genre_ids_stay_stable(tmp_path, monkeypatch):
+    from etl.artifacts import CLEANED_DATA, read_artifact
+    from etl.normalize import normalize
+
+    monkeypatch.chdir(tmp_path)
+    books_clean_df = read_artifact(os.path.join(PROJECT_ROOT, CLEANED_DATA), csv_options={"index_col": 0})
+    books_df, genre_df, _ = normalize(books_clean_df.copy())
+    expected = books_clean_df["genre"].map(dict(zip(genre_df["genre"], genre_df["id"])))
+    assert books_df["genre_id"].tolist() == expected.tolist(), "Encoded IDs do not match the genre table"
+
+    books_clean_df.loc[books_clean_df.index[0], "genre"] = "Aaa New Genre"
+    books_df, new_genre_df, _ = normalize(books_clean_df.copy())
+    assert new_genre_df.iloc[:-1].equals(genre_df), "Existing genre IDs changed"
+    assert new_genre_df.iloc[-1].tolist() == [len(genre_df) + 1, "Aaa New Genre"]
+    assert books_df["genre_id"].iloc[1:].tolist() == expected.iloc[1:].tolist(), "Other books changed genre_id"
+
+
+def test_json_logs_carry_context_and_drop_repeats(tmp_path, monkeypatch):
+    import json
+    import threading
+    import etl.logger
+    from etl.logger import LOG_QUEUE, flush_logs, get_logger, with_log_context
+    from etl.metrics import METRICS
+
+    barrier = threading.Barrier(2)
+
+    def concurrent_stage(name):
+        with METRICS.stage(name):
+            barrier.wait()
+            logger.info(f"in {name}")
+            worker = threading.Thread(target=with_log_context(lambda: logger.info(f"worker of {name}")))
+            worker.start()
+            worker.join()
+            barrier.wait()
+
+    monkeypatch.setattr(etl.logger, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(etl.logger, "LOG_FORMAT", "json")
+    monkeypatch.setattr(LOG_QUEUE.repeats, "limit", 5)
+    flush_logs()
+    logger = get_logger("etl.test")
+    try:
+        METRICS.reset()
+        with METRICS.stage("extract"):
+            for num in range(12):
+                logger.error(f"Error processing book {num}", extra={"url": f"http://books/{num}.html"})
+        logger.info("done")
+        threads = [threading.Thread(target=concurrent_stage, args=(name,)) for name in ("transform", "load")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        monkeypatch.undo()
+        flush_logs()
+
+    entries = [json.loads(line) for line in (tmp_path / "pipeline_logs.jsonl").read_text().splitlines()]
+    errors = [entry for entry in entries if entry["message"].startswith("Error processing book")]
+    assert len(errors) == 5, "Repeated errors were not rate-limited"
+    assert errors[0]["run_id"] == METRICS.run_id and errors[0]["stage"] == "extract"
+    assert errors[0]["url"] == "http://books/0.html"
+    assert entries[-1]["message"] == "7 similar messages suppressed"
+    assert "stage" not in next(entry for entry in entries if entry["message"] == "done")
+    stages = {entry["message"]: entry.get("stage") for entry in entries}
+    for name in ("transform", "load"):
+        assert stages[f"in {name}"] == stages[f"worker of {name}"] == name, "Concurrent stages mixed up their logs"
+
+
+def log_in_worker(num):
+    from etl.logger import get_logger
+
+    get_logger("etl.test").info(f"parsed {num}")
+    return os.getpid()
+
+
+def test_worker_processes_log_through_the_parent(tmp_path, monkeypatch):
+    import asyncio
+    import etl.logger
+    from etl.logger import flush_logs
+    from etl.stages import ParseStage
+
+    file_handler = etl.logger.file_handler
+
+    def opening_file_handler():
+        with open(tmp_path / "opened", "a") as f:
+            f.write(f"{os.getpid()}\n")
+        return file_handler()
+
+    async def parse_all():
+        async with ParseStage(workers=2) as stage:
+            return await asyncio.gather(*(stage.parse(log_in_worker, num) for num in range(20)))
+
+    monkeypatch.setattr(etl.logger, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(etl.logger, "file_handler", opening_file_handler)
+    flush_logs()
+    try:
+        pids = asyncio.run(parse_all())
+    finally:
+        monkeypatch.undo()
+        flush_logs()
+
+    assert os.getpid() not in pids
+    assert (tmp_path / "opened").read_text().split() == [str(os.getpid())], "A worker opened the log file"
+    lines = (tmp_path / "pipeline_logs.txt").read_text().splitlines()
+    assert sorted(line.split(" - ")[-1] for line in lines if "parsed" in line) == sorted(
+        f"parsed {num}" for num in range(20))
+
+
+def test_pipeline_overlaps_stages_and_rolls_back_on_failure(tmp_path, monkeypatch, database):
+    import time
+    from etl.artifacts import RAW_DATA, read_artifact
+    from etl.db import connection
+    from etl.load import load
+    from etl.normalize import normalize
+    from etl.stages import Pipeline
+    from etl.streaming import run_streaming
+    from etl.transform import transform
+
+    def slow(item):
+        time.sleep(0.05)
+        return item
+
+    def timed(queue_size):
+        start = time.perf_counter()
+        assert Pipeline((slow(num) for num in range(8)), [("a", slow), ("b", slow)], queue_size).run() == 8
+        return time.perf_counter() - start
+
+    assert timed(2) < 0.7 * timed(0), "Stages did not run concurrently"
+
+    monkeypatch.chdir(tmp_path)
+    raw_df = read_artifact(os.path.join(PROJECT_ROOT, RAW_DATA), csv_options={"dtype": str, "keep_default_na": False})
+    load(*normalize(transform(raw_df.iloc[100:150])), mode="replace")
+
+    def failing_batches():
+        yield raw_df.iloc[:20].copy()
+        yield raw_df.iloc[20:40].copy()
+        # Mid-run, readers still see the previous tables without waiting on the load's locks.
+        with connection() as reader:
+            reader.execute("SET lock_timeout = '2s'")
+            assert reader.execute("SELECT COUNT(*) FROM books").fetchone()[0] == before
+        raise RuntimeError("crawl failed")
+
+    with connection() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+    with pytest.raises(RuntimeError, match="crawl failed"):
+        run_streaming(failing_batches())
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == before == 50, "Failed run changed the tables"
+
+
+def test_streaming_keys_repeats_on_upc(tmp_path, monkeypatch, database):
+    from etl.artifacts import RAW_DATA, read_artifact
+    from etl.db import connection
+    from etl.streaming import run_streaming
+
+    monkeypatch.chdir(tmp_path)
+    raw_df = read_artifact(os.path.join(PROJECT_ROOT, RAW_DATA), csv_options={"dtype": str, "keep_default_na": False})
+    first = raw_df.iloc[:20].copy()
+    second = raw_df.iloc[20:40].copy()
+    # Listed again on a later page, once unchanged and once with a new price.
+    second.iloc[4] = first.iloc[2]
+    second.iloc[5] = first.iloc[3]
+    second.iloc[5, second.columns.get_loc("price_incl_tax_gbp")] = "Â£1.00"
+
+    assert run_streaming([first, second]) == 39, "Unchanged repeat was not dropped"
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 38
+        assert conn.execute("SELECT upc, reasons FROM quarantine").fetchall() == [(first["upc"].iloc[3],
+                                                                                  "upc: duplicate")]
+        price = conn.execute("SELECT price_incl_tax_gbp FROM books WHERE upc = %s", (first["upc"].iloc[3],))
+        assert f"Â£{price.fetchone()[0]}" == first["price_incl_tax_gbp"].iloc[3], "The first listing was not kept"
+
+
+def test_validation_quarantines_bad_rows(tmp_path, monkeypatch, database):
+    import json
+    from etl.artifacts import QUARANTINE, RAW_DATA, read_artifact
+    from etl.db import connection
+    from etl.load import copy_frame, load_quarantine, prepare_database
+    from etl.normalize import normalize
+    from etl.transform import transform
+    from etl.validate import validate
+
+    monkeypatch.chdir(tmp_path)
+    raw_df = read_artifact(os.path.join(PROJECT_ROOT, RAW_DATA), csv_options={"dtype": str, "keep_default_na": False})
+    raw_df.loc[3, "price_excl_tax_gbp"] = "Â£12,50"
+    raw_df.loc[5, "upc"] = raw_df.loc[4, "upc"]
+    raw_df.loc[7, "titles"] = "x" * 301
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+    books_df.loc[books_df.index[9], "genre_id"] = 999
+
+    good_books_df, good_in_stock_df, quarantine_df = validate(books_df, genre_df, in_stock_df)
+
+    reasons = dict(zip(quarantine_df["upc"], quarantine_df["reasons"]))
+    assert len(good_books_df) == len(good_in_stock_df) == len(books_df) - 4
+    assert reasons[raw_df.loc[3, "upc"]] == "price_excl_tax_gbp: missing"
+    assert reasons[raw_df.loc[9, "upc"]] == "genre_id: unknown genres key"
+    assert "titles: longer than 300" in reasons[raw_df.loc[7, "upc"]]
+    assert (quarantine_df["reasons"] == "upc: duplicate").sum() == 1
+    assert json.loads(quarantine_df["record"].iloc[0])["upc"] == quarantine_df["upc"].iloc[0]
+    assert read_artifact(QUARANTINE)["reasons"].tolist() == quarantine_df["reasons"].tolist()
+
+    prepare_database(truncate=False)
+    with connection() as conn, conn.cursor() as cur:
+        for table in ("books", "quarantine"):
+            cur.execute(f"CREATE TEMP TABLE {table} (LIKE public.{table})")
+        copy_frame(cur, "books", good_books_df)
+        load_quarantine(conn, quarantine_df)
+        assert cur.execute("SELECT COUNT(*) FROM quarantine WHERE record::jsonb ? 'in_stock'").fetchone()[0] == 4
+        conn.rollback()
+
+
+def test_merge_load_skips_unchanged_books(tmp_path, monkeypatch, database):
+    from etl.db import connection
+    from etl.dedup import DedupIndex
+    from etl.load import load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    assert transform(pd.concat([raw_df, raw_df.iloc[:5]], ignore_index=True)).shape[0] == len(raw_df)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+    load(books_df, genre_df, in_stock_df, mode="replace")
+    assert len(DedupIndex()) == len(books_df)
+
+    changed_df, changed_stock_df = books_df.iloc[1:].copy(), in_stock_df.iloc[1:].copy()
+    changed_df.loc[changed_df.index[0], "num_reviews"] = 99
+    changed_stock_df.loc[changed_stock_df.index[1], "in_stock"] = 0
+    counts = load(changed_df, genre_df, changed_stock_df, mode="merge")
+    assert counts["books"] == {"inserted": 0, "updated": 1, "unchanged": len(books_df) - 2, "deleted": 1}
+    assert counts["in_stock"] == {"inserted": 0, "updated": 1, "unchanged": len(books_df) - 2, "deleted": 1}
+
+    with connection() as conn:
+        conn.execute("DELETE FROM books WHERE upc = %s", (changed_df["upc"].iloc[5],))
+    counts = load(changed_df, genre_df, changed_stock_df, mode="merge")
+    assert counts["books"]["inserted"] == 1, "A stale dedup index was not detected"
+    with connection() as conn:
+        assert conn.execute("SELECT SUM(num_reviews), COUNT(*) FROM books").fetchone() == (
+            changed_df["num_reviews"].sum(), len(changed_df))
+
+
+def test_genre_stats_follow_every_load(tmp_path, monkeypatch, database):
+    from etl.db import connection
+    from etl.load import load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df))
+    expected_query = """
+        SELECT genre_id, COUNT(*), SUM(price_incl_tax_gbp), MIN(price_incl_tax_gbp), MAX(price_incl_tax_gbp),
+               SUM(num_reviews), COUNT(*) FILTER (WHERE ratings = 1), COUNT(*) FILTER (WHERE ratings = 5)
+        FROM books GROUP BY genre_id ORDER BY genre_id
+    """
+    stats_query = """
+        SELECT genre_id, books, price_sum, min_price, max_price, reviews, rating_1, rating_5
+        FROM genre_stats ORDER BY genre_id
+    """
+
+    def assert_stats_match():
+        with connection() as conn:
+            assert conn.execute(stats_query).fetchall() == conn.execute(expected_query).fetchall()
+
+    load(books_df, genre_df, in_stock_df, mode="replace")
+    assert_stats_match()
+
+    # Move a genre's priciest book to another genre, reprice and rerate others, and drop one.
+    changed_df, changed_stock_df = books_df.iloc[1:].copy(), in_stock_df.iloc[1:].copy()
+    priciest = changed_df["price_incl_tax_gbp"].astype(float).idxmax()
+    changed_df.loc[priciest, "genre_id"] = changed_df["genre_id"].iloc[0]
+    changed_df.loc[changed_df.index[3], "price_incl_tax_gbp"] = 1
+    changed_df.loc[changed_df.index[4], "ratings"] = 1
+    load(changed_df, genre_df, changed_stock_df, mode="merge")
+    assert_stats_match()
+
+    with connection() as conn:
+        summary = conn.execute("SELECT SUM(books) FROM genre_summary").fetchone()[0]
+        ratings = dict(conn.execute("SELECT rating, books FROM rating_distribution").fetchall())
+    assert summary == len(changed_df)
+    assert ratings[1] == (changed_df["ratings"] == 1).sum()
+
+    load(books_df, genre_df, in_stock_df, mode="replace", workers=2)
+    assert_stats_match()
+
+
+def test_price_history_keeps_changes_only(tmp_path, monkeypatch, database):
+    from datetime import datetime, timedelta, timezone
+
+    import etl.load
+    import etl.streaming
+    from etl.db import connection
+    from etl.history import expire_partitions, record_history
+    from etl.load import load
+    from etl.normalize import normalize
+    from etl.transform import transform
+
+    raw_df = pd.read_csv(os.path.join(PROJECT_ROOT, "data/1_extract_raw_data/books_raw_data.csv"), dtype=str)
+    monkeypatch.chdir(tmp_path)
+    books_df, _, in_stock_df = normalize(transform(raw_df))
+    day = datetime(2024, 1, 30, tzinfo=timezone.utc)
+
+    with connection() as conn:
+        conn.execute("DROP TABLE IF EXISTS price_history CASCADE")
+        assert record_history(conn, books_df, in_stock_df, day) == {"opened": len(books_df), "closed": 0}
+        # Unchanged catalogue: nothing is written.
+        assert record_history(conn, books_df, in_stock_df, day + timedelta(days=1)) == {"opened": 0, "closed": 0}
+
+        # Next month: one book sold out, one removed.
+        changed_stock_df = in_stock_df.copy()
+        changed_stock_df.loc[changed_stock_df.index[0], "in_stock"] = 0
+        counts = record_history(conn, books_df.iloc[:-1], changed_stock_df.iloc[:-1], day + timedelta(days=3))
+        assert counts == {"opened": 1, "closed": 2}
+        partitions = conn.execute(
+            "SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'price_history'::regclass").fetchone()[0]
+        assert partitions == 2
+        upc = books_df["upc"].iloc[0]
+        assert conn.execute("SELECT in_stock FROM prices_at(%s) WHERE upc = %s",
+                            (day + timedelta(days=2), upc)).fetchone()[0] == in_stock_df["in_stock"].iloc[0]
+        assert conn.execute("SELECT in_stock FROM prices_at(%s) WHERE upc = %s",
+                            (day + timedelta(days=4), upc)).fetchone()[0] == 0
+        conn.commit()
+        with pytest.raises(ValueError):
+            record_history(conn, books_df, in_stock_df, day)
+        conn.rollback()
+
+        # Keeping one month drops January, carrying its still-current versions into February.
+        with conn.cursor() as cur:
+            assert expire_partitions(cur, day + timedelta(days=3), months=1) == ["price_history_2024_01"]
+        current = conn.execute("SELECT COUNT(*) FROM prices_at(%s)", (day + timedelta(days=4),)).fetchone()[0]
+        assert current == len(books_df) - 1
+        conn.execute("DROP TABLE price_history CASCADE")
+
+    # A streaming run records the tables it loaded, before its commit.
+    monkeypatch.setattr(etl.streaming, "HISTORY", True)
+    etl.streaming.run_streaming(raw_df.iloc[start:start + 400].reset_index(drop=True)
+                                for start in range(0, len(raw_df), 400))
+    with connection() as conn:
+        loaded = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        assert conn.execute("SELECT COUNT(*) FROM price_history WHERE valid_to IS NULL").fetchone()[0] == loaded
+        conn.execute("DROP TABLE price_history CASCADE")
+
+    # So does a batch load, from the frames it was given.
+    monkeypatch.setattr(etl.load, "HISTORY", True)
+    books_df, genre_df, in_stock_df = normalize(transform(raw_df.iloc[:100]))
+    load(books_df, genre_df, in_stock_df, mode="replace")
+    changed_stock_df = in_stock_df.copy()
+    changed_stock_df.loc[changed_stock_df.index[0], "in_stock"] = 0
+
+    def failing_history(conn, *frames):
+        record_history(conn, *frames)
+        raise RuntimeError("history failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(etl.load, "record_history", failing_history)
+        with pytest.raises(RuntimeError, match="history failed"):
+            load(books_df, genre_df, changed_stock_df, mode="merge")
+    with connection() as conn:
+        assert conn.execute("SELECT in_stock FROM books JOIN in_stock USING (upc) WHERE upc = %s",
+                            (books_df["upc"].iloc[0],)).fetchone()[0] != 0, "The load was committed without its history"
+        assert conn.execute("SELECT COUNT(*) FROM price_history WHERE valid_to IS NULL").fetchone()[0] == 100
+        assert conn.execute("SELECT COUNT(*) FROM price_history WHERE valid_to IS NOT NULL").fetchone()[0] == 0
+    load(books_df, genre_df, changed_stock_df, mode="merge")
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM price_history WHERE valid_to IS NOT NULL").fetchone()[0] == 1